@@ -0,0 +1,54 @@
+"""
+Import time of the headless core, the modules a batch worker needs to
+build mazes and search them, measured in fresh interpreters, e.g.
+
+    python -m benchmarks.imports --runs 10
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+CORE = ('exercise.maze', 'exercise.compact_maze', 'exercise.search', 'exercise.maze_file')
+DRAWING = ('pygame', 'numpy')  # Must stay out of the core, see renderer.py and distance_field.py
+BUDGET = 0.15  # Seconds; the core takes about 0.06 s on a laptop, pygame alone took 0.2 s
+
+PROBE = """
+import json, sys, time
+begin = time.perf_counter()
+for module in {modules!r}:
+    __import__(module)
+elapsed = time.perf_counter() - begin
+print(json.dumps({{'time': elapsed, 'loaded': [name for name in {drawing!r} if name in sys.modules]}}))
+"""
+
+
+def import_time(modules=CORE, runs=5):
+    """The fastest import of modules over several fresh interpreters, and the drawing modules they loaded"""
+    times = []
+    loaded = set()
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(modules=modules, drawing=DRAWING)],
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.splitlines()[-1])
+        times.append(result['time'])
+        loaded.update(result['loaded'])
+    return min(times), sorted(loaded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import time of the headless core against its budget")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters, the fastest is kept")
+    parser.add_argument("--budget", type=float, default=BUDGET, help="seconds")
+    args = parser.parse_args()
+
+    elapsed, loaded = import_time(runs=args.runs)
+    print("{:<40} {:>8.1f} ms (budget {:.1f} ms)".format(", ".join(CORE), elapsed * 1000, args.budget * 1000))
+    if loaded:
+        print("loaded {}, which only the renderer may import".format(", ".join(loaded)))
+    if loaded or elapsed > args.budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Load generator for the maze query server (exercise/server.py), e.g.
+
+    python -m exercise.server --size 500 --layout generate_fast_maze --seed 1
+    python -m benchmarks.load --requests 20000 --connections 8 --window 32
+
+Every connection keeps up to 'window' queries between random cells in
+flight and times each one from sending it to reading its answer. Reports
+the throughput and the latency percentiles.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+
+
+async def open_connection(host, port, path):
+    if path is None:
+        return await asyncio.open_connection(host, port)
+    return await asyncio.open_unix_connection(path)
+
+
+async def ask(reader, writer, query):
+    writer.write(json.dumps(query).encode() + b'\n')
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+async def run_connection(host, port, path, queries, window):
+    """Send queries keeping at most window of them unanswered, returns the latencies and the errors"""
+    reader, writer = await open_connection(host, port, path)
+    slots = asyncio.Semaphore(window)
+    sent = {}
+    latencies = []
+    errors = []
+
+    async def send():
+        for query in queries:
+            await slots.acquire()
+            sent[query['id']] = time.perf_counter()
+            writer.write(json.dumps(query).encode() + b'\n')
+            await writer.drain()
+
+    async def receive():
+        for _ in queries:
+            answer = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - sent.pop(answer['id']))
+            if 'error' in answer:
+                errors.append(answer['error'])
+            slots.release()
+
+    await asyncio.gather(send(), receive())
+    writer.close()
+    await writer.wait_closed()
+    return latencies, errors
+
+
+def percentile(ordered, fraction):
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))]
+
+
+async def run_load(host='127.0.0.1', port=8765, path=None, requests=10000, connections=8, window=32,
+                   algorithm='bfs', seed=2019):
+    """Run the load and return its results: throughput in queries per second, latencies in seconds"""
+    reader, writer = await open_connection(host, port, path)
+    width, height = (await ask(reader, writer, {'id': 0, 'op': 'info'}))['grid_size']
+    writer.close()
+    await writer.wait_closed()
+
+    rng = random.Random(seed)
+    queries = [{'id': number, 'algorithm': algorithm,
+                'source': [rng.randrange(width), rng.randrange(height)],
+                'target': [rng.randrange(width), rng.randrange(height)]} for number in range(requests)]
+    begin = time.perf_counter()
+    results = await asyncio.gather(*(run_connection(host, port, path, queries[number::connections], window)
+                                     for number in range(connections)))
+    elapsed = time.perf_counter() - begin
+
+    latencies = sorted(latency for connection_latencies, _ in results for latency in connection_latencies)
+    errors = [error for _, connection_errors in results for error in connection_errors]
+    return {'requests': len(latencies), 'errors': len(errors), 'seconds': elapsed,
+            'throughput': len(latencies) / elapsed, 'p50': percentile(latencies, 0.5),
+            'p99': percentile(latencies, 0.99), 'max': latencies[-1]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the throughput and latency of the maze query server")
+    parser.add_argument("--host", default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="connect to this Unix socket instead of a TCP port")
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--window", type=int, default=32, help="unanswered queries per connection")
+    parser.add_argument("--algorithm", default='bfs')
+    parser.add_argument("--seed", type=int, default=2019)
+    args = parser.parse_args()
+
+    result = asyncio.run(run_load(args.host, args.port, args.unix, args.requests, args.connections, args.window,
+                                  args.algorithm, args.seed))
+    print("{requests} queries in {seconds:.2f} s, {throughput:.0f} queries/s, {errors} errors".format(**result))
+    print("latency p50 {:.2f} ms, p99 {:.2f} ms, max {:.2f} ms".format(
+        result['p50'] * 1000, result['p99'] * 1000, result['max'] * 1000))
+
+
+if __name__ == "__main__":
+    main()
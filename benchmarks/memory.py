@@ -0,0 +1,45 @@
+"""
+Memory per cell of an open maze, as Maze objects and as a CompactMaze,
+traced with tracemalloc, e.g.
+
+    python -m benchmarks.memory 100 500 1000
+
+Reports the bytes per cell left after generating the maze and the peak
+while generating it.
+"""
+import argparse
+import gc
+import tracemalloc
+
+from exercise.compact_maze import CompactMaze
+from exercise.maze import Maze
+
+
+def bytes_per_cell(maze_class, size):
+    """Traced allocation per cell of an open maze of size x size cells"""
+    gc.collect()
+    tracemalloc.start()
+    maze = maze_class(size, size, (800, 600))
+    maze.generate_open_maze()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del maze
+    return current / (size * size), peak / (size * size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the memory used per maze cell")
+    parser.add_argument("sizes", nargs="*", type=int, default=[100, 500])
+    args = parser.parse_args()
+
+    print("{:>6} {:>14} {:>14} {:>14} {:>14}".format(
+        "size", "Maze B/cell", "Maze peak", "Compact B/cell", "Compact peak"))
+    for size in args.sizes:
+        objects, objects_peak = bytes_per_cell(Maze, size)
+        compact, compact_peak = bytes_per_cell(CompactMaze, size)
+        print("{:>6} {:>14.1f} {:>14.1f} {:>14.1f} {:>14.1f}".format(
+            size, objects, objects_peak, compact, compact_peak))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Headless benchmarks of maze generation and the searches, e.g.
+
+    python -m benchmarks.suite --sizes 10 100 500 --output before.json
+    python -m benchmarks.suite --sizes 10 100 500 --compare before.json
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import math
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+
+from exercise.compact_maze import CompactMaze
+from exercise.maze import LAYOUTS, Maze
+from exercise.search import Search
+
+# name -> method of Search that runs the search from maze.start to maze.target
+SEARCHES = {
+    'bfs': Search.breadth_first_solution,
+    'dfs': Search.depth_first_solution,
+    'greedy': Search.greedy_search,
+    'a_star': Search.a_star_search,
+    'bi_bfs': Search.bidirectional_breadth_first_solution,
+    'bi_a_star': Search.bidirectional_a_star_search,
+    'jps': Search.jump_point_search,
+}
+
+MAZE_TYPES = {'objects': Maze, 'compact': CompactMaze}
+
+
+def measure(action, memory):
+    """Wall time of action(), and its peak traced allocation in a second run when memory is set"""
+    gc.collect()
+    with contextlib.redirect_stdout(io.StringIO()):
+        begin = time.perf_counter()
+        action()
+        elapsed = time.perf_counter() - begin
+        peak = None
+        if memory:
+            gc.collect()
+            tracemalloc.start()
+            action()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return elapsed, peak
+
+
+def bench_size(maze_class, size, layouts, searches, seed, repeat, memory):
+    results = []
+    maze = maze_class(size, size, (800, 600))
+    for layout in layouts:
+        def generate():
+            maze.generate(layout, seed)
+
+        runs = [measure(generate, memory and run == 0) for run in range(repeat)]
+        results.append({'operation': 'generate', 'layout': layout, 'size': size,
+                        'time': min(elapsed for elapsed, _ in runs), 'peak_bytes': runs[0][1]})
+
+        # The component index is labeled once per maze and shared by the searches, so it is timed on its own
+        index = maze.component_index()
+        runs = [measure(index.build, memory and run == 0) for run in range(repeat)]
+        results.append({'operation': 'index', 'layout': layout, 'size': size,
+                        'time': min(elapsed for elapsed, _ in runs), 'peak_bytes': runs[0][1]})
+
+        for name in searches:
+            search = Search(maze, verbose=False, rng=random.Random(seed))
+
+            def solve():
+                search.rng.seed(seed)
+                SEARCHES[name](search)
+
+            runs = [measure(solve, memory and run == 0) for run in range(repeat)]
+            results.append({'operation': 'search', 'algorithm': name, 'layout': layout, 'size': size,
+                            'time': min(elapsed for elapsed, _ in runs), 'peak_bytes': runs[0][1],
+                            'expanded': search.visited, 'path_length': maze.target.distance})
+    return results
+
+
+def series_key(result):
+    return result['operation'], result.get('algorithm'), result['layout']
+
+
+def scaling_exponents(results):
+    """Least squares slope of log(time) against log(cells) for every series"""
+    series = {}
+    for result in results:
+        if result['time'] > 0:
+            series.setdefault(series_key(result), []).append(
+                (math.log(result['size'] ** 2), math.log(result['time'])))
+    exponents = []
+    for (operation, algorithm, layout), points in series.items():
+        if len(points) < 2:
+            continue
+        mean_x = sum(x for x, _ in points) / len(points)
+        mean_y = sum(y for _, y in points) / len(points)
+        spread = sum((x - mean_x) ** 2 for x, _ in points)
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+        exponents.append({'operation': operation, 'algorithm': algorithm, 'layout': layout, 'exponent': slope})
+    return exponents
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, exponents, baseline=None):
+    previous = {}
+    if baseline is not None:
+        previous = {series_key(result) + (result['size'],): result for result in baseline['results']}
+
+    print("{:<9} {:<9} {:<19} {:>6} {:>10} {:>9} {:>12} {:>8}".format(
+        "operation", "search", "layout", "size", "time [s]", "expanded", "peak [B]", "vs base"))
+    for result in results:
+        base = previous.get(series_key(result) + (result['size'],))
+        ratio = "{:.2f}x".format(base['time'] / result['time']) if base and result['time'] > 0 else ""
+        print("{:<9} {:<9} {:<19} {:>6} {:>10.4f} {:>9} {:>12} {:>8}".format(
+            result['operation'], result.get('algorithm') or "", result['layout'], result['size'], result['time'],
+            result.get('expanded', ""), result['peak_bytes'] if result['peak_bytes'] is not None else "", ratio))
+    print()
+    for exponent in exponents:
+        print("{:<9} {:<9} {:<19} time ~ cells^{:.2f}".format(
+            exponent['operation'], exponent['algorithm'] or "", exponent['layout'], exponent['exponent']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time maze generation and searches without a display")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10, 100, 500, 1000, 2000],
+                        help="grid sizes, every maze is size x size cells")
+    parser.add_argument("--layouts", nargs="+", choices=LAYOUTS, default=list(LAYOUTS))
+    parser.add_argument("--searches", nargs="+", choices=sorted(SEARCHES), default=sorted(SEARCHES))
+    parser.add_argument("--maze", choices=sorted(MAZE_TYPES), default='objects', help="storage of the maze")
+    parser.add_argument("--seed", type=int, default=2019)
+    parser.add_argument("--repeat", type=int, default=1, help="runs per measurement, the fastest is kept")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip the traced peak memory")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare with")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        results.extend(bench_size(MAZE_TYPES[args.maze], size, args.layouts, args.searches,
+                                  args.seed, args.repeat, args.memory))
+    exponents = scaling_exponents(results)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    print_results(results, exponents, baseline)
+
+    if args.output:
+        report = {'commit': git_commit(), 'python': platform.python_version(), 'maze': args.maze,
+                  'seed': args.seed, 'results': results, 'exponents': exponents}
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+from array import array
+from exercise.grid_element import GridElement, ALL_WALLS, COMPASS, NORTH, EAST, SOUTH, WEST, WALL_BITS
+from exercise.maze import Maze
+
+NO_VALUE = -1  # Stored in the state arrays where a GridElement holds None
+MAX_EPOCH = 2 ** 32 - 1
+WHITE = (255, 255, 255)
+
+
+class CompactGridElement(GridElement):
+    """
+    Lightweight view on one cell of a CompactMaze. Views are created on
+    demand; the walls and search state live in the arrays of the maze.
+    """
+
+    __slots__ = ('index',)
+
+    def __init__(self, maze, index):
+        self.maze = maze
+        self.index = index
+        self.position = (index % maze.grid_size[0], index // maze.grid_size[0])
+
+    def __eq__(self, other):
+        if not isinstance(other, CompactGridElement):
+            return NotImplemented
+        return self.index == other.index
+
+    def __hash__(self):
+        return self.index
+
+    @property
+    def size(self):
+        return self.maze.cell_width, self.maze.cell_height
+
+    @property
+    def neighbours(self):
+        return self.maze.linked_cells(self.index)
+
+    @property
+    def walls(self):
+        return self.maze.walls[self.index]
+
+    @property
+    def parent(self):
+        parent = self.maze.get_state(self.maze.parents, self.index)
+        return None if parent == NO_VALUE else CompactGridElement(self.maze, parent)
+
+    @parent.setter
+    def parent(self, parent):
+        self.maze.set_state(self.maze.parents, self.index, NO_VALUE if parent is None else parent.index)
+
+    @property
+    def distance(self):
+        distance = self.maze.get_state(self.maze.distances, self.index)
+        return None if distance == NO_VALUE else distance
+
+    @distance.setter
+    def distance(self, distance):
+        self.maze.set_state(self.maze.distances, self.index, NO_VALUE if distance is None else distance)
+
+    @property
+    def score(self):
+        score = self.maze.get_state(self.maze.scores, self.index)
+        return None if score == NO_VALUE else score
+
+    @score.setter
+    def score(self, score):
+        self.maze.set_state(self.maze.scores, self.index, NO_VALUE if score is None else score)
+
+    @property
+    def color(self):
+        return self.maze.colors.get(self.index, WHITE)
+
+    @color.setter
+    def color(self, color):
+        if color == WHITE:
+            self.maze.colors.pop(self.index, None)
+        else:
+            self.maze.colors[self.index] = color
+        if self.maze.changed is not None:
+            self.maze.changed.add(self.index)
+
+    def touch(self):
+        # The state arrays of the maze are stamped, see CompactMaze
+        pass
+
+    def reset_neighbours(self):
+        self.maze.walls[self.index] = ALL_WALLS
+
+
+class CompactColumn:
+    """
+    One column grid[x] of a CompactMaze
+    """
+
+    __slots__ = ('maze', 'x')
+
+    def __init__(self, maze, x):
+        self.maze = maze
+        self.x = x
+
+    def __len__(self):
+        return self.maze.grid_size[1]
+
+    def __getitem__(self, y):
+        height = self.maze.grid_size[1]
+        if y < 0:
+            y += height
+        if not 0 <= y < height:
+            raise IndexError("cell index out of range")
+        return CompactGridElement(self.maze, y * self.maze.grid_size[0] + self.x)
+
+    def __iter__(self):
+        for y in range(self.maze.grid_size[1]):
+            yield self[y]
+
+
+class CompactGrid:
+    """
+    Column major grid[x][y] access to the cells of a CompactMaze,
+    handing out CompactGridElement views
+    """
+
+    __slots__ = ('maze',)
+
+    def __init__(self, maze):
+        self.maze = maze
+
+    def __len__(self):
+        return self.maze.grid_size[0]
+
+    def __getitem__(self, x):
+        width = self.maze.grid_size[0]
+        if x < 0:
+            x += width
+        if not 0 <= x < width:
+            raise IndexError("column index out of range")
+        return CompactColumn(self.maze, x)
+
+    def __iter__(self):
+        for x in range(self.maze.grid_size[0]):
+            yield self[x]
+
+
+class CompactMaze(Maze):
+    """
+    Maze that stores its cells in flat arrays instead of GridElement objects.
+    Cell (x, y) has index y * width + x in the wall bitmask array and in the
+    parallel parent, distance and score arrays; colors are kept in a dict as
+    only a few cells are ever colored.
+
+    The search state of a cell is only valid when its stamp equals the
+    current epoch, so reset_state just starts a new epoch instead of
+    clearing the arrays. The cells stamped in the current epoch are
+    listed in 'touched'; 'changed' holds the indices changed since the
+    last take_changes while a renderer watches the maze.
+    """
+
+    def create_grid(self):
+        cells = self.grid_size[0] * self.grid_size[1]
+        self.walls = array('B', [ALL_WALLS]) * cells
+        self.parents = array('i', [NO_VALUE]) * cells
+        self.distances = array('i', [NO_VALUE]) * cells
+        self.scores = array('i', [NO_VALUE]) * cells
+        self.stamps = array('I', [0]) * cells
+        self.epoch = 0
+        self.touched = array('i')
+        self.changed = None
+        self.colors = {}
+        return CompactGrid(self)
+
+    def reset_all(self):
+        self.change_in_bulk()
+        self.walls[:] = array('B', [ALL_WALLS]) * len(self.walls)
+        self.reset_state()
+        return None
+
+    def reset_state(self):
+        if self.changed is not None:
+            self.changed.update(self.touched)
+            self.changed.update(self.colors)
+        del self.touched[:]
+        self.epoch += 1
+        if self.epoch > MAX_EPOCH:
+            self.stamps[:] = array('I', [0]) * len(self.stamps)
+            self.epoch = 1
+        self.colors.clear()
+        self.reset_endpoints()
+        return None
+
+    def get_state(self, values, index):
+        if self.stamps[index] != self.epoch:
+            return NO_VALUE
+        return values[index]
+
+    def set_state(self, values, index, value):
+        if self.stamps[index] != self.epoch:
+            self.stamps[index] = self.epoch
+            self.touched.append(index)
+            self.parents[index] = NO_VALUE
+            self.distances[index] = NO_VALUE
+            self.scores[index] = NO_VALUE
+        values[index] = value
+        if self.changed is not None:
+            self.changed.add(index)
+
+    def watch_changes(self):
+        self.changed = set()
+        return None
+
+    def take_changes(self, limit=None):
+        changed = self.changed
+        self.changed = set()
+        if limit is not None and len(changed) > limit:
+            return None
+        return [CompactGridElement(self, index) for index in changed]
+
+    def state_cells(self):
+        indices = set(self.touched)
+        indices.update(self.colors)
+        return [CompactGridElement(self, index) for index in indices]
+
+    def linked_cells(self, index):
+        walls = self.walls[index]
+        width = self.grid_size[0]
+        x, y = index % width, index // width
+        cells = []
+        for bit, (dx, dy) in zip((NORTH, EAST, SOUTH, WEST), COMPASS):
+            if not walls & bit:
+                cells.append(CompactGridElement(self, (y + dy) * width + x + dx))
+        return cells
+
+    def del_link(self, cell1, cell2):
+        if cell1.manhattan_distance(cell2) == 1 and not self.walls[cell1.index] & WALL_BITS[cell1.direction(cell2)]:
+            self.version += 1
+            for changes in self.link_watchers.values():
+                changes.append((cell1, cell2))
+            self.walls[cell1.index] |= WALL_BITS[cell1.direction(cell2)]
+            self.walls[cell2.index] |= WALL_BITS[cell2.direction(cell1)]
+        return None
+
+    def add_link(self, cell1, cell2):
+        if cell1.manhattan_distance(cell2) == 1 and self.walls[cell1.index] & WALL_BITS[cell1.direction(cell2)]:
+            self.version += 1
+            for changes in self.link_watchers.values():
+                changes.append((cell1, cell2))
+            self.walls[cell1.index] &= ~WALL_BITS[cell1.direction(cell2)]
+            self.walls[cell2.index] &= ~WALL_BITS[cell2.direction(cell1)]
+        return None
+
+    def wall_masks(self):
+        return array('B', self.walls)
+
+    def wall_rows(self, left, top, width, height):
+        stride = self.grid_size[0]
+        masks = bytearray()
+        for y in range(top, top + height):
+            masks += self.walls[y * stride + left:y * stride + left + width]
+        return masks
+
+    def colors_in(self, left, top, width, height):
+        stride = self.grid_size[0]
+        colors = []
+        if len(self.colors) < width * height:
+            for index, color in self.colors.items():
+                x, y = index % stride, index // stride
+                if left <= x < left + width and top <= y < top + height:
+                    colors.append(((x, y), color))
+        else:
+            # After a search most cells have a color, look up the rectangle
+            for y in range(top, top + height):
+                begin = y * stride
+                for index in range(begin + left, begin + left + width):
+                    color = self.colors.get(index)
+                    if color is not None:
+                        colors.append(((index - begin, y), color))
+        return colors
+
+    def load_wall_masks(self, masks):
+        self.change_in_bulk()
+        self.walls[:] = array('B', masks)
+        self.reset_state()
+        return None
+
+    def generate_open_maze(self):
+        width, height = self.grid_size
+        row = array('B', ((WEST if x == 0 else 0) | (EAST if x == width - 1 else 0) for x in range(width)))
+        walls = row * height
+        for x in range(width):
+            walls[x] |= NORTH
+            walls[(height - 1) * width + x] |= SOUTH
+        self.change_in_bulk()
+        self.walls[:] = walls
+        self.reset_state()
@@ -0,0 +1,204 @@
+"""
+Connected components of a maze: which cells can reach each other at all,
+kept up to date with add_link and del_link, so a search can tell that its
+target is walled off before it explores anything
+"""
+from array import array
+from collections import deque
+from exercise.grid_element import WALL_BITS, wall_steps
+
+STEP_CELLS = 4096  # Cells labelled by a flood between two yields of build_steps
+SCAN_CELLS = 65536  # Cells scanned for a label, or labelled by small floods, between two yields
+
+
+class ComponentIndex:
+    """
+    Labels every cell with its component. The labels are joined in a
+    union-find: a link between two components joins their labels by size,
+    and the label of a cell is the root of its own. When a link is removed
+    a search runs from both of its cells at once, one cell per side in
+    turn. If the two meet nothing changed; if one side runs out first it
+    has found all cells of the part that broke off, the smaller one, and
+    only those get a new label.
+
+    Between two queries the index reads the links changed through
+    add_link and del_link (see Maze.watch_links) and replays them one at a
+    time on wall masks of its own, so a link that changed twice is seen in
+    its final state. Links changed in bulk label the whole maze again,
+    like LifelongPlanner starts over. That takes seconds on a large maze,
+    so sync_steps and build_steps yield every few thousand cells, for a
+    search that spreads its work over frames (see Search.advance).
+    """
+
+    def __init__(self, maze):
+        self.maze = maze
+        self.changes = maze.watch_links()
+        self.version = None
+
+    def build(self):
+        deque(self.build_steps(), maxlen=0)
+
+    def build_steps(self):
+        width, height = self.maze.grid_size
+        # The labels only count once they are all set, a search may stop
+        # in between; the links changed meanwhile are replayed by sync
+        version = self.maze.version
+        self.version = None
+        self.maze.take_link_changes(self.changes)
+        self.width = width
+        self.steps = wall_steps(width)
+        self.masks = bytearray(self.maze.wall_masks())
+        cells = width * height
+        self.labels = array('i')
+        unlabelled = array('i', [-1]) * SCAN_CELLS
+        while len(self.labels) < cells:
+            self.labels.extend(unlabelled[:cells - len(self.labels)])
+            yield None
+        self.parents = []  # label -> the label it was joined to, itself for a root
+        self.sizes = []  # root label -> number of cells
+        cell = 0
+        work = 0  # Cells scanned or labelled since the last yield
+        while cell < cells:
+            end = min(cell + SCAN_CELLS, cells)
+            try:
+                cell = self.labels.index(-1, cell, end)
+            except ValueError:
+                work += end - cell
+                cell = end
+            else:
+                label = len(self.parents)
+                self.parents.append(label)
+                size = yield from self.flood_steps(cell, label)
+                self.sizes.append(size)
+                work += size
+            if work >= SCAN_CELLS:
+                work = 0
+                yield None
+        self.version = version
+
+    """
+    Label the cells reached from cell that have no label yet, returns
+    their number
+    """
+
+    def flood_steps(self, cell, label):
+        masks = self.masks
+        labels = self.labels
+        steps = self.steps
+        labels[cell] = label
+        stack = [cell]
+        count = 0
+        while len(stack) > 0:
+            cell = stack.pop()
+            count += 1
+            if count % STEP_CELLS == 0:
+                yield None
+            walls = masks[cell]
+            for bit, step in steps:
+                if not walls & bit:
+                    neighbour = cell + step
+                    if labels[neighbour] == -1:
+                        labels[neighbour] = label
+                        stack.append(neighbour)
+        return count
+
+    """
+    Bring the labels up to date with the links changed in the maze
+    """
+
+    def sync(self):
+        deque(self.sync_steps(), maxlen=0)
+
+    def sync_steps(self):
+        changes = self.maze.take_link_changes(self.changes)
+        if self.version is None or self.maze.version != self.version + len(changes):
+            yield from self.build_steps()
+            return
+        self.version = self.maze.version
+        for cell1, cell2 in changes:
+            direction = (cell2.position[0] - cell1.position[0], cell2.position[1] - cell1.position[1])
+            bit, back = WALL_BITS[direction], WALL_BITS[-direction[0], -direction[1]]
+            index1, index2 = self.index(cell1), self.index(cell2)
+            linked = not cell1.walls & bit
+            if linked == (not self.masks[index1] & bit):
+                continue  # Changed back since
+            self.masks[index1] ^= bit
+            self.masks[index2] ^= back
+            if linked:
+                self.join(index1, index2)
+            else:
+                self.split(index1, index2)
+
+    def find(self, label):
+        parents = self.parents
+        while parents[label] != label:
+            parents[label] = parents[parents[label]]
+            label = parents[label]
+        return label
+
+    def join(self, index1, index2):
+        root1, root2 = self.find(self.labels[index1]), self.find(self.labels[index2])
+        if root1 == root2:
+            return
+        if self.sizes[root1] < self.sizes[root2]:
+            root1, root2 = root2, root1
+        self.parents[root2] = root1
+        self.sizes[root1] += self.sizes[root2]
+
+    def split(self, index1, index2):
+        masks = self.masks
+        steps = self.steps
+        sides = [([index1], {index1}), ([index2], {index2})]
+        while True:
+            for side, (stack, seen) in enumerate(sides):
+                if len(stack) == 0:
+                    self.relabel(seen, self.find(self.labels[index1]))
+                    return
+                cell = stack.pop()
+                other_seen = sides[1 - side][1]
+                walls = masks[cell]
+                for bit, step in steps:
+                    if not walls & bit:
+                        neighbour = cell + step
+                        if neighbour in other_seen:
+                            return  # Still connected the other way round
+                        if neighbour not in seen:
+                            seen.add(neighbour)
+                            stack.append(neighbour)
+
+    def relabel(self, cells, root):
+        label = len(self.parents)
+        self.parents.append(label)
+        self.sizes.append(len(cells))
+        self.sizes[root] -= len(cells)
+        labels = self.labels
+        for cell in cells:
+            labels[cell] = label
+
+    def index(self, cell):
+        x, y = cell.position if hasattr(cell, 'position') else cell
+        return y * self.maze.grid_size[0] + x
+
+    """
+    The label of the component of a cell, given as a flat index
+    y * width + x (see Maze.wall_masks)
+    """
+
+    def component(self, index):
+        self.sync()
+        return self.find(self.labels[index])
+
+    def size(self, index):
+        return self.sizes[self.component(index)]
+
+    def count(self):
+        self.sync()
+        return sum(1 for label, parent in enumerate(self.parents) if label == parent)
+
+    """
+    Whether target can be reached from source, both GridElements or (x, y)
+    positions
+    """
+
+    def connected(self, source, target):
+        return self.component(self.index(source)) == self.component(self.index(target))
@@ -0,0 +1,106 @@
+"""
+Breadth first distances from one cell to all cells, grown one layer at a
+time with NumPy array operations on the wall masks of the maze
+"""
+from exercise.grid_element import NORTH, EAST, SOUTH, WEST, COMPASS
+
+# numpy is optional and only this module needs it. It is imported on first
+# use, as it takes longer to import than the maze and the searches together.
+numpy = None
+
+UNREACHED = -1
+SCALAR_FRONTIER = 48  # Layers smaller than this are cheaper to expand in plain Python
+STEP_OF = {NORTH: COMPASS[0], EAST: COMPASS[1], SOUTH: COMPASS[2], WEST: COMPASS[3]}
+
+
+def require_numpy():
+    global numpy
+    if numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("the distance field needs numpy, install it with 'pip install numpy'") from None
+
+
+def wall_array(maze):
+    """The wall masks of a maze as a (height, width) uint8 array, indexed [y, x]"""
+    require_numpy()
+    width, height = maze.grid_size
+    return numpy.frombuffer(bytes(maze.wall_masks()), dtype=numpy.uint8).reshape(height, width)
+
+
+def distance_field(walls, source):
+    """
+    Distances from source, an (x, y) position, over a (height, width) array
+    of wall masks. Returns two (height, width) arrays indexed [y, x]: the
+    distance of every cell (UNREACHED when there is no path) and the wall
+    bit of the side its parent is on (0 for the source and unreached cells).
+    """
+    require_numpy()
+    height, width = walls.shape
+    masks = numpy.ascontiguousarray(walls, dtype=numpy.uint8).ravel()
+    distances = numpy.full(masks.size, UNREACHED, dtype=numpy.int32)
+    parents = numpy.zeros(masks.size, dtype=numpy.uint8)
+    slots = numpy.empty(masks.size, dtype=numpy.intp)
+    # (wall bit, index step, side of the parent seen from the neighbour)
+    steps = ((NORTH, -width, SOUTH), (EAST, 1, WEST), (SOUTH, width, NORTH), (WEST, -1, EAST))
+
+    # Narrow layers, like the corridors of a maze, go through memoryviews
+    # as the fixed cost of the array operations would dominate
+    mask_bytes = masks.tobytes()
+    distance_view = memoryview(distances)
+    parent_view = memoryview(parents)
+
+    start = source[1] * width + source[0]
+    distances[start] = 0
+    frontier = [start]
+    distance = 0
+    while len(frontier) > 0:
+        distance += 1
+        if len(frontier) < SCALAR_FRONTIER:
+            if not isinstance(frontier, list):
+                frontier = frontier.tolist()
+            next_frontier = []
+            for cell in frontier:
+                cell_walls = mask_bytes[cell]
+                for bit, step, back in steps:
+                    if not cell_walls & bit:
+                        neighbour = cell + step
+                        if distance_view[neighbour] == UNREACHED:
+                            distance_view[neighbour] = distance
+                            parent_view[neighbour] = back
+                            next_frontier.append(neighbour)
+            frontier = next_frontier
+        else:
+            frontier = numpy.asarray(frontier, dtype=numpy.intp)
+            frontier_walls = masks[frontier]
+            layers = []
+            for bit, step, back in steps:
+                neighbours = frontier[(frontier_walls & bit) == 0] + step
+                neighbours = neighbours[distances[neighbours] == UNREACHED]
+                parents[neighbours] = back
+                layers.append(neighbours)
+            frontier = numpy.concatenate(layers)
+            # Drop the cells reached from two sides: every cell keeps the
+            # position of its last occurrence, without sorting the layer
+            positions = numpy.arange(frontier.size)
+            slots[frontier] = positions
+            frontier = frontier[slots[frontier] == positions]
+            distances[frontier] = distance
+    return distances.reshape(height, width), parents.reshape(height, width)
+
+
+def apply_distance_field(maze, distances, parents):
+    """
+    Copy a distance field into the distance and parent of the cells,
+    so Search.highlight_path can show the path to the target
+    """
+    require_numpy()
+    maze.reset_state()
+    height, width = distances.shape
+    for y, x in zip(*numpy.nonzero(parents)):
+        dx, dy = STEP_OF[int(parents[y, x])]
+        cell = maze.grid[x][y]
+        cell.set_parent(maze.grid[x + dx][y + dy])
+        cell.set_distance(int(distances[y, x]))
+    return None
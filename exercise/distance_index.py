@@ -0,0 +1,363 @@
+import heapq
+import struct
+import zlib
+from array import array
+from exercise.grid_element import ALL_WALLS, WALL_BITS, wall_steps
+
+UNREACHED = -1
+INDEX_MAGIC = b'MZIX'
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct('<4sHBxIIIII')  # magic, version, kind, width, height, masks crc, levels, landmarks
+TREE, LANDMARKS = 0, 1
+ACTIVE_LANDMARKS = 3  # Landmarks that bound one query, the ones that bound it best at its source
+
+
+def index_path(path):
+    """The file of the DistanceIndex saved with the maze file at path"""
+    return str(path) + '.idx'
+
+
+def breadth_first_distances(masks, grid_size, source):
+    """
+    Distance from the index source to every cell over the flat wall masks,
+    and the index of the cell each one was reached from (UNREACHED if none)
+    """
+    steps = wall_steps(grid_size[0])
+    distances = array('i', [UNREACHED]) * len(masks)
+    parents = array('i', [UNREACHED]) * len(masks)
+    distances[source] = 0
+    frontier = [source]
+    distance = 0
+    while len(frontier) > 0:
+        distance += 1
+        next_frontier = []
+        for cell in frontier:
+            walls = masks[cell]
+            for bit, step in steps:
+                if not walls & bit:
+                    neighbour = cell + step
+                    if distances[neighbour] == UNREACHED:
+                        distances[neighbour] = distance
+                        parents[neighbour] = cell
+                        next_frontier.append(neighbour)
+        frontier = next_frontier
+    return distances, parents
+
+
+class DistanceIndex:
+    """
+    Distance index over a maze, built once and answering distance queries
+    between cells without running a search over the GridElements.
+
+    Perfect mazes (a spanning tree, one path between every pair of cells)
+    are rooted at cell (0, 0) and answered exactly through the lowest common
+    ancestor: distance = depth(a) + depth(b) - 2 * depth(lca). Other mazes
+    store the breadth first distances from a few landmarks, giving the ALT
+    lower bound max |d(l, a) - d(l, b)| which guides an A* over the wall
+    masks, and Search.best_first_steps when the maze has an index (see
+    Maze.build_distance_index). Only perfect mazes get answers in
+    microseconds; a maze with loops, like those of generate_maze,
+    generate_room and generate_obstacles, costs one such A* per query.
+
+    Between two queries the index reads the links changed through add_link
+    and del_link (see Maze.watch_links). A new link lowers the landmark
+    distances around it, spreading out from its cells. A removed link keeps
+    the old distances: they still give a lower bound, as the maze only lost
+    a way through, but no longer an upper bound. A tree, or links changed
+    in bulk, build the whole index again.
+    """
+
+    def __init__(self, maze, landmarks=8):
+        self.maze = maze
+        self.landmark_count = landmarks
+        self.changes = maze.watch_links()
+        self.build()
+
+    """
+    Stop watching the links of the maze, for a index that is replaced
+    """
+
+    def close(self):
+        self.maze.unwatch_links(self.changes)
+        return None
+
+    def snapshot(self):
+        self.version = self.maze.version
+        self.maze.take_link_changes(self.changes)
+        self.grid_size = self.maze.grid_size
+        self.masks = self.maze.wall_masks()
+        self.checksum = zlib.crc32(self.masks.tobytes())
+        self.depth = self.ancestors = self.landmarks = None
+        self.stale = False  # Set when a link was removed after the landmark distances were found
+
+    def build(self):
+        self.snapshot()
+        cells = len(self.masks)
+        open_sides = sum(bin(ALL_WALLS & ~mask).count('1') for mask in self.masks)
+        depth, parents = breadth_first_distances(self.masks, self.grid_size, 0)
+        if open_sides // 2 == cells - 1 and UNREACHED not in depth:
+            self.kind = TREE
+            self.build_tree(depth, parents)
+        else:
+            self.kind = LANDMARKS
+            self.build_landmarks(depth)
+        return None
+
+    def build_tree(self, depth, parents):
+        parents[0] = 0
+        self.depth = depth
+        self.ancestors = [parents]  # ancestors[k][cell] is the ancestor 2**k levels up
+        for _ in range(max(depth).bit_length() - 1):
+            previous = self.ancestors[-1]
+            self.ancestors.append(array('i', [previous[previous[cell]] for cell in range(len(previous))]))
+
+    def build_landmarks(self, distances):
+        # Farthest point selection: every next landmark is the cell farthest
+        # from the landmarks chosen so far.
+        self.landmarks = []
+        self.landmark_distances = []
+        closest = array('i', distances)
+        landmark = max(range(len(closest)), key=closest.__getitem__)
+        for _ in range(min(self.landmark_count, len(closest))):
+            distances = breadth_first_distances(self.masks, self.grid_size, landmark)[0]
+            self.landmarks.append(landmark)
+            self.landmark_distances.append(distances)
+            for cell in range(len(closest)):
+                if distances[cell] != UNREACHED and distances[cell] < closest[cell]:
+                    closest[cell] = distances[cell]
+            landmark = max(range(len(closest)), key=closest.__getitem__)
+            if closest[landmark] <= 0:
+                break
+
+    """
+    Bring the index up to date with the links changed in the maze
+    """
+
+    def refresh(self):
+        changes = self.maze.take_link_changes(self.changes)
+        if self.maze.version == self.version:
+            return
+        if self.kind == TREE or self.maze.version != self.version + len(changes):
+            self.build()
+            return
+        self.version = self.maze.version
+        for cell1, cell2 in changes:
+            direction = cell1.direction(cell2)
+            bit, back = WALL_BITS[direction], WALL_BITS[-direction[0], -direction[1]]
+            a, b = self.index_of(cell1), self.index_of(cell2)
+            linked = not cell1.walls & bit
+            if linked == (not self.masks[a] & bit):
+                continue  # Changed back since
+            self.masks[a] ^= bit
+            self.masks[b] ^= back
+            if linked:
+                for distances in self.landmark_distances:
+                    self.lower_distances(distances, a, b)
+                    self.lower_distances(distances, b, a)
+            else:
+                self.stale = True
+
+    def lower_distances(self, distances, a, b):
+        # Breadth first from b over the cells the new link a - b brought closer to the landmark
+        if distances[a] == UNREACHED or (distances[b] != UNREACHED and distances[b] <= distances[a] + 1):
+            return
+        masks = self.masks
+        steps = wall_steps(self.grid_size[0])
+        distances[b] = distances[a] + 1
+        frontier = [b]
+        while len(frontier) > 0:
+            next_frontier = []
+            for cell in frontier:
+                distance = distances[cell] + 1
+                walls = masks[cell]
+                for bit, step in steps:
+                    if not walls & bit:
+                        neighbour = cell + step
+                        if distances[neighbour] == UNREACHED or distance < distances[neighbour]:
+                            distances[neighbour] = distance
+                            next_frontier.append(neighbour)
+            frontier = next_frontier
+
+    def index_of(self, cell):
+        x, y = cell.position if hasattr(cell, 'position') else cell
+        return y * self.grid_size[0] + x
+
+    """
+    Length of the shortest path between two cells, or None when
+    they are not connected
+    """
+
+    def distance(self, cell1, cell2):
+        self.refresh()
+        a, b = self.index_of(cell1), self.index_of(cell2)
+        if self.kind == TREE:
+            return self.tree_distance(a, b)
+        return self.landmark_distance(a, b)
+
+    """
+    A lower bound on the distance between two cells, usable as an A*
+    heuristic; exact for perfect mazes
+    """
+
+    def lower_bound(self, cell1, cell2):
+        self.refresh()
+        a, b = self.index_of(cell1), self.index_of(cell2)
+        if self.kind == TREE:
+            return self.tree_distance(a, b)
+        return self.heuristic(a, b)
+
+    def tree_distance(self, a, b):
+        depth, ancestors = self.depth, self.ancestors
+        total = depth[a] + depth[b]
+        if depth[a] < depth[b]:
+            a, b = b, a
+        climb = depth[a] - depth[b]
+        level = 0
+        while climb > 0:
+            if climb & 1:
+                a = ancestors[level][a]
+            climb >>= 1
+            level += 1
+        if a != b:
+            for level in range(len(ancestors) - 1, -1, -1):
+                if ancestors[level][a] != ancestors[level][b]:
+                    a = ancestors[level][a]
+                    b = ancestors[level][b]
+            a = ancestors[0][a]
+        return total - 2 * depth[a]
+
+    def heuristic(self, a, b):
+        width = self.grid_size[0]
+        bound = abs(a % width - b % width) + abs(a // width - b // width)
+        for distances in self.landmark_distances:
+            da, db = distances[a], distances[b]
+            if (da == UNREACHED) != (db == UNREACHED):
+                return None  # one of them is in the component of the landmark
+            if da != UNREACHED and abs(da - db) > bound:
+                bound = abs(da - db)
+        return bound
+
+    """
+    The lower bound on the distance from any cell, as an index, to target,
+    as a function for an A* from source. It is the exact distance in a
+    tree; otherwise the Manhattan distance raised by the ACTIVE_LANDMARKS
+    landmarks that bound the distance from source best.
+    """
+
+    def bound_to(self, source, target):
+        self.refresh()
+        if self.kind == TREE:
+            return lambda cell: self.tree_distance(cell, target)
+        width = self.grid_size[0]
+        target_x, target_y = target % width, target // width
+        ranked = sorted((abs(distances[source] - distances[target]), number)
+                        for number, distances in enumerate(self.landmark_distances)
+                        if distances[source] != UNREACHED and distances[target] != UNREACHED)
+        active = [(self.landmark_distances[number], self.landmark_distances[number][target])
+                  for _, number in ranked[-ACTIVE_LANDMARKS:]]
+
+        def bound(cell):
+            best = abs(cell % width - target_x) + abs(cell // width - target_y)
+            for distances, to_target in active:
+                difference = distances[cell] - to_target
+                if difference > best:
+                    best = difference
+                elif -difference > best:
+                    best = -difference
+            return best
+        return bound
+
+    def landmark_distance(self, a, b):
+        # When a landmark lies on a shortest path the lower bound meets the
+        # upper bound d(a, l) + d(l, b) and no search is needed
+        lower = self.heuristic(a, b)
+        if lower is None:
+            return None
+        if not self.stale:
+            upper = None
+            for distances in self.landmark_distances:
+                if distances[a] != UNREACHED and (upper is None or distances[a] + distances[b] < upper):
+                    upper = distances[a] + distances[b]
+            if upper == lower:
+                return lower
+
+        bound = self.bound_to(a, b)
+        steps = wall_steps(self.grid_size[0])
+        masks = self.masks
+        best = {a: 0}
+        heap = [(lower, lower, a)]  # Equal estimates expand the cell closest to b first
+        while len(heap) > 0:
+            estimate, remaining, cell = heapq.heappop(heap)
+            distance = estimate - remaining
+            if cell == b:
+                return distance
+            if distance > best[cell]:
+                continue
+            walls = masks[cell]
+            for bit, step in steps:
+                if not walls & bit:
+                    neighbour = cell + step
+                    if neighbour not in best or distance + 1 < best[neighbour]:
+                        best[neighbour] = distance + 1
+                        remaining = bound(neighbour)
+                        heapq.heappush(heap, (distance + 1 + remaining, remaining, neighbour))
+        return None
+
+    """
+    Store the index in a file, next to a saved maze
+    """
+
+    def save(self, path):
+        self.refresh()
+        if self.stale:
+            self.build()  # The saved distances are taken as exact again
+        self.checksum = zlib.crc32(self.masks.tobytes())
+        tables = self.ancestors if self.kind == TREE else self.landmark_distances
+        with open(path, 'wb') as file:
+            file.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, self.kind, self.grid_size[0], self.grid_size[1],
+                                         self.checksum, len(tables), len(self.landmarks or ())))
+            if self.kind == TREE:
+                self.depth.tofile(file)
+            else:
+                array('i', self.landmarks).tofile(file)
+            for table in tables:
+                table.tofile(file)
+        return None
+
+    """
+    Load an index saved for this maze. The index is rebuilt when the
+    file was made for different walls.
+    """
+
+    @classmethod
+    def load(cls, path, maze, landmarks=8):
+        index = cls.__new__(cls)
+        index.maze = maze
+        index.landmark_count = landmarks
+        index.changes = maze.watch_links()
+        index.snapshot()
+
+        with open(path, 'rb') as file:
+            magic, version, kind, width, height, checksum, levels, landmark_count = \
+                INDEX_HEADER.unpack(file.read(INDEX_HEADER.size))
+            if magic != INDEX_MAGIC or version != INDEX_VERSION:
+                raise ValueError("{} is not a maze distance index".format(path))
+            if (width, height) != maze.grid_size or checksum != index.checksum:
+                index.build()
+                return index
+
+            index.kind = kind
+            cells = width * height
+            if kind == TREE:
+                index.depth = read_array(file, 'i', cells)
+                index.ancestors = [read_array(file, 'i', cells) for _ in range(levels)]
+            else:
+                index.landmarks = list(read_array(file, 'i', landmark_count))
+                index.landmark_distances = [read_array(file, 'i', cells) for _ in range(levels)]
+        return index
+
+
+def read_array(file, typecode, count):
+    values = array(typecode)
+    values.fromfile(file, count)
+    return values
@@ -0,0 +1,212 @@
+"""
+Maze generators that work on flat wall masks (see Maze.wall_masks)
+instead of GridElements, for grids too large for generate_maze
+"""
+import random
+from multiprocessing import Pool
+from exercise.grid_element import ALL_WALLS, NORTH, EAST, SOUTH, WEST
+
+OPPOSITE = {NORTH: SOUTH, EAST: WEST, SOUTH: NORTH, WEST: EAST}
+
+
+def backtracker_masks(width, height, rng, start=0):
+    """
+    Perfect maze by a randomised depth first search (recursive backtracker)
+    from the index start. The stack holds the current path only, every cell
+    is pushed once, and the visited flags and walls are one byte per cell.
+    Returns the walls as a bytearray indexed by y * width + x.
+    """
+    cells = width * height
+    walls = bytearray([ALL_WALLS]) * cells
+    visited = bytearray(cells)
+    visited[start] = 1
+    stack = [start]
+    options = [0] * 4  # (step, wall bit) of the unvisited neighbours, reused every step
+    random = rng.random
+    last_row = cells - width
+
+    while len(stack) > 0:
+        cell = stack[-1]
+        x = cell % width
+        count = 0
+        if cell >= width and not visited[cell - width]:
+            options[count] = NORTH
+            count += 1
+        if x < width - 1 and not visited[cell + 1]:
+            options[count] = EAST
+            count += 1
+        if cell < last_row and not visited[cell + width]:
+            options[count] = SOUTH
+            count += 1
+        if x > 0 and not visited[cell - 1]:
+            options[count] = WEST
+            count += 1
+        if count == 0:
+            stack.pop()
+            continue
+
+        bit = options[int(random() * count)]
+        if bit == NORTH:
+            neighbour = cell - width
+        elif bit == EAST:
+            neighbour = cell + 1
+        elif bit == SOUTH:
+            neighbour = cell + width
+        else:
+            neighbour = cell - 1
+        walls[cell] &= ~bit
+        walls[neighbour] &= ~OPPOSITE[bit]
+        visited[neighbour] = 1
+        stack.append(neighbour)
+    return walls
+
+
+def add_random_links(walls, width, height, count, rng):
+    """
+    Open a wall between a random cell and a random neighbour it is not yet
+    linked to, count times, like the extra links of Maze.generate_maze
+    """
+    for _ in range(count):
+        cell = rng.randrange(width * height)
+        x, y = cell % width, cell // width
+        closed = []
+        if y > 0 and walls[cell] & NORTH:
+            closed.append((NORTH, cell - width))
+        if x < width - 1 and walls[cell] & EAST:
+            closed.append((EAST, cell + 1))
+        if y < height - 1 and walls[cell] & SOUTH:
+            closed.append((SOUTH, cell + width))
+        if x > 0 and walls[cell] & WEST:
+            closed.append((WEST, cell - 1))
+        if len(closed) > 0:
+            bit, neighbour = rng.choice(closed)
+            walls[cell] &= ~bit
+            walls[neighbour] &= ~OPPOSITE[bit]
+    return walls
+
+
+def tile_worker(job):
+    width, height, seed = job
+    return backtracker_masks(width, height, random.Random(seed))
+
+
+def tiled_masks(width, height, tile_size, rng, processes=None):
+    """
+    Perfect maze made of tile_size x tile_size tiles. Every tile gets its
+    own backtracker maze, generated in a process pool when processes > 1,
+    from a seed drawn from rng so the result does not depend on the number
+    of processes. A backtracker maze over the tiles then picks a spanning
+    tree of tile borders, and every border in that tree gets one opening
+    at a random place. A tree of trees is again a spanning tree, so every
+    cell is connected to every other cell by exactly one path.
+    """
+    columns = (width + tile_size - 1) // tile_size
+    rows = (height + tile_size - 1) // tile_size
+    jobs = []
+    for tile_y in range(rows):
+        for tile_x in range(columns):
+            jobs.append((min(tile_size, width - tile_x * tile_size),
+                         min(tile_size, height - tile_y * tile_size), rng.getrandbits(64)))
+
+    if processes is not None and processes > 1 and len(jobs) > 1:
+        with Pool(processes) as pool:
+            tiles = pool.map(tile_worker, jobs, chunksize=max(1, len(jobs) // (4 * processes)))
+    else:
+        tiles = [tile_worker(job) for job in jobs]
+
+    walls = bytearray(width * height)
+    for tile_index, (tile, (tile_width, tile_height, _)) in enumerate(zip(tiles, jobs)):
+        left = tile_index % columns * tile_size
+        top = tile_index // columns * tile_size
+        for row in range(tile_height):
+            begin = (top + row) * width + left
+            walls[begin:begin + tile_width] = tile[row * tile_width:(row + 1) * tile_width]
+
+    # Stitch the seams along a spanning tree of the tiles
+    borders = backtracker_masks(columns, rows, rng)
+    for tile_index, tile_walls in enumerate(borders):
+        left = tile_index % columns * tile_size
+        top = tile_index // columns * tile_size
+        if not tile_walls & EAST:
+            y = top + rng.randrange(min(tile_size, height - top))
+            cell = y * width + left + tile_size - 1
+            walls[cell] &= ~EAST
+            walls[cell + 1] &= ~WEST
+        if not tile_walls & SOUTH:
+            x = left + rng.randrange(min(tile_size, width - left))
+            cell = (top + tile_size - 1) * width + x
+            walls[cell] &= ~SOUTH
+            walls[cell + width] &= ~NORTH
+    return walls
+
+
+def eller_rows(width, height, rng):
+    """
+    Perfect maze by Eller's algorithm, one row at a time. Only the set of
+    every cell of the current row is kept, so the memory is O(width) for
+    any number of rows. Yields the wall masks of every row as a bytearray;
+    with height None the rows never end, and the maze has no last row.
+
+    Every row joins neighbours of different sets at random (all of them in
+    the last row), then opens at least one cell of every set to the south.
+    The cells below that are not opened start a new set.
+    """
+    sets = list(range(width))
+    new_set = width
+    north = bytearray([NORTH]) * width  # The north walls of the next row
+    random = rng.random
+    merged = {}  # A union-find over the set labels of the current row
+
+    def find(label):
+        while label in merged:
+            parent = merged[label]
+            if parent in merged:
+                merged[label] = merged[parent]  # Path halving
+            label = parent
+        return label
+
+    y = 0
+    while height is None or y < height:
+        last = height is not None and y == height - 1
+        row = bytearray(north)
+        row[0] |= WEST
+        row[-1] |= EAST
+
+        merged.clear()
+        for x in range(width - 1):
+            left, right = find(sets[x]), find(sets[x + 1])
+            if left != right and (last or random() < 0.5):
+                merged[right] = left
+            else:
+                row[x] |= EAST
+                row[x + 1] |= WEST
+        sets = [find(label) for label in sets]
+
+        if last:
+            for x in range(width):
+                row[x] |= SOUTH
+            yield row
+            return
+
+        members = {}
+        for x, label in enumerate(sets):
+            members.setdefault(label, []).append(x)
+        down = bytearray(width)
+        for cells in members.values():
+            opened = False
+            for x in cells:
+                if random() < 0.5:
+                    down[x] = 1
+                    opened = True
+            if not opened:
+                down[cells[int(random() * len(cells))]] = 1
+        for x in range(width):
+            if down[x]:
+                north[x] = 0
+            else:
+                row[x] |= SOUTH
+                north[x] = NORTH
+                sets[x] = new_set
+                new_set += 1
+        yield row
+        y += 1
@@ -1,43 +1,61 @@
-from pygame import draw, font
-
 import sys
 
+# Wall bits of a cell, one per compass direction. A set bit means the cell has
+# a wall on that side, so a closed cell has ALL_WALLS and an open one 0.
+NORTH, EAST, SOUTH, WEST = 1, 2, 4, 8
+ALL_WALLS = NORTH | EAST | SOUTH | WEST
+COMPASS = ((0, -1), (1, 0), (0, 1), (-1, 0))  # The four directions, in bit order
+WALL_BITS = {(0, -1): NORTH, (1, 0): EAST, (0, 1): SOUTH, (-1, 0): WEST}
+
+
+def wall_steps(width):
+    """(wall bit, index step) pairs for cells stored at index y * width + x"""
+    return (NORTH, -width), (EAST, 1), (SOUTH, width), (WEST, -1)
+
+
 class GridElement:
     """
-    GridElement used as a tile in the exercise
+    GridElement used as a tile in the exercise.
+    The links to the neighbours are kept twice: as wall bits in 'walls'
+    and as the tuple 'neighbours', in the order they were linked. The
+    tuple is only replaced when a link changes, so the searches iterate
+    over it without copying; get_neighbours returns a list to modify.
+    A maze holds one GridElement per position, so they compare and
+    hash by identity. Drawing lives in renderer.py, so the maze and the
+    searches run without pygame. 'linked' is set while the GridElement
+    is in the linked cells of the maze, like 'dirty' for the touched ones.
     """
 
+    __slots__ = ('position', 'neighbours', 'walls', 'size', 'parent', 'distance', 'score', 'color',
+                 'maze', 'dirty', 'watched', 'linked')
+
     """
-    Initialise the GridElement and assign the starting values
+    Initialise the GridElement and assign the starting values.
+    The optional maze keeps track of the GridElements whose state
+    changed, see touch
     """
 
-    def __init__(self, x, y, size):
+    def __init__(self, x, y, size, maze=None):
         self.position = (x, y)
-        self.neighbours = []
+        self.neighbours = ()
+        self.walls = ALL_WALLS
         self.size = (size[0], size[1])
         self.parent = None
         self.distance = None
         self.score = None
         self.color = (255, 255, 255)
+        self.maze = maze
+        self.dirty = False
+        self.watched = False
+        self.linked = False
 
     """
-    Overload the equals operator
-    """
-
-    def __eq__(self, other):
-        return self.position == other.position
-    """
     Overload the less than operator
     """
 
     def __lt__(self, other):
         return (self.score is not None) and (other.score is None or self.score < other.score)
 
-    """
-       Overload the hash operator
-    """
-    def __hash__(self):
-        return hash(self.position)
     """
     Overload the string representation of the object
     """
@@ -50,7 +68,37 @@ class GridElement:
     """
 
     def reset_neighbours(self):
-        self.neighbours = []
+        self.neighbours = ()
+        self.walls = ALL_WALLS
+        self.linked = False
+
+    """
+    Replace all neighbours by the adjacent GridElements in cells
+    """
+
+    def set_neighbours(self, cells):
+        self.neighbours = tuple(cells)
+        walls = ALL_WALLS
+        x, y = self.position
+        for cell in self.neighbours:
+            walls &= ~WALL_BITS[cell.position[0] - x, cell.position[1] - y]
+        self.walls = walls
+
+    """
+    Open the wall to an adjacent GridElement, or close it in unlink
+    """
+
+    def link(self, other):
+        bit = WALL_BITS[other.position[0] - self.position[0], other.position[1] - self.position[1]]
+        if self.walls & bit:
+            self.walls &= ~bit
+            self.neighbours += (other,)
+
+    def unlink(self, other):
+        bit = WALL_BITS[other.position[0] - self.position[0], other.position[1] - self.position[1]]
+        if not self.walls & bit:
+            self.walls |= bit
+            self.neighbours = tuple(cell for cell in self.neighbours if cell is not other)
 
     """
     Sets the state of the GridElement 
@@ -61,9 +109,30 @@ class GridElement:
         self.score = None
         self.distance = None
         self.color = (255, 255, 255)
+        self.dirty = False
+        if self.watched:
+            self.watched = False
+            self.maze.changed.append(self)
+
+    """
+    Mark the state as changed, the setters below call this first.
+    The first change after a reset adds the GridElement to the
+    touched cells of the maze, so the next reset can skip the others.
+    A watched GridElement is shown by a renderer and adds itself to
+    the changed cells of the maze, to be redrawn.
+    """
+
+    def touch(self):
+        if not self.dirty:
+            self.dirty = True
+            if self.maze is not None:
+                self.maze.touched.append(self)
+        if self.watched:
+            self.watched = False
+            self.maze.changed.append(self)
 
     def get_neighbours(self):
-        return self.neighbours[:]
+        return list(self.neighbours)
 
     """
      Method to calculate the Manhattan distance from a certain 
@@ -84,9 +153,11 @@ class GridElement:
         return other.position[0] - self.position[0], other.position[1] - self.position[1]
 
     def set_score(self, score):
+        self.touch()
         self.score = score
 
     def set_distance(self, distance):
+        self.touch()
         self.distance = distance
 
     def get_distance(self):
@@ -103,62 +174,15 @@ class GridElement:
     """
 
     def set_parent(self, parent):
+        self.touch()
         self.parent = parent
         if parent.distance is not None:
             self.distance = parent.distance+1
 
     def set_color(self, color):
+        self.touch()
         self.color = color
 
-    """
-    Draw the GridElement
-    """
-
-    def draw_grid_element(self, surface):
-        draw.rect(surface, self.color,
-                  (self.position[0] * self.size[0], self.position[1] * self.size[1], self.size[0], self.size[1]), 0)
-
-        # discard the directions where neighbours are
-        compass = [(0, -1), (1, 0), (0, 1), (-1, 0)]  # The four directions
-        for neighbour in self.neighbours:
-            if self.direction(neighbour) in compass:
-                compass.remove(self.direction(neighbour))
-
-        for direction in compass:
-            if direction == (0, -1):  # North
-                draw.line(surface, (0, 0, 0), (self.position[0] * self.size[0], self.position[1] * self.size[1]),
-                          ((self.position[0] + 1) * self.size[0], self.position[1] * self.size[1]), 2)
-            if direction == (1, 0):  # East
-                draw.line(surface, (0, 0, 0), ((self.position[0] + 1) * self.size[0], self.position[1] * self.size[1]),
-                          ((self.position[0] + 1) * self.size[0], (self.position[1] + 1) * self.size[1]), 2)
-            if direction == (0, 1):  # South
-                draw.line(surface, (0, 0, 0), (self.position[0] * self.size[0], (self.position[1] + 1) * self.size[1]),
-                          ((self.position[0] + 1) * self.size[0], (self.position[1] + 1) * self.size[1]), 2)
-            if direction == (-1, 0):  # West
-                draw.line(surface, (0, 0, 0), (self.position[0] * self.size[0], self.position[1] * self.size[1]),
-                          (self.position[0] * self.size[0], (self.position[1] + 1) * self.size[1]), 2)
-
-        # This draw an arrow to from the parent
-        if self.parent is not None:
-
-            vector = self.direction(self.parent)
-
-            center = ((self.position[0]+0.5) * self.size[0],(self.position[1]+0.5) * self.size[1])
-
-            if vector[0] !=0:
-                left_point = (center[0]+(vector[0]-vector[1])*self.size[0]/5,center[1]+(vector[1]-vector[0])*self.size[0]/5)
-                right_point = (center[0] + (vector[0] - vector[1]) * self.size[0] / 5, center[1] + (vector[1] + vector[0]) * self.size[0] / 5)
-            else:
-                left_point = (center[0] + (vector[0] - vector[1]) * self.size[0] / 5,
-                              center[1] + (vector[1] + vector[0]) * self.size[0] / 5)
-                right_point = (center[0] + (vector[0] + vector[1]) * self.size[0] / 5,
-                               center[1] + (vector[1] + vector[0]) * self.size[0] / 5)
-            draw.polygon(surface, (100,100,100),(center,left_point,right_point))
-            entry_point= (center[0]+vector[0]*self.size[0]/2,center[1]+vector[1]*self.size[1]/2)
-            end_point = (center[0] + vector[0] * self.size[0] / 5, center[1] + vector[1] * self.size[1] / 5)
-            draw.line(surface, (100,100,100),end_point,entry_point,int(self.size[0]/20)+1)
-
-
     def print_neighbours(self):
 
         directions = []
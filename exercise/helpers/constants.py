@@ -8,6 +8,13 @@ class Constants:
     CELL_SIZE = 20
     GRID_COLS = int(WINDOW_WIDTH / CELL_SIZE)
     GRID_ROWS = int(WINDOW_HEIGHT / CELL_SIZE)
+    SEARCH_BUDGET = 0.008  # Seconds per frame spent on a running search
+    GENERATE_BUDGET = 0.008  # Seconds per frame spent on the rows of the huge maze of the H key
+    MAZE_FILE = "maze.bin"  # Written with the S key, read with the L key
+    ROW_INTERVAL = 100  # Milliseconds between two rows of the endless maze of the E key
+    PAN_SPEED = 0.5  # Pixels per millisecond the arrow keys move the view
+    ZOOM_STEP = 1.25  # Zoom factor of one step of the mouse wheel
+    HUGE_GRID = 4000  # Cells along the side of the maze of the H key
 
 
 
@@ -0,0 +1,363 @@
+"""
+Hierarchical path-finding A* (HPA*): the maze is cut into square clusters
+and the openings between neighbouring clusters become the nodes of a small
+abstract graph. A query searches that graph and only then follows the
+cells, one cluster at a time.
+"""
+import heapq
+from exercise.grid_element import NORTH, EAST, SOUTH, WEST, wall_steps
+
+INFINITY = float('inf')
+LONG_OPENING = 6  # An opening of this many cells or more gets a node at both ends instead of one in the middle
+
+# Close one side of a wall mask, for the walls along the cluster borders
+CLOSE = {bit: bytes(mask | bit for mask in range(256)) for bit in (NORTH, EAST, SOUTH, WEST)}
+# Keep only one side of a wall mask, to find the walls inside a cluster
+ONLY = {bit: bytes(mask & bit for mask in range(256)) for bit in (EAST, SOUTH)}
+
+
+class HierarchicalPlanner:
+    """
+    HPA* over the wall masks of a maze, with clusters of cluster_size x
+    cluster_size cells. Every run of open walls along the border of two
+    clusters is an entrance: a pair of cells, one on each side, linked by
+    an edge of length 1. Within a cluster the entrance cells are linked by
+    their distance inside the cluster, found by breadth first searches
+    that cannot leave it ('closed' has the cluster borders walled up).
+
+    A query links the source and the target to the entrances of their
+    clusters, runs A* over the abstract graph and refines its edges into
+    cells. The length is exact within the clusters but the path can be a
+    few steps longer than the shortest, as an opening of many cells only
+    has one or two entrances.
+
+    Between two queries the planner reads the links changed through
+    add_link and del_link (see Maze.watch_links): a link inside a cluster
+    only updates the distances of that cluster, a link across or along a
+    border also finds the entrances of that border again. Links changed in bulk
+    rebuild the whole graph, like LifelongPlanner starts over.
+    """
+
+    def __init__(self, maze, cluster_size=32):
+        self.maze = maze
+        self.cluster_size = cluster_size
+        self.changes = maze.watch_links()
+        self.version = None
+        self.expanded = 0  # Abstract nodes expanded by the last query
+
+    """
+    Stop watching the links of the maze, for a planner that is replaced
+    """
+
+    def close(self):
+        self.maze.unwatch_links(self.changes)
+        return None
+
+    def build(self):
+        width, height = self.maze.grid_size
+        size = self.cluster_size
+        self.version = self.maze.version
+        self.maze.take_link_changes(self.changes)
+        self.width = width
+        self.columns = (width + size - 1) // size
+        self.rows = (height + size - 1) // size
+        self.steps = wall_steps(width)
+        self.masks = bytearray(self.maze.wall_masks())
+        self.closed = bytearray(self.masks)
+        for x in range(size, width, size):
+            self.closed[x::width] = self.closed[x::width].translate(CLOSE[WEST])
+            self.closed[x - 1::width] = self.closed[x - 1::width].translate(CLOSE[EAST])
+        for y in range(size, height, size):
+            self.closed[y * width:(y + 1) * width] = self.closed[y * width:(y + 1) * width].translate(CLOSE[NORTH])
+            self.closed[(y - 1) * width:y * width] = self.closed[(y - 1) * width:y * width].translate(CLOSE[SOUTH])
+
+        self.entrances = {}  # (cluster, cluster to the east or south) -> [(cell, cell across)]
+        self.nodes = {}  # cluster -> cells of its entrances
+        self.open = {}  # cluster -> True when it has no walls inside
+        self.edges = {}  # node -> {node: length}
+        for cluster in range(self.columns * self.rows):
+            for other in self.neighbour_clusters(cluster):
+                if other > cluster:
+                    self.find_entrances(cluster, other)
+        for cluster in range(self.columns * self.rows):
+            self.connect(cluster)
+
+    """
+    Bring the graph up to date with the links changed in the maze
+    """
+
+    def sync(self):
+        changes = self.maze.take_link_changes(self.changes)
+        if self.version is None or self.maze.version != self.version + len(changes):
+            self.build()
+            return
+        self.version = self.maze.version
+        borders = set()
+        clusters = set()
+        for cell1, cell2 in changes:
+            index1, index2 = self.index(cell1), self.index(cell2)
+            for index, cell in ((index1, cell1), (index2, cell2)):
+                border_walls = self.border_walls(index)
+                self.masks[index] = cell.walls
+                self.closed[index] = cell.walls | border_walls
+                # A link along a border can split or join its openings as well
+                cluster = self.cluster(index)
+                clusters.add(cluster)
+                for bit, step in self.steps:
+                    if border_walls & bit:
+                        other = self.cluster(index + step)
+                        borders.add((min(cluster, other), max(cluster, other)))
+        for cluster, other in borders:
+            self.find_entrances(cluster, other)
+            clusters.update((cluster, other))
+        for cluster in clusters:
+            self.connect(cluster)
+
+    def index(self, cell):
+        x, y = cell.position if hasattr(cell, 'position') else cell
+        return y * self.maze.grid_size[0] + x
+
+    def cluster(self, index):
+        return (index // self.width // self.cluster_size) * self.columns + index % self.width // self.cluster_size
+
+    def neighbour_clusters(self, cluster):
+        column, row = cluster % self.columns, cluster // self.columns
+        if column > 0:
+            yield cluster - 1
+        if column < self.columns - 1:
+            yield cluster + 1
+        if row > 0:
+            yield cluster - self.columns
+        if row < self.rows - 1:
+            yield cluster + self.columns
+
+    def border_walls(self, index):
+        width, height = self.maze.grid_size
+        size = self.cluster_size
+        x, y = index % width, index // width
+        walls = 0
+        if x % size == 0 and x > 0:
+            walls |= WEST
+        if x % size == size - 1 and x < width - 1:
+            walls |= EAST
+        if y % size == 0 and y > 0:
+            walls |= NORTH
+        if y % size == size - 1 and y < height - 1:
+            walls |= SOUTH
+        return walls
+
+    """
+    Find the entrances between a cluster and the one to its east or south,
+    replacing the ones found before
+    """
+
+    def find_entrances(self, cluster, other):
+        width, height = self.maze.grid_size
+        size = self.cluster_size
+        column, row = cluster % self.columns, cluster // self.columns
+        # The cells along the border on the side of cluster, the wall bit
+        # towards other, and the bit linking a cell to the next one along.
+        # With a single column of clusters cluster + 1 is the one below
+        if other // self.columns == row:
+            x = (column + 1) * size - 1
+            cells = [y * width + x for y in range(row * size, min((row + 1) * size, height))]
+            bit, step, along = EAST, 1, SOUTH
+        else:
+            y = (row + 1) * size - 1
+            cells = [y * width + x for x in range(column * size, min((column + 1) * size, width))]
+            bit, step, along = SOUTH, width, EAST
+
+        for cell, across in self.entrances.get((cluster, other), ()):
+            del self.edges[cell][across]
+            del self.edges[across][cell]
+        # An opening is a run of open walls whose cells are also linked
+        # along the border on both sides, so any of them leads to the others
+        masks = self.masks
+        entrances = []
+        run = []
+        for cell in cells + [None]:
+            if len(run) > 0 and (cell is None or masks[run[-1]] & along or masks[run[-1] + step] & along or
+                                 masks[cell] & bit):
+                ends = (run[0], run[-1]) if len(run) >= LONG_OPENING else (run[len(run) // 2],)
+                entrances.extend((end, end + step) for end in ends)
+                run = []
+            if cell is not None and not masks[cell] & bit:
+                run.append(cell)
+        self.entrances[(cluster, other)] = entrances
+        for cell, across in entrances:
+            self.edges.setdefault(cell, {})[across] = 1
+            self.edges.setdefault(across, {})[cell] = 1
+
+    """
+    Collect the entrance cells of a cluster and link them by their
+    distances inside the cluster
+    """
+
+    def connect(self, cluster):
+        nodes = set()
+        for other in self.neighbour_clusters(cluster):
+            for cell, across in self.entrances.get((min(cluster, other), max(cluster, other)), ()):
+                nodes.add(cell if other > cluster else across)
+        for node in self.nodes.get(cluster, ()):
+            edges = self.edges.get(node)
+            if edges is not None:
+                for other in [other for other in edges if self.cluster(other) == cluster]:
+                    del edges[other]
+                if len(edges) == 0 and node not in nodes:
+                    del self.edges[node]
+        self.nodes[cluster] = nodes
+        self.open[cluster] = self.is_open(cluster)
+
+        remaining = sorted(nodes)
+        while len(remaining) > 1:
+            node = remaining.pop()
+            for other, distance in self.intra_distances(node, remaining).items():
+                self.edges[node][other] = distance
+                self.edges[other][node] = distance
+
+    """
+    Whether no wall separates two cells of the cluster, checked a row of
+    masks at a time
+    """
+
+    def is_open(self, cluster):
+        width, height = self.maze.grid_size
+        size = self.cluster_size
+        left, top = cluster % self.columns * size, cluster // self.columns * size
+        right, bottom = min(left + size, width), min(top + size, height)
+        for y in range(top, bottom):
+            row = self.masks[y * width + left:y * width + right]
+            if row[:-1].translate(ONLY[EAST]).count(0) != len(row) - 1:
+                return False
+            if y < bottom - 1 and row.translate(ONLY[SOUTH]).count(0) != len(row):
+                return False
+        return True
+
+    """
+    The distances from source to the cells in targets inside its cluster,
+    as {target: distance} of the reachable ones. In a cluster without walls
+    inside they are the Manhattan distances, otherwise a search finds them.
+    """
+
+    def intra_distances(self, source, targets):
+        if not self.open[self.cluster(source)]:
+            return self.cluster_distances(source, targets)
+        width = self.width
+        x, y = source % width, source // width
+        return {target: abs(target % width - x) + abs(target // width - y) for target in targets}
+
+    """
+    Breadth first search inside the cluster of source, until the cells in
+    targets are reached. Returns {target: distance} of the reachable ones,
+    and with parents=True the parent of every visited cell as well.
+    """
+
+    def cluster_distances(self, source, targets, parents=False):
+        closed = self.closed
+        steps = self.steps
+        remaining = set(targets)
+        found = {}
+        if source in remaining:
+            remaining.discard(source)
+            found[source] = 0
+        seen = {source: None}
+        frontier = [source]
+        distance = 0
+        while len(frontier) > 0 and len(remaining) > 0:
+            distance += 1
+            next_frontier = []
+            for cell in frontier:
+                walls = closed[cell]
+                for bit, step in steps:
+                    if not walls & bit:
+                        neighbour = cell + step
+                        if neighbour not in seen:
+                            seen[neighbour] = cell
+                            next_frontier.append(neighbour)
+                            if neighbour in remaining:
+                                remaining.discard(neighbour)
+                                found[neighbour] = distance
+            frontier = next_frontier
+        return (found, seen) if parents else found
+
+    """
+    The abstract path from source to target, GridElements or (x, y)
+    positions, as a list of cell indices with its length, or None when
+    the target cannot be reached
+    """
+
+    def plan(self, source, target):
+        self.sync()
+        source, target = self.index(source), self.index(target)
+        self.expanded = 0
+        if source == target:
+            return [source], 0
+        source_cluster, target_cluster = self.cluster(source), self.cluster(target)
+        source_targets = self.nodes[source_cluster] | {target} if source_cluster == target_cluster else \
+            self.nodes[source_cluster]
+        source_edges = self.intra_distances(source, source_targets)
+        target_edges = self.intra_distances(target, self.nodes[target_cluster])
+
+        width = self.width
+        target_x, target_y = target % width, target // width
+        distances = {source: 0}
+        parents = {source: None}
+        heap = [(0, 0, source)]
+        done = set()
+        edges = self.edges
+        while len(heap) > 0:
+            _, negative_distance, node = heapq.heappop(heap)
+            if node in done:
+                continue
+            if node == target:
+                break
+            done.add(node)
+            self.expanded += 1
+            distance = -negative_distance
+            successors = list(edges.get(node, {}).items())
+            if node == source:
+                successors.extend(source_edges.items())
+            if node in target_edges:
+                successors.append((target, target_edges[node]))
+            for other, length in successors:
+                other_distance = distance + length
+                if other_distance < distances.get(other, INFINITY):
+                    distances[other] = other_distance
+                    parents[other] = node
+                    estimate = other_distance + abs(other % width - target_x) + abs(other // width - target_y)
+                    # Equal estimates go to the node furthest from the source, like best_first_steps
+                    heapq.heappush(heap, (estimate, -other_distance, other))
+        else:
+            return None
+
+        nodes = [target]
+        while parents[nodes[-1]] is not None:
+            nodes.append(parents[nodes[-1]])
+        nodes.reverse()
+        return nodes, distances[target]
+
+    def distance(self, source, target):
+        plan = self.plan(source, target)
+        return None if plan is None else plan[1]
+
+    """
+    The positions of the cells from source to target, refining the
+    abstract path one cluster at a time, or None when it cannot be reached
+    """
+
+    def path(self, source, target):
+        plan = self.plan(source, target)
+        if plan is None:
+            return None
+        nodes = plan[0]
+        cells = [nodes[0]]
+        for node, next_node in zip(nodes, nodes[1:]):
+            if self.cluster(node) != self.cluster(next_node):
+                cells.append(next_node)  # An entrance, the cells are adjacent
+                continue
+            _, parents = self.cluster_distances(node, (next_node,), parents=True)
+            segment = [next_node]
+            while segment[-1] != node:
+                segment.append(parents[segment[-1]])
+            cells.extend(reversed(segment[:-1]))
+        return [(cell % self.width, cell // self.width) for cell in cells]
@@ -0,0 +1,147 @@
+"""
+Lifelong Planning A* (LPA*): a shortest path search that keeps its state
+between queries and only repairs what a change of the maze touched
+"""
+import heapq
+
+INFINITY = float('inf')
+
+
+class LifelongPlanner:
+    """
+    LPA* from the source of a maze to its target. Every cell has a g value,
+    its distance as last expanded, and an rhs value, the best distance
+    through its neighbours (rhs = min g(neighbour) + 1). A cell whose two
+    values differ is inconsistent and waits in the heap, ordered on
+    (min(g, rhs) + Manhattan distance to the target, min(g, rhs)).
+
+    Between two plans the planner reads the links changed through add_link
+    and del_link (see Maze.watch_links) and only updates the cells at both
+    ends. A new target keeps all distances and only orders the heap again;
+    a new source, or links changed in bulk, starts the planner over, as
+    the distances are rooted at the source. Outdated heap entries are
+    skipped when they are popped, like in Search.best_first_steps.
+    """
+
+    def __init__(self, maze):
+        self.maze = maze
+        self.source = None
+        self.target = None
+        self.version = None
+        self.g = {}
+        self.rhs = {}
+        self.heap = []
+        self.counter = 0
+        self.changes = maze.watch_links()
+
+    """
+    Stop watching the links of the maze, for a planner that is replaced
+    """
+
+    def close(self):
+        self.maze.unwatch_links(self.changes)
+        return None
+
+    def restart(self):
+        self.source = self.maze.start
+        self.target = self.maze.target
+        self.g.clear()
+        self.rhs = {self.source: 0}
+        self.heap = []
+        self.counter = 0
+        self.push(self.source)
+
+    """
+    Bring the planner up to date with the maze: the changed links,
+    the source and the target
+    """
+
+    def sync(self):
+        changes = self.maze.take_link_changes(self.changes)
+        if self.source is None or self.source != self.maze.start or \
+                self.maze.version != self.version + len(changes):
+            self.restart()
+        else:
+            for cell1, cell2 in changes:
+                self.update(cell1)
+                self.update(cell2)
+            if self.target != self.maze.target:
+                self.target = self.maze.target
+                self.rekey()
+        self.version = self.maze.version
+
+    def key(self, cell):
+        best = min(self.g.get(cell, INFINITY), self.rhs.get(cell, INFINITY))
+        return best + cell.manhattan_distance(self.target), best
+
+    def push(self, cell):
+        first, second = self.key(cell)
+        self.counter -= 1
+        heapq.heappush(self.heap, (first, second, self.counter, cell))
+
+    def rekey(self):
+        # The heuristic changed with the target, so every key changes
+        inconsistent = {entry[3] for entry in self.heap if not self.consistent(entry[3])}
+        self.heap = []
+        for cell in inconsistent:
+            self.push(cell)
+
+    def consistent(self, cell):
+        return self.g.get(cell, INFINITY) == self.rhs.get(cell, INFINITY)
+
+    def update(self, cell):
+        if cell != self.source:
+            best = INFINITY
+            for neighbour in cell.neighbours:
+                distance = self.g.get(neighbour, INFINITY) + 1
+                if distance < best:
+                    best = distance
+            if best == INFINITY:
+                self.rhs.pop(cell, None)
+            else:
+                self.rhs[cell] = best
+        if not self.consistent(cell):
+            self.push(cell)
+
+    """
+    Expand cells until the distance of the target is final, yielding
+    every expanded cell. Can be stopped at any step and continued by
+    the next plan.
+    """
+
+    def plan_steps(self):
+        self.sync()
+        target = self.target
+        heap = self.heap
+        while len(heap) > 0 and (heap[0][:2] < self.key(target) or not self.consistent(target)):
+            first, second, _, cell = heapq.heappop(heap)
+            if self.consistent(cell) or (first, second) != self.key(cell):
+                continue  # An outdated entry
+            rhs = self.rhs.get(cell, INFINITY)
+            if self.g.get(cell, INFINITY) > rhs:
+                self.g[cell] = rhs
+            else:
+                self.g.pop(cell, None)
+                self.update(cell)
+            for neighbour in cell.neighbours:
+                self.update(neighbour)
+            yield cell
+
+    def distance(self):
+        distance = self.g.get(self.target, INFINITY)
+        return None if distance == INFINITY else distance
+
+    """
+    The cells from the source to the target, following the neighbour
+    with the smallest g, or None when the target is unreachable
+    """
+
+    def path(self):
+        distance = self.distance()
+        if distance is None:
+            return None
+        path = [self.target]
+        for _ in range(distance):
+            path.append(min(path[-1].neighbours, key=lambda neighbour: self.g.get(neighbour, INFINITY)))
+        path.reverse()
+        return path
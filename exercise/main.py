@@ -1,9 +1,15 @@
 import pygame
+import random
 import sys
+import time
+from exercise.compact_maze import CompactMaze
+from exercise.generators import eller_rows
 from exercise.helpers.keyboard_handler import KeyboardHandler
 from exercise.maze import Maze
 from exercise.helpers.constants import Constants
 from exercise.search import Search
+from exercise.search_stats import SearchStats
+from exercise.viewport import Camera, ViewportRenderer
 
 
 class Game:
@@ -17,10 +23,41 @@ class Game:
         self.screen = pygame.display.set_mode(self.size)
         self.keyboard_handler = KeyboardHandler()
         self.font = pygame.font.SysFont(pygame.font.get_fonts()[0], 64)
+        self.small_font = pygame.font.SysFont(pygame.font.get_fonts()[0], 16)
         self.time = pygame.time.get_ticks()
-        self.maze = Maze(Constants.GRID_COLS, Constants.GRID_ROWS, self.size)
-        self.maze.generate_maze()
-        self.search = Search(self.maze)
+        self.steps = None  # The search in progress, see update_game
+        self.replan = False  # Run the incremental search again after every click
+        self.rows = None  # The endless rows scrolling through the maze, see update_game
+        self.row_time = 0
+        self.growing = None  # The huge maze of the H key, its rows and their walls while they are made
+        self.dragging = False  # Panning with the middle mouse button
+        self.search = None
+        self.renderer = None
+        maze = Maze(Constants.GRID_COLS, Constants.GRID_ROWS, self.size)
+        maze.generate_maze(seed=self.new_seed("Maze"))
+        self.show_maze(maze)
+
+    """
+    Make maze the maze of the game, shown whole in the window
+    """
+    def show_maze(self, maze):
+        self.maze = maze
+        self.search = Search(maze, None if self.search is None else self.search.stats)
+        self.steps = None
+        self.camera = Camera(maze.grid_size, self.size)
+        if self.renderer is not None:
+            self.renderer.close()
+        self.renderer = ViewportRenderer(maze, self.camera)
+        self.overlay = None  # The rectangle of the stats overlay, toggled with the I key
+
+    """
+    Draw the seed of a new maze and print it, so the maze can be made
+    again for a bug report
+    """
+    def new_seed(self, name):
+        seed = random.randrange(2 ** 32)
+        print("Generating", name, "with seed", seed)
+        return seed
 
     """
     Method 'game_loop' will be executed every frame to drive
@@ -37,25 +74,73 @@ class Game:
         self.draw_components()
     """
     Method 'update_game' is there to update the state of variables 
-    and objects from frame to frame.
+    and objects from frame to frame. A running search continues
+    for a fixed time budget every frame, and an endless maze
+    scrolls up by a row every ROW_INTERVAL. The rows of a huge
+    maze are made in the same way, see grow_maze. The arrow keys
+    move the view while they are pressed.
     """
     def update_game(self, dt):
-        pass
+        dx = self.keyboard_handler.get_key_pressed(pygame.K_RIGHT) - self.keyboard_handler.get_key_pressed(pygame.K_LEFT)
+        dy = self.keyboard_handler.get_key_pressed(pygame.K_DOWN) - self.keyboard_handler.get_key_pressed(pygame.K_UP)
+        if dx != 0 or dy != 0:
+            self.camera.pan(dx * Constants.PAN_SPEED * dt, dy * Constants.PAN_SPEED * dt)
+        if self.rows is not None:
+            self.row_time += dt
+            if self.row_time >= Constants.ROW_INTERVAL:
+                count = self.row_time // Constants.ROW_INTERVAL
+                self.row_time -= count * Constants.ROW_INTERVAL
+                self.maze.push_rows(next(self.rows) for _ in range(count))
+                self.steps = self.search.incremental_steps() if self.replan else None
+        if self.growing is not None:
+            self.grow_maze()
+        if self.steps is not None and self.search.advance(self.steps, Constants.SEARCH_BUDGET):
+            self.steps = None
+
+    """
+    Make rows of the huge maze for GENERATE_BUDGET, and show the
+    maze once it has all of them
+    """
+    def grow_maze(self):
+        maze, rows, walls = self.growing
+        end = time.perf_counter() + Constants.GENERATE_BUDGET
+        for row in rows:
+            walls += row
+            if time.perf_counter() > end:
+                return
+        self.growing = None
+        maze.load_wall_masks(walls)
+        self.show_maze(maze)
 
     """
     Method 'draw_components' is similar is meant to contain 
     everything that draws one frame. It is similar to method
     void draw() in Processing. Put all draw calls here. Leave all
-    updates in method 'update'
+    updates in method 'update'. Only the changed parts of the maze
+    are drawn and passed on to the display.
     """
     def draw_components(self):
-        self.screen.fill([255, 255, 255])
-        self.maze.draw_maze(self.screen)
-        pygame.display.flip()
+        changed = self.renderer.draw(self.screen)
+        if self.overlay is not None:
+            changed.append(self.renderer.draw_area(self.screen, self.overlay))
+            self.overlay = None
+        if self.search.stats is not None:
+            self.overlay = self.draw_score()
+            changed.append(self.overlay)
+        if len(changed) > 0:
+            pygame.display.update(changed)
 
+    """
+    Draw the stats of the last search in the top left corner and
+    return the rectangle they cover
+    """
     def draw_score(self):
-        text = self.font.render(str(self.maze.target.distance), True, (0,0,0))
-        self.screen.blit(text, (self.size[0]/2-64, 20))
+        lines = ["path length {}".format(self.maze.target.distance)] + self.search.stats.lines()
+        rect = pygame.Rect(0, 0, 0, 0)
+        for number, line in enumerate(lines):
+            text = self.small_font.render(line, True, (0, 0, 0), (255, 255, 255))
+            rect.union_ip(self.screen.blit(text, (4, 4 + number * text.get_height())))
+        return rect
 
     def reset(self):
         pass
@@ -87,21 +172,67 @@ class Game:
     """
     def handle_key_down(self, event):
         self.keyboard_handler.key_pressed(event.key)
+        if event.key in (pygame.K_m, pygame.K_o, pygame.K_r, pygame.K_l, pygame.K_h):
+            self.rows = None
+            self.growing = None
         if event.key == pygame.K_m:
-            print("Generating Maze")
-            self.maze.generate_maze()
+            self.steps = None
+            self.maze.generate_maze(seed=self.new_seed("Maze"))
+        if event.key == pygame.K_e:
+            self.steps = None
+            self.rows = eller_rows(self.maze.grid_size[0], None, random.Random(self.new_seed("Endless Maze")))
+            self.row_time = 0
+            self.maze.push_rows(next(self.rows) for _ in range(self.maze.grid_size[1]))
         if event.key == pygame.K_o:
-            print("Generating Obstacle")
-            self.maze.generate_obstacles()
+            self.steps = None
+            self.maze.generate_obstacles(seed=self.new_seed("Obstacle"))
         if event.key == pygame.K_r:
             print("Generating Rooms")
+            self.steps = None
             self.maze.generate_room()
+        if event.key == pygame.K_s:
+            print("Saving Maze to", Constants.MAZE_FILE)
+            self.maze.save(Constants.MAZE_FILE)
+        if event.key == pygame.K_l:
+            print("Loading Maze from", Constants.MAZE_FILE)
+            self.show_maze(Maze.load(Constants.MAZE_FILE, self.size))
+        if event.key == pygame.K_h:
+            # The same maze as generate_eller_maze with this seed, a few rows per frame
+            maze = CompactMaze(Constants.HUGE_GRID, Constants.HUGE_GRID, self.size)
+            rows = eller_rows(Constants.HUGE_GRID, Constants.HUGE_GRID, random.Random(self.new_seed("a huge maze")))
+            self.growing = (maze, rows, bytearray())
+        if event.key == pygame.K_f:
+            self.camera.fit()
         if event.key == pygame.K_b:
             print("BFS")
-            self.search.breadth_first_solution()
+            self.steps = self.search.breadth_first_steps()
+            self.replan = False
         if event.key == pygame.K_d:
             print("DFS")
-            self.search.depth_first_solution()
+            self.steps = self.search.depth_first_steps()
+            self.replan = False
+        if event.key == pygame.K_g:
+            print("Greedy")
+            self.steps = self.search.best_first_steps(use_distance=False)
+            self.replan = False
+        if event.key == pygame.K_a:
+            print("A*")
+            self.steps = self.search.best_first_steps(use_distance=True)
+            self.replan = False
+        if event.key == pygame.K_j:
+            print("JPS")
+            self.steps = self.search.jump_point_steps()
+            self.replan = False
+        if event.key == pygame.K_p:
+            print("LPA*")
+            self.steps = self.search.incremental_steps()
+            self.replan = True
+        if event.key == pygame.K_c:
+            print("HPA*")
+            self.steps = self.search.hierarchical_steps()
+            self.replan = False
+        if event.key == pygame.K_i:
+            self.search.stats = SearchStats() if self.search.stats is None else None
 
 
 
@@ -119,24 +250,34 @@ class Game:
     Similar to void mouseMoved() in Processing
     """
     def handle_mouse_motion(self, event):
-        pass
+        if self.dragging:
+            self.camera.pan(-event.rel[0], -event.rel[1])
 
     """
     Similar to void mousePressed() in Processing
     """
     def handle_mouse_pressed(self, event):
-        x = int(event.pos[0] / self.maze.cell_width)
-        y = int(event.pos[1] / self.maze.cell_height)
+        if event.button == 2:
+            self.dragging = True
+        if event.button in (4, 5):  # The mouse wheel
+            self.camera.zoom_at(Constants.ZOOM_STEP if event.button == 4 else 1 / Constants.ZOOM_STEP, event.pos)
+        if event.button not in (1, 3) or self.camera.cell_at(event.pos) is None:
+            return
+        x, y = self.camera.cell_at(event.pos)
+        self.steps = None
         if event.button==1:
             self.maze.set_source(self.maze.grid[x][y])
         if event.button == 3:
             self.maze.set_target(self.maze.grid[x][y])
+        if self.replan:
+            self.steps = self.search.incremental_steps()
 
     """
     Similar to void mouseReleased() in Processing
     """
     def handle_mouse_released(self, event):
-        pass
+        if event.button == 2:
+            self.dragging = False
 
 
 if __name__ == "__main__":
@@ -1,6 +1,22 @@
+import os
 import random
+import weakref
+from array import array
 from datetime import datetime
-from exercise.grid_element import GridElement
+from exercise.components import ComponentIndex
+from exercise.distance_index import DistanceIndex, index_path
+from exercise.grid_element import GridElement, ALL_WALLS, NORTH, EAST, SOUTH, WALL_BITS
+from exercise.generators import backtracker_masks, add_random_links, tiled_masks, eller_rows
+from exercise.maze_file import MazeFile, MazeWriter
+
+# The generators by name; those in SEEDED_LAYOUTS are random and take a seed
+SEEDED_LAYOUTS = ('generate_maze', 'generate_fast_maze', 'generate_tiled_maze', 'generate_eller_maze',
+                  'generate_obstacles')
+LAYOUTS = SEEDED_LAYOUTS + ('generate_room', 'generate_open_maze')
+
+
+class LinkChanges(list):
+    """The links changed since a watcher took them, see Maze.watch_links"""
 
 
 class Maze:
@@ -9,42 +25,166 @@ class Maze:
         This class also contains search algorithms for
         depth first, breath first, greedy and A* star search to
         solve the generated mazes
+
+        The random generators draw from 'rng', the random module unless
+        a random.Random is given, or from a random.Random of their own
+        when they are called with a seed. The same seed, size and start
+        give the same maze again, bit for bit.
         """
 
-    def __init__(self, grid_size_x, grid_size_y, screen_size):
+    def __init__(self, grid_size_x, grid_size_y, screen_size, rng=None):
         self.grid_size = (grid_size_x, grid_size_y)
+        self.rng = random if rng is None else rng
         self.cell_width = screen_size[0] / grid_size_x
         self.cell_height = screen_size[1] / grid_size_y
-        self.grid = []
-        for x in range(grid_size_x):
-            self.grid.append([])
-            for y in range(grid_size_y):
-                self.grid[x].append(GridElement(x, y, (self.cell_width, self.cell_height)))
+        self.version = 0  # Increases with every change of the links between cells
+        self.first_row = 0  # The row of a longer maze shown in grid row 0, see push_rows
+        self.link_watchers = weakref.WeakValueDictionary()  # id -> LinkChanges of a watcher, see watch_links
+        self.components = None  # Made by component_index on first use
+        self.distance_index = None  # Guides A* once made, see build_distance_index
+        self.grid = self.create_grid()
         self.start = self.grid[0][0]
         self.target = self.grid[-1][-1]
         self.reset_all()
 
+    """
+    Creates the grid[x][y] of cells, one GridElement object per cell.
+    Cells whose state changes add themselves to 'touched' and add_link
+    keeps track of cells that got neighbours in 'linked', so the resets
+    below only visit the cells changed since the previous reset.
+    Watched cells add themselves to 'changed', see watch_changes.
+    """
+
+    def create_grid(self):
+        self.touched = []
+        self.linked = []
+        self.changed = []
+        grid = []
+        for x in range(self.grid_size[0]):
+            grid.append([])
+            for y in range(self.grid_size[1]):
+                grid[x].append(GridElement(x, y, (self.cell_width, self.cell_height), self))
+        return grid
+
     """
     Resets the GridElements of the maze
     """
 
     def reset_all(self):
-        for row in self.grid:
-            for cell in row:
-                cell.reset_neighbours()
+        self.change_in_bulk()
+        for cell in self.linked:
+            cell.reset_neighbours()
+        self.linked.clear()
         self.reset_state()
         return None
 
     def reset_state(self):
-        for row in self.grid:
-            for cell in row:
-                cell.reset_state()
+        for cell in self.touched:
+            cell.reset_state()
+        self.touched.clear()
+        self.reset_endpoints()
+        return None
+
+    def reset_endpoints(self):
         self.start.set_distance(0)
         self.start.set_score(0)
-        self.start.color = (0, 255, 0)
-        self.target.color = (240, 60, 20)
+        self.start.set_color((0, 255, 0))
+        self.target.set_color((240, 60, 20))
+        return None
+
+    """
+    Start reporting state changes of every cell to take_changes,
+    used by a renderer after drawing the whole maze
+    """
+
+    def watch_changes(self):
+        for col in self.grid:
+            for cell in col:
+                cell.watched = True
+        self.changed = []
+        return None
+
+    """
+    The cells whose state changed since the previous call. With a limit,
+    None when more cells changed than that, for a caller that then draws
+    everything again anyway.
+    """
+
+    def take_changes(self, limit=None):
+        changed = self.changed
+        self.changed = []
+        for cell in changed:
+            cell.watched = True
+        if limit is not None and len(changed) > limit:
+            return None
+        return changed
+
+    """
+    Start recording the pairs of cells passed to add_link and del_link,
+    one for every increase of the version, in a new list for the caller.
+    Every planner watches with a list of its own and takes the changes
+    from it with take_link_changes. A planner compares the number of
+    pairs with the version to find the links changed in bulk.
+    The maze only holds the lists weakly, so a planner that is dropped
+    stops watching; unwatch_links stops a watcher that is kept.
+    """
+
+    def watch_links(self):
+        changes = LinkChanges()
+        self.link_watchers[id(changes)] = changes
+        return changes
+
+    def unwatch_links(self, changes):
+        if self.link_watchers.get(id(changes)) is changes:
+            del self.link_watchers[id(changes)]
         return None
 
+    def take_link_changes(self, changes):
+        taken = changes[:]
+        changes.clear()
+        return taken
+
+    """
+    Count a change of many links at once. The watchers get no pairs for
+    it: the version tells them to start over, so the pairs recorded
+    before are dropped as well.
+    """
+
+    def change_in_bulk(self):
+        self.version += 1
+        for changes in self.link_watchers.values():
+            changes.clear()
+        return None
+
+    """
+    The ComponentIndex of the maze, made on the first call and shared by
+    every search of the maze from then on
+    """
+
+    def component_index(self):
+        if self.components is None:
+            self.components = ComponentIndex(self)
+        return self.components
+
+    """
+    Build a DistanceIndex for the maze with the given number of landmarks.
+    A* takes its lower bounds from then on, and save writes it next to the
+    maze file.
+    """
+
+    def build_distance_index(self, landmarks=8):
+        if self.distance_index is not None:
+            self.distance_index.close()
+        self.distance_index = DistanceIndex(self, landmarks)
+        return self.distance_index
+
+    """
+    The cells that may differ from their reset state
+    """
+
+    def state_cells(self):
+        return list(self.touched)
+
     def set_source(self, cell):
         if cell != self.target:
             self.start = cell
@@ -61,12 +201,6 @@ class Maze:
             print(row)
         return None
 
-    def draw_maze(self, surface):
-        for row in self.grid:
-            for element in row:
-                element.draw_grid_element(surface)
-        return None
-
     def possible_neighbours(self, cell):
         neighbours = []
         if cell.position[0] > 0:  # North
@@ -79,24 +213,138 @@ class Maze:
             neighbours.append(self.grid[cell.position[0]][cell.position[1] - 1])
         return neighbours
 
+    """
+    Export the walls of all cells as a flat array of wall bits, 
+    indexed by y * width + x
+    """
+
+    def wall_masks(self):
+        width = self.grid_size[0]
+        masks = array('B', [ALL_WALLS]) * (width * self.grid_size[1])
+        for x, col in enumerate(self.grid):
+            for y, cell in enumerate(col):
+                masks[y * width + x] = cell.walls
+        return masks
+
+    """
+    The wall masks and the colored cells of a rectangle of cells, for
+    a renderer that only shows part of the maze. The masks are indexed
+    by (y - top) * width + x - left, the colors are ((x, y), color) pairs.
+    """
+
+    def wall_rows(self, left, top, width, height):
+        masks = bytearray(width * height)
+        for x in range(width):
+            col = self.grid[left + x]
+            for y in range(height):
+                masks[y * width + x] = col[top + y].walls
+        return masks
+
+    def colors_in(self, left, top, width, height):
+        colors = []
+        for col in self.grid[left:left + width]:
+            for cell in col[top:top + height]:
+                if cell.color != (255, 255, 255):
+                    colors.append((cell.position, cell.color))
+        return colors
+
+    """
+    Rebuild the links of the maze from an array made by wall_masks.
+    Only the east and south walls of the cells are read, the other
+    sides follow from their neighbours. The neighbours are stored
+    in the order add_link would give them, row by row.
+    """
+
+    def load_wall_masks(self, masks):
+        self.reset_all()
+        self.change_in_bulk()
+        width, height = self.grid_size
+        grid = self.grid
+        for y in range(height):
+            for x in range(width):
+                index = y * width + x
+                neighbours = []
+                if y > 0 and not masks[index - width] & SOUTH:
+                    neighbours.append(grid[x][y - 1])
+                if x > 0 and not masks[index - 1] & EAST:
+                    neighbours.append(grid[x - 1][y])
+                if x < width - 1 and not masks[index] & EAST:
+                    neighbours.append(grid[x + 1][y])
+                if y < height - 1 and not masks[index] & SOUTH:
+                    neighbours.append(grid[x][y + 1])
+                if len(neighbours) > 0:
+                    cell = grid[x][y]
+                    cell.set_neighbours(neighbours)
+                    cell.linked = True
+                    self.linked.append(cell)
+        self.reset_state()
+        return None
+
+    """
+    Store the walls, start and target in a maze file, see maze_file.py,
+    and the distance index next to it when the maze has one
+    """
+
+    def save(self, path):
+        width, height = self.grid_size
+        with MazeWriter(path, width, height, self.start.position, self.target.position) as writer:
+            writer.write_masks(self.wall_masks())
+        if self.distance_index is not None:
+            self.distance_index.save(index_path(path))
+        return None
+
+    """
+    Create a maze from a maze file. The file is memory mapped and
+    unpacked in one go; use MazeFile to look at a part of a file
+    that is too large to load. A distance index saved with it is loaded
+    as well.
+    """
+
+    @classmethod
+    def load(cls, path, screen_size):
+        with MazeFile(path) as maze_file:
+            maze = cls(maze_file.grid_size[0], maze_file.grid_size[1], screen_size)
+            maze.start = maze.grid[maze_file.start[0]][maze_file.start[1]]
+            maze.target = maze.grid[maze_file.target[0]][maze_file.target[1]]
+            maze.load_wall_masks(maze_file.wall_masks())
+        if os.path.exists(index_path(path)):
+            maze.distance_index = DistanceIndex.load(index_path(path), maze)
+        return maze
+
+    """
+    Remove or add the link between two adjacent cells. Only a change of
+    the walls increases the version and is passed on to the link watchers.
+    """
+
     def del_link(self, cell1, cell2):
-        if cell2 in cell1.neighbours:
-            cell1.neighbours.remove(cell2)
-        if cell1 in cell2.neighbours:
-            cell2.neighbours.remove(cell1)
+        if cell1.manhattan_distance(cell2) != 1 or cell1.walls & WALL_BITS[cell1.direction(cell2)]:
+            return None
+        self.version += 1
+        for changes in self.link_watchers.values():
+            changes.append((cell1, cell2))
+        cell1.unlink(cell2)
+        cell2.unlink(cell1)
         return None
 
     def add_link(self, cell1, cell2):
-        if cell1.manhattan_distance(cell2) == 1:
-            cell1.neighbours.append(cell2)
-            cell2.neighbours.append(cell1)
+        if cell1.manhattan_distance(cell2) == 1 and cell1.walls & WALL_BITS[cell1.direction(cell2)]:
+            self.version += 1
+            for changes in self.link_watchers.values():
+                changes.append((cell1, cell2))
+            for cell in (cell1, cell2):
+                if not cell.linked:
+                    cell.linked = True
+                    self.linked.append(cell)
+            cell1.link(cell2)
+            cell2.link(cell1)
         return None
 
     """
      Generate the maze based on depth first search 
      """
 
-    def generate_maze(self):
+    def generate_maze(self, seed=None):
+        rng = self.random_source(seed)
         self.reset_all()
 
         wait = [self.start]
@@ -110,34 +358,135 @@ class Maze:
                 for cell in neighbours[:]:
                     if cell in passed:
                         neighbours.remove(cell)
-                random.shuffle(neighbours)
+                rng.shuffle(neighbours)
                 wait.extend(neighbours)
                 for next_element in neighbours:
-                    next_element.parent = current_element
+                    next_element.set_parent(current_element)
 
                 if current_element.parent is not None:  # The source has no parent
                     self.add_link(current_element.parent, current_element)
 
         # add a few random links
         for i in range(max(self.grid_size)):
-            random_row = random.choice(self.grid)
-            random_element = random.choice(random_row)
+            random_row = rng.choice(self.grid)
+            random_element = rng.choice(random_row)
             possible = self.possible_neighbours(random_element)
             for cell in possible[:]:
                 if cell in random_element.get_neighbours():
                     possible.remove(cell)
             if len(possible) > 0:
-                random_neighbor = random.choice(possible)
+                random_neighbor = rng.choice(possible)
                 self.add_link(random_element, random_neighbor)
 
+        self.change_in_bulk()  # The watchers start over, they need not replay every link
         self.reset_state()
         return None
 
+    """
+    The random.Random of a generator called with a seed, else the rng
+    of the maze
+    """
+
+    def random_source(self, seed):
+        return self.rng if seed is None else random.Random(seed)
+
+    """
+    Run a generator by its name in LAYOUTS, with the seed when it is random
+    """
+
+    def generate(self, layout, seed=None):
+        if layout in SEEDED_LAYOUTS:
+            getattr(self, layout)(seed=seed)
+        elif layout in LAYOUTS:
+            getattr(self, layout)()
+        else:
+            raise ValueError("unknown layout {!r}, expected one of {}".format(layout, ", ".join(LAYOUTS)))
+        return None
+
+    """
+    Generate the same kind of maze as generate_maze with a recursive
+    backtracker on flat wall masks, which needs one stack entry and two
+    bytes per cell.
+    """
+
+    def generate_fast_maze(self, seed=None):
+        rng = self.random_source(seed)
+        width, height = self.grid_size
+        walls = backtracker_masks(width, height, rng, self.start.position[1] * width + self.start.position[0])
+        add_random_links(walls, width, height, max(self.grid_size), rng)
+        self.load_wall_masks(walls)
+        return None
+
+    """
+    Generate the same kind of maze as generate_fast_maze from square tiles
+    that are generated separately, in a pool of processes when processes
+    is more than one, see generators.tiled_masks
+    """
+
+    def generate_tiled_maze(self, tile_size=256, processes=None, seed=None):
+        rng = self.random_source(seed)
+        width, height = self.grid_size
+        walls = tiled_masks(width, height, tile_size, rng, processes)
+        add_random_links(walls, width, height, max(self.grid_size), rng)
+        self.load_wall_masks(walls)
+        return None
+
+    """
+    Generate a perfect maze row by row with Eller's algorithm, see
+    generators.eller_rows
+    """
+
+    def generate_eller_maze(self, seed=None):
+        rng = self.random_source(seed)
+        width, height = self.grid_size
+        self.load_wall_masks(bytearray().join(eller_rows(width, height, rng)))
+        self.first_row = 0
+        return None
+
+    """
+    Scroll a maze with more rows than the grid, like the endless rows of
+    eller_rows: the rows are added at the bottom and as many rows drop
+    off at the top, so the grid is a sliding window over the maze. The
+    walls to rows outside the window are shown closed.
+    """
+
+    def push_rows(self, rows):
+        width, height = self.grid_size
+        added = bytearray().join(rows)
+        count = len(added) // width
+        masks = self.wall_masks()[count * width:].tobytes() if count < height else b''
+        masks = bytearray(masks + added[-height * width:])
+        if count < height:
+            # The bottom row of the window had its south walls closed; the
+            # north walls of the first row added below it are the real ones
+            bottom = (height - count - 1) * width
+            for x in range(width):
+                south = SOUTH if added[x] & NORTH else 0
+                masks[bottom + x] = masks[bottom + x] & ~SOUTH | south
+        for x in range(width):
+            masks[x] |= NORTH
+            masks[-width + x] |= SOUTH
+        self.load_wall_masks(masks)
+        self.first_row += count
+        return None
+
     def generate_open_maze(self):
-        self.reset_all()
-        for col in self.grid:
-            for cell in col:
-                cell.neighbours = self.possible_neighbours(cell)
+        # Like reset_all, without clearing the links that are replaced below
+        self.change_in_bulk()
+        self.linked.clear()
+        self.reset_state()
+        width, height = self.grid_size
+        grid = self.grid
+        for x, col in enumerate(grid):
+            for y, cell in enumerate(col):
+                if 0 < x < width - 1 and 0 < y < height - 1:
+                    # The order of possible_neighbours, without its list
+                    cell.neighbours = (grid[x - 1][y], grid[x + 1][y], col[y + 1], col[y - 1])
+                    cell.walls = 0
+                else:
+                    cell.set_neighbours(self.possible_neighbours(cell))
+                cell.linked = True
+                self.linked.append(cell)
 
     def generate_room(self):
         """Generates rooms, with specific positions."""
@@ -180,9 +529,10 @@ class Maze:
         for y in range(self.grid_size[1] - 3, self.grid_size[1]):
             self.del_link(self.grid[self.grid_size[0] // 8][y], self.grid[(self.grid_size[0] // 8) - 1][y])
 
-    def generate_obstacles(self):
+    def generate_obstacles(self, seed=None):
         """Generate a Manhattan like grid, with a few road blocks"""
 
+        rng = self.random_source(seed)
         self.reset_all()
         self.generate_open_maze()
 
@@ -200,32 +550,32 @@ class Maze:
 
         # add a few random links
         for i in range(max(self.grid_size)):
-            random_row = random.choice(self.grid)
-            random_element = random.choice(random_row)
+            random_row = rng.choice(self.grid)
+            random_element = rng.choice(random_row)
             possible = self.possible_neighbours(random_element)
             for cell in possible[:]:
                 if cell in random_element.get_neighbours():
                     possible.remove(cell)
             if len(possible) > 0:
-                random_neighbor = random.choice(possible)
+                random_neighbor = rng.choice(possible)
                 self.add_link(random_element, random_neighbor)
 
         # vertical blocks
-        block_x = random.choice(range(3, self.grid_size[0], 5))
+        block_x = rng.choice(range(3, self.grid_size[0], 5))
         self.del_link(self.grid[block_x][0], self.grid[block_x - 1][0])
         for m in range(4, self.grid_size[1] - 2, 5):
-            block_x = random.choice(range(3, self.grid_size[0], 5))
+            block_x = rng.choice(range(3, self.grid_size[0], 5))
             self.del_link(self.grid[block_x][m], self.grid[block_x - 1][m])
             self.del_link(self.grid[block_x][m + 1], self.grid[block_x - 1][m + 1])
-        block_x = random.choice(range(3, self.grid_size[0], 5))
+        block_x = rng.choice(range(3, self.grid_size[0], 5))
         self.del_link(self.grid[block_x][self.grid_size[1] - 1], self.grid[block_x - 1][self.grid_size[1] - 1])
 
         # horizontal blocks
-        block_y = random.choice(range(3, self.grid_size[1], 5))
+        block_y = rng.choice(range(3, self.grid_size[1], 5))
         self.del_link(self.grid[0][block_y], self.grid[0][block_y - 1])
         for n in range(4, self.grid_size[0] - 2, 5):
-            block_y = random.choice(range(3, self.grid_size[1], 5))
+            block_y = rng.choice(range(3, self.grid_size[1], 5))
             self.del_link(self.grid[n][block_y], self.grid[n][block_y - 1])
             self.del_link(self.grid[n + 1][block_y], self.grid[n + 1][block_y - 1])
-        block_y = random.choice(range(3, self.grid_size[1], 5))
+        block_y = rng.choice(range(3, self.grid_size[1], 5))
         self.del_link(self.grid[self.grid_size[0] - 1][block_y], self.grid[self.grid_size[0] - 1][block_y - 1])
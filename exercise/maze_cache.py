@@ -0,0 +1,61 @@
+"""
+Generated mazes by their (layout, size, seed) key. A seeded generator
+makes the same maze again bit for bit, so a maze can be shared or filed
+in a bug report as its key, and the cache only keeps the wall masks of
+the mazes used last; the others are generated again when asked for.
+"""
+from collections import OrderedDict
+from exercise.compact_maze import CompactMaze
+from exercise.maze import SEEDED_LAYOUTS
+
+
+class MazeCache:
+    """
+    Least recently used wall masks of at most 'capacity' mazes. The mazes
+    are generated from the top left start cell, like a new Maze. A random
+    layout needs a seed to be cached; the seed of the other layouts is
+    left out of the key.
+    """
+
+    def __init__(self, capacity=16):
+        self.capacity = capacity
+        self.masks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(layout, size, seed=None):
+        if layout not in SEEDED_LAYOUTS:
+            seed = None
+        elif seed is None:
+            raise ValueError("{} is random, it needs a seed to be cached".format(layout))
+        return layout, (size[0], size[1]), seed
+
+    """
+    The wall masks of a maze, as made by Maze.wall_masks
+    """
+
+    def wall_masks(self, layout, size, seed=None):
+        key = self.key(layout, size, seed)
+        masks = self.masks.get(key)
+        if masks is not None:
+            self.hits += 1
+            self.masks.move_to_end(key)
+            return masks
+
+        self.misses += 1
+        maze = CompactMaze(size[0], size[1], size)
+        maze.generate(layout, seed)
+        masks = maze.wall_masks().tobytes()
+        self.masks[key] = masks
+        if len(self.masks) > self.capacity:
+            self.masks.popitem(last=False)
+        return masks
+
+    """
+    Give a maze of the same size the links of the cached maze
+    """
+
+    def load(self, maze, layout, seed=None):
+        maze.load_wall_masks(self.wall_masks(layout, maze.grid_size, seed))
+        return None
@@ -0,0 +1,205 @@
+"""
+Binary maze files: a fixed header followed by the wall masks of the
+cells, two 4-bit masks per byte, row by row. Every row starts on a new
+byte, so a row can be written or read on its own.
+
+    magic 'MAZE', format version, width, height, start (x, y), target (x, y)
+
+Byte x // 2 of a row holds cell x in its low nibble when x is even and
+in its high nibble when x is odd.
+"""
+import mmap
+import random
+import struct
+from array import array
+from exercise.generators import backtracker_masks, add_random_links, eller_rows
+
+MAZE_MAGIC = b'MAZE'
+MAZE_VERSION = 1
+MAZE_HEADER = struct.Struct('<4sHxxIIIIII')  # magic, version, width, height, start x, y, target x, y
+
+LOW_NIBBLE = bytes(value & 0x0F for value in range(256))
+HIGH_NIBBLE = bytes(value >> 4 for value in range(256))
+TO_HIGH_NIBBLE = bytes((value << 4) & 0xFF for value in range(256))
+
+
+def row_bytes(width):
+    return (width + 1) // 2
+
+
+def pack_row(masks):
+    """Pack a row of wall masks into bytes, two cells per byte"""
+    masks = bytes(masks)
+    if len(masks) % 2 == 1:
+        masks += b'\x00'
+    low = masks[0::2]
+    high = masks[1::2].translate(TO_HIGH_NIBBLE)
+    # One OR over the whole row as integers, instead of a Python loop per byte
+    packed = int.from_bytes(low, 'little') | int.from_bytes(high, 'little')
+    return packed.to_bytes(len(low), 'little')
+
+
+def unpack_masks(packed, width):
+    """Wall masks of the rows packed in packed, as a bytearray of width masks per row"""
+    stride = row_bytes(width)
+    rows = len(packed) // stride
+    masks = bytearray(stride * 2 * rows)
+    masks[0::2] = packed.translate(LOW_NIBBLE)
+    masks[1::2] = packed.translate(HIGH_NIBBLE)
+    if width % 2 == 1:
+        del masks[stride * 2 - 1::stride * 2]  # the padding nibble at the end of every row
+    return masks
+
+
+class MazeWriter:
+    """
+    Writes a maze file one row of wall masks at a time, so a generator can
+    stream a maze to disk without holding it in memory:
+
+        with MazeWriter(path, width, height) as writer:
+            for y in range(height):
+                writer.write_row(masks_of_row(y))
+    """
+
+    def __init__(self, path, width, height, start=(0, 0), target=None):
+        if target is None:
+            target = (width - 1, height - 1)
+        self.grid_size = (width, height)
+        self.rows = 0
+        self.file = open(path, 'wb')
+        self.file.write(MAZE_HEADER.pack(MAZE_MAGIC, MAZE_VERSION, width, height,
+                                         start[0], start[1], target[0], target[1]))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        if kind is None:
+            self.close()
+        else:
+            self.file.close()
+
+    def write_row(self, masks):
+        if len(masks) != self.grid_size[0]:
+            raise ValueError("a row of this maze has {} cells, not {}".format(self.grid_size[0], len(masks)))
+        if self.rows == self.grid_size[1]:
+            raise ValueError("all {} rows of the maze are written".format(self.grid_size[1]))
+        self.file.write(pack_row(masks))
+        self.rows += 1
+        return None
+
+    """
+    Write the remaining rows from an iterable of rows, e.g. a generator
+    """
+
+    def write_rows(self, rows):
+        for masks in rows:
+            self.write_row(masks)
+        return None
+
+    """
+    Write the remaining rows from flat masks indexed by y * width + x
+    """
+
+    def write_masks(self, masks):
+        width = self.grid_size[0]
+        for offset in range(0, len(masks), width):
+            self.write_row(masks[offset:offset + width])
+        return None
+
+    def close(self):
+        if self.file.closed:
+            return None
+        self.file.close()
+        if self.rows != self.grid_size[1]:
+            raise ValueError("only {} of the {} rows of the maze were written".format(self.rows, self.grid_size[1]))
+        return None
+
+
+class MazeFile:
+    """
+    Read only, memory mapped view of a maze file. Opening only reads the
+    header; the operating system pages in the rows that are used. The view
+    is a flat sequence of wall masks indexed by y * width + x, like
+    Maze.wall_masks, so breadth_first_distances can run on it directly.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < MAZE_HEADER.size:
+            self.data.close()
+            raise ValueError("{} is not a maze file".format(path))
+        magic, version, width, height, start_x, start_y, target_x, target_y = \
+            MAZE_HEADER.unpack_from(self.data)
+        if magic != MAZE_MAGIC or version != MAZE_VERSION:
+            self.data.close()
+            raise ValueError("{} is not a maze file".format(path))
+        if len(self.data) < MAZE_HEADER.size + row_bytes(width) * height:
+            self.data.close()
+            raise ValueError("{} is truncated".format(path))
+        self.grid_size = (width, height)
+        self.start = (start_x, start_y)
+        self.target = (target_x, target_y)
+        self.stride = row_bytes(width)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.grid_size[0] * self.grid_size[1]
+
+    def __getitem__(self, index):
+        x, y = index % self.grid_size[0], index // self.grid_size[0]
+        return self.mask(x, y)
+
+    def mask(self, x, y):
+        value = self.data[MAZE_HEADER.size + y * self.stride + x // 2]
+        return value >> 4 if x % 2 == 1 else value & 0x0F
+
+    def row(self, y):
+        begin = MAZE_HEADER.size + y * self.stride
+        return unpack_masks(self.data[begin:begin + self.stride], self.grid_size[0])
+
+    """
+    The wall masks of all cells as an array('B'), like Maze.wall_masks
+    """
+
+    def wall_masks(self):
+        packed = self.data[MAZE_HEADER.size:MAZE_HEADER.size + self.stride * self.grid_size[1]]
+        return array('B', unpack_masks(packed, self.grid_size[0]))
+
+    def close(self):
+        self.data.close()
+        return None
+
+
+"""
+Generate a maze like Maze.generate_fast_maze straight into a file,
+without creating a Maze or its GridElements
+"""
+
+
+def write_fast_maze(path, width, height, seed=None):
+    rng = random if seed is None else random.Random(seed)
+    walls = backtracker_masks(width, height, rng)
+    add_random_links(walls, width, height, max(width, height), rng)
+    with MazeWriter(path, width, height) as writer:
+        writer.write_masks(walls)
+    return None
+
+
+"""
+Stream a maze made by Eller's algorithm into a file row by row, using
+memory for a few rows only, so the maze can be far larger than memory
+"""
+
+
+def write_eller_maze(path, width, height, seed=None):
+    rng = random if seed is None else random.Random(seed)
+    with MazeWriter(path, width, height) as writer:
+        writer.write_rows(eller_rows(width, height, rng))
+    return None
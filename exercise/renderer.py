@@ -0,0 +1,56 @@
+"""
+The drawing of walls and parent arrows that viewport.py puts together
+into a maze. The maze, its cells and the searches do not know about
+pygame; only the drawing modules import it, so a batch worker that
+imports Maze or Search never loads SDL.
+"""
+import pygame
+from exercise.grid_element import NORTH, EAST, SOUTH, WEST
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+ARROW = (100, 100, 100)
+
+
+def cell_rect(corner, size):
+    left, top = int(corner[0]), int(corner[1])
+    return pygame.Rect(left, top, int(corner[0] + size) - left, int(corner[1] + size) - top)
+
+
+"""
+Draw the walls in a wall mask around the box (left, top, right, bottom)
+"""
+
+
+def draw_walls(surface, walls, box, line_width):
+    if walls == 0:
+        return
+    left, top, right, bottom = box
+    if walls & NORTH:
+        pygame.draw.line(surface, BLACK, (left, top), (right, top), line_width)
+    if walls & EAST:
+        pygame.draw.line(surface, BLACK, (right, top), (right, bottom), line_width)
+    if walls & SOUTH:
+        pygame.draw.line(surface, BLACK, (left, bottom), (right, bottom), line_width)
+    if walls & WEST:
+        pygame.draw.line(surface, BLACK, (left, top), (left, bottom), line_width)
+
+
+"""
+Draw an arrow from the center of a cell of size (width, height) towards
+the side of its parent, in the direction vector
+"""
+
+
+def draw_arrow(surface, center, vector, size):
+    width, height = size
+    if vector[0] != 0:
+        left_point = (center[0] + (vector[0] - vector[1]) * width / 5, center[1] + (vector[1] - vector[0]) * width / 5)
+        right_point = (center[0] + (vector[0] - vector[1]) * width / 5, center[1] + (vector[1] + vector[0]) * width / 5)
+    else:
+        left_point = (center[0] + (vector[0] - vector[1]) * width / 5, center[1] + (vector[1] + vector[0]) * width / 5)
+        right_point = (center[0] + (vector[0] + vector[1]) * width / 5, center[1] + (vector[1] + vector[0]) * width / 5)
+    pygame.draw.polygon(surface, ARROW, (center, left_point, right_point))
+    entry_point = (center[0] + vector[0] * width / 2, center[1] + vector[1] * height / 2)
+    end_point = (center[0] + vector[0] * width / 5, center[1] + vector[1] * height / 5)
+    pygame.draw.line(surface, ARROW, end_point, entry_point, int(width / 20) + 1)
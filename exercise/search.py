@@ -1,66 +1,649 @@
+import heapq
 import random
+import time
+from array import array
+from collections import deque
 from datetime import datetime
+from multiprocessing import Pool
+from exercise.distance_field import UNREACHED, apply_distance_field, distance_field, wall_array
+from exercise.grid_element import COMPASS, WALL_BITS, wall_steps
+from exercise.hierarchical import HierarchicalPlanner
+from exercise.incremental import LifelongPlanner
 from exercise.maze import Maze
-import bisect
 
 
 class Search:
+    """
+    The searches come in two forms: the *_solution methods run to the end,
+    while the *_steps generators yield the expanded node after every step,
+    so a caller can spread a search over several frames (see advance).
+    They yield None while the component index is built (see reachable).
+    After a search, 'visited' holds the number of visited nodes.
 
-    def __init__(self, graph):
+    Give a SearchStats to count the expansions and time the phases of every
+    search, see search_stats.py. Set verbose to False to stop reporting the
+    visited nodes and the path length on stdout, e.g. in batch runs.
+
+    Depth first search visits the neighbours in random order, drawn from
+    'rng': the random module unless a random.Random is given, or one
+    seeded for this search when depth_first_steps gets a seed.
+
+    Breadth and depth first search return at once when the target is
+    walled off from the source (see reachable). The searches guided by a
+    heuristic only do so with skip_unreachable: by default they explore
+    as far as they can, like the exercises expect of them.
+    """
+
+    def __init__(self, graph, stats=None, verbose=True, rng=None, skip_unreachable=False):
         self.graph = graph
+        self.rng = random if rng is None else rng
+        self.visited = 0
+        self.stats = stats
+        self.verbose = verbose
+        self.skip_unreachable = skip_unreachable
+        self.planner = None  # Kept between incremental searches
+        self.hierarchy = None  # Kept between hierarchical searches
 
     def breadth_first_solution(self):
+        self.run(self.breadth_first_steps())
+
+    def depth_first_solution(self, seed=None):
+        self.run(self.depth_first_steps(seed))
+
+    def greedy_search(self):
+        self.run(self.best_first_steps(use_distance=False))
+
+    def a_star_search(self):
+        self.run(self.best_first_steps(use_distance=True))
+
+    def jump_point_search(self):
+        self.run(self.jump_point_steps())
+
+    def bidirectional_breadth_first_solution(self):
+        self.run(self.bidirectional_breadth_first_steps())
+
+    def bidirectional_a_star_search(self):
+        self.run(self.bidirectional_a_star_steps())
+
+    def incremental_search(self):
+        self.run(self.incremental_steps())
+
+    def hierarchical_search(self):
+        self.run(self.hierarchical_steps())
+
+    """
+    Run the search of a steps generator to the end
+    """
+
+    def run(self, steps):
+        if self.stats is None:
+            deque(steps, maxlen=0)
+        else:
+            with self.stats.phase('search'):
+                deque(steps, maxlen=0)
+        self.report()
+
+    """
+    Continue the search of a steps generator for at most budget seconds.
+    Returns True when the search is done.
+    """
+
+    def advance(self, steps, budget):
+        begin = time.perf_counter()
+        end = begin + budget
+        for _ in steps:
+            if time.perf_counter() > end:
+                if self.stats is not None:
+                    self.stats.add_time('search', time.perf_counter() - begin)
+                return False
+        if self.stats is not None:
+            self.stats.add_time('search', time.perf_counter() - begin)
+        self.report()
+        return True
+
+    def report(self):
+        if self.verbose:
+            print("The number of visited nodes is: {}".format(self.visited))
+        if self.stats is None:
+            self.highlight_path()
+        else:
+            with self.stats.phase('path'):
+                self.highlight_path()
+            self.stats.finish()
 
-        self.graph.reset_state()
+    """
+    Reset the maze before a search, and the stats when there are any
+    """
 
-        queue = [self.graph.start]
-        visited = []
+    def reset(self):
+        self.visited = 0
+        if self.stats is None:
+            self.graph.reset_state()
+        else:
+            self.stats.clear()
+            self.stats.reset_cells = len(self.graph.touched)
+            with self.stats.phase('reset'):
+                self.graph.reset_state()
+
+    """
+    Whether the target is in the component of the source at all, from the
+    component index shared by all searches of the maze. A search that
+    checks it stops right away when it is not, leaving the distance of the
+    target None.
+    """
+
+    def reachable(self):
+        return self.graph.component_index().connected(self.graph.start, self.graph.target)
+
+    """
+    Like reachable, for the steps generators: yields None while the
+    component index labels the maze, which can take seconds on the first
+    search of a large maze
+    """
+
+    def reachable_steps(self):
+        index = self.graph.component_index()
+        yield from index.sync_steps()
+        return index.connected(self.graph.start, self.graph.target)
+
+    def breadth_first_steps(self):
+
+        self.reset()
+        if not (yield from self.reachable_steps()):
+            return
+
+        # Every node enters the queue once; `discovered` is checked before
+        # enqueueing so the first (shortest) parent is never overwritten.
+        queue = deque([self.graph.start])
+        discovered = {self.graph.start}
+        visited = 0
+        stats = self.stats
 
         while len(queue) > 0:
-            current_node = queue.pop(0)
-            if current_node != self.graph.target:
-                if current_node not in visited:
-                    visited.append(current_node)
-                    for next_node in current_node.get_neighbours():
-                        if next_node not in visited:
-                            next_node.set_parent(current_node)
-                            queue.append(next_node)
-            else:
+            current_node = queue.popleft()
+            if current_node == self.graph.target:
                 break
-        print("The number of visited nodes is: {}".format(len(visited)))
-        self.highlight_path()
+            visited += 1
+            if stats is not None:
+                stats.expand(len(queue) + 1)
+            for next_node in current_node.neighbours:
+                if next_node not in discovered:
+                    discovered.add(next_node)
+                    next_node.set_parent(current_node)
+                    queue.append(next_node)
+            yield current_node
+        self.visited = visited
 
-    def depth_first_solution(self):
+    def depth_first_steps(self, seed=None):
 
-        self.graph.reset_state()
+        self.reset()
+        if not (yield from self.reachable_steps()):
+            return
+        rng = self.rng if seed is None else random.Random(seed)
 
-        stack = [self.graph.start]
-        visited = []
+        # The stack holds one (node, remaining successors) entry per node on the
+        # current branch, so each node is pushed once and gets its parent once.
+        # Successors are walked in reverse shuffled order, which visits the
+        # nodes in the same order as popping individually pushed neighbours.
+        start = self.graph.start
+        visited = set()
+        stack = []
+        stats = self.stats
+        if start != self.graph.target:
+            visited.add(start)
+            stack.append((start, self._shuffled_successors(start, rng)))
 
         while len(stack) > 0:
-            current_node = stack.pop()
-            if current_node != self.graph.target:
-                if current_node not in visited:
-                    visited.append(current_node)
-                    neighbours = current_node.get_neighbours()
-                    random.shuffle(neighbours)
-                    for next_node in neighbours:
-                        if next_node not in visited:
+            current_node, successors = stack[-1]
+            for next_node in successors:
+                if next_node not in visited:
+                    break
+            else:
+                stack.pop()
+                continue
+            next_node.set_parent(current_node)
+            if next_node == self.graph.target:
+                break
+            visited.add(next_node)
+            stack.append((next_node, self._shuffled_successors(next_node, rng)))
+            if stats is not None:
+                stats.expand(len(stack), copies=1)
+            yield next_node
+        self.visited = len(visited)
+
+    @staticmethod
+    def _shuffled_successors(node, rng):
+        neighbours = node.get_neighbours()
+        rng.shuffle(neighbours)
+        return reversed(neighbours)
+
+    def best_first_steps(self, use_distance):
+        """
+        Best first search on a binary heap, ordered on the score of a node:
+        the Manhattan distance to the target for greedy search, plus the
+        distance from the source for A*. When the maze has a distance index
+        A* raises the Manhattan distance to its lower bound instead (see
+        DistanceIndex.bound_to). Equal scores are broken on the
+        smaller heuristic and then on the most recently pushed node, which
+        keeps following one path through open areas. When A* finds a shorter
+        path to a node it is pushed again; the outdated heap entry is skipped
+        once it is popped (lazy deletion).
+
+        Across the rooms of generate_room at 500x500, A* expands 13 times
+        fewer cells than breadth first search but is only 3 to 7 times
+        faster, as every expansion costs a heap push and a score. The
+        pockets the walls leave along the Manhattan path have the same
+        estimate as the path itself, so no tie-break skips them. A distance
+        index on the maze only helps the queries its landmarks bound well
+        (see DistanceIndex.bound_to).
+        """
+        self.reset()
+        if self.skip_unreachable and not (yield from self.reachable_steps()):
+            return
+
+        start = self.graph.start
+        target = self.graph.target
+        width = self.graph.grid_size[0]
+        bound = None
+        if use_distance and self.graph.distance_index is not None:
+            bound = self.graph.distance_index.bound_to(cell_index(start, width), cell_index(target, width))
+        start.set_score(start.manhattan_distance(target) if bound is None else bound(cell_index(start, width)))
+        heap = [(start.score, start.score, 0, start)]
+        closed = set()
+        counter = 0
+        stats = self.stats
+
+        while len(heap) > 0:
+            current_node = heapq.heappop(heap)[3]
+            if current_node in closed:
+                continue
+            if current_node == target:
+                break
+            closed.add(current_node)
+            if stats is not None:
+                stats.expand(len(heap) + 1)
+            distance = current_node.distance + 1
+            for next_node in current_node.neighbours:
+                if next_node in closed:
+                    continue
+                if next_node.distance is None or (use_distance and distance < next_node.distance):
+                    next_node.set_parent(current_node)
+                    if bound is None:
+                        heuristic = next_node.manhattan_distance(target)
+                    else:
+                        heuristic = bound(cell_index(next_node, width))
+                    next_node.set_score(distance + heuristic if use_distance else heuristic)
+                    counter -= 1
+                    heapq.heappush(heap, (next_node.score, heuristic, counter, next_node))
+            yield current_node
+        self.visited = len(closed)
+
+    def bidirectional_breadth_first_steps(self):
+        """
+        Breadth first search from the source and from the target at once,
+        a whole layer at a time on the side with the smaller frontier. The
+        first layer that reaches the other side holds the shortest path, the
+        best link over that layer is taken. The forward side sets the parents
+        of the cells; the backward side keeps its own links toward the target
+        in a dict, which are turned into parents once the sides meet.
+        """
+        self.reset()
+        if not (yield from self.reachable_steps()):
+            return
+
+        start = self.graph.start
+        target = self.graph.target
+        forward = [start]
+        backward = [target]
+        discovered = {start}
+        toward_target = {target: None}  # node -> next node on the way to the target
+        remaining = {target: 0}  # node -> distance to the target
+        visited = 0
+        meeting = None
+        stats = self.stats
+
+        while meeting is None and start != target and len(forward) > 0 and len(backward) > 0:
+            best = None
+            next_layer = []
+            if len(forward) <= len(backward):
+                for current_node in forward:
+                    visited += 1
+                    if stats is not None:
+                        stats.expand(len(forward) + len(backward) + len(next_layer))
+                    for next_node in current_node.neighbours:
+                        if next_node in remaining:
+                            length = current_node.distance + 1 + remaining[next_node]
+                            if best is None or length < best:
+                                best, meeting = length, (current_node, next_node)
+                        elif next_node not in discovered:
+                            discovered.add(next_node)
                             next_node.set_parent(current_node)
-                            stack.append(next_node)
+                            next_layer.append(next_node)
+                    yield current_node
+                forward = next_layer
             else:
+                for current_node in backward:
+                    visited += 1
+                    if stats is not None:
+                        stats.expand(len(forward) + len(backward) + len(next_layer))
+                    for next_node in current_node.neighbours:
+                        if next_node in discovered:
+                            length = next_node.distance + 1 + remaining[current_node]
+                            if best is None or length < best:
+                                best, meeting = length, (next_node, current_node)
+                        elif next_node not in remaining:
+                            toward_target[next_node] = current_node
+                            remaining[next_node] = remaining[current_node] + 1
+                            next_layer.append(next_node)
+                    yield current_node
+                backward = next_layer
+
+        if meeting is not None:
+            self._join_paths(meeting[0], meeting[1], toward_target)
+        self.visited = visited
+
+    def bidirectional_a_star_steps(self):
+        """
+        A* from the source toward the target and from the target toward the
+        source, expanding the side with the smaller open list. Both sides use
+        the average of the two Manhattan distances, (to target - to source)
+        for the forward side and the opposite for the backward side, kept in
+        doubled units to stay integer. With these heuristics the best link
+        found between the sides is final once the lowest keys of the open
+        lists add up to at least twice its length.
+        """
+        self.reset()
+        if self.skip_unreachable and not (yield from self.reachable_steps()):
+            return
+
+        start = self.graph.start
+        target = self.graph.target
+        start.set_score(start.manhattan_distance(target))
+        forward = [(start.score, start.score, 0, start)]
+        backward = [(start.score, start.score, 0, target)]
+        forward_closed = set()
+        backward_closed = set()
+        toward_target = {target: None}
+        remaining = {target: 0}
+        counter = 0
+        best = 0 if start == target else None
+        meeting = None
+        stats = self.stats
+
+        while len(forward) > 0 and len(backward) > 0:
+            if best is not None and forward[0][0] + backward[0][0] >= 2 * best:
                 break
-        print("The number of visited nodes is: {}".format(len(visited)))
-        self.highlight_path()
+            if len(forward) <= len(backward):
+                current_node = heapq.heappop(forward)[3]
+                if current_node in forward_closed:
+                    continue
+                forward_closed.add(current_node)
+                if stats is not None:
+                    stats.expand(len(forward) + len(backward) + 1)
+                distance = current_node.distance + 1
+                for next_node in current_node.neighbours:
+                    if next_node in remaining and (best is None or distance + remaining[next_node] < best):
+                        best, meeting = distance + remaining[next_node], (current_node, next_node)
+                    if next_node in forward_closed:
+                        continue
+                    if next_node.distance is None or distance < next_node.distance:
+                        next_node.set_parent(current_node)
+                        heuristic = next_node.manhattan_distance(target)
+                        next_node.set_score(distance + heuristic)
+                        counter -= 1
+                        key = 2 * distance + heuristic - next_node.manhattan_distance(start)
+                        heapq.heappush(forward, (key, heuristic, counter, next_node))
+            else:
+                current_node = heapq.heappop(backward)[3]
+                if current_node in backward_closed:
+                    continue
+                backward_closed.add(current_node)
+                if stats is not None:
+                    stats.expand(len(forward) + len(backward) + 1)
+                distance = remaining[current_node] + 1
+                for next_node in current_node.neighbours:
+                    if next_node.distance is not None and (best is None or distance + next_node.distance < best):
+                        best, meeting = distance + next_node.distance, (next_node, current_node)
+                    if next_node in backward_closed:
+                        continue
+                    if next_node not in remaining or distance < remaining[next_node]:
+                        toward_target[next_node] = current_node
+                        remaining[next_node] = distance
+                        heuristic = next_node.manhattan_distance(start)
+                        counter -= 1
+                        key = 2 * distance + heuristic - next_node.manhattan_distance(target)
+                        heapq.heappush(backward, (key, heuristic, counter, next_node))
+            yield current_node
 
-    # ADD YOU IMPLEMENTATIONS FOR GREEDY AND ASTAR HERE!
-    def greedy_search(self):
-        pass
+        if meeting is not None:
+            self._join_paths(meeting[0], meeting[1], toward_target)
+        self.visited = len(forward_closed) + len(backward_closed)
 
-    def a_star_search(self):
-        pass
+    def incremental_steps(self):
+        """
+        Shortest path with the LifelongPlanner of this Search, which keeps
+        its distances between searches. After a few links changed or the
+        target moved, only the affected cells are expanded again. 'visited'
+        counts the cells expanded by this search; the parents are only set
+        along the path.
+        """
+        self.reset()
+        if self.skip_unreachable and not (yield from self.reachable_steps()):
+            return
+        if self.planner is None or self.planner.maze is not self.graph:
+            if self.planner is not None:
+                self.planner.close()
+            self.planner = LifelongPlanner(self.graph)
+        stats = self.stats
+        visited = 0
+        for cell in self.planner.plan_steps():
+            visited += 1
+            if stats is not None:
+                stats.expand(len(self.planner.heap) + 1)
+            yield cell
+        path = self.planner.path()
+        if path is not None:
+            for parent, node in zip(path, path[1:]):
+                node.set_parent(parent)
+        self.visited = visited
+
+    def hierarchical_steps(self):
+        """
+        Path over the clusters of the HierarchicalPlanner of this Search,
+        which builds its abstract graph on the first search and only
+        updates the clusters of the links changed since. The path can be a
+        few steps longer than the shortest one in open areas. 'visited'
+        counts the abstract nodes expanded; the cells of the path are
+        yielded one by one with their parents set.
+        """
+        self.reset()
+        if self.skip_unreachable and not (yield from self.reachable_steps()):
+            return
+        if self.hierarchy is None or self.hierarchy.maze is not self.graph:
+            if self.hierarchy is not None:
+                self.hierarchy.close()
+            self.hierarchy = HierarchicalPlanner(self.graph)
+        path = self.hierarchy.path(self.graph.start, self.graph.target)
+        self.visited = self.hierarchy.expanded
+        if self.stats is not None:
+            self.stats.expanded = self.visited
+        if path is None:
+            return
+        grid = self.graph.grid
+        previous = None
+        for x, y in path:
+            cell = grid[x][y]
+            if previous is not None:
+                cell.set_parent(previous)
+            previous = cell
+            yield cell
+
+    def jump_point_steps(self):
+        """
+        A* over jump points for the 4-connected walls of the cells. Of all
+        shortest paths it only follows the ones that turn from a horizontal
+        into a vertical move where they have to: the turn at n, coming from
+        p, is forced when p -> p_dy -> n_dy, the same length with the
+        vertical move first, is blocked by a wall. Horizontal jumps run on
+        until such a turn (or a wall or the target); vertical jumps stop
+        where a horizontal jump from the cell finds a jump point. Once the
+        target is reached the parents are filled in along the jumps, so
+        the distances and the path are those of breadth first search.
+        """
+        self.reset()
+        if self.skip_unreachable and not (yield from self.reachable_steps()):
+            return
+
+        start = self.graph.start
+        target = self.graph.target
+        start.set_score(start.manhattan_distance(target))
+        heap = [(start.score, start.score, 0, start)]
+        came_from = {start: None}
+        distances = {start: 0}
+        arrival = {start: None}  # The direction of the jump that reached a jump point
+        closed = set()
+        counter = 0
+        stats = self.stats
+
+        while len(heap) > 0:
+            current_node = heapq.heappop(heap)[3]
+            if current_node in closed:
+                continue
+            if current_node == target:
+                self._fill_jumps(target, came_from)
+                break
+            closed.add(current_node)
+            if stats is not None:
+                stats.expand(len(heap) + 1)
+            for direction in self._jump_directions(current_node, arrival[current_node]):
+                jump_point = self._jump(current_node, direction, target)
+                if jump_point is None or jump_point in closed:
+                    continue
+                distance = distances[current_node] + current_node.manhattan_distance(jump_point)
+                if jump_point not in distances or distance < distances[jump_point]:
+                    distances[jump_point] = distance
+                    came_from[jump_point] = current_node
+                    arrival[jump_point] = direction
+                    heuristic = jump_point.manhattan_distance(target)
+                    jump_point.set_score(distance + heuristic)
+                    counter -= 1
+                    heapq.heappush(heap, (jump_point.score, heuristic, counter, jump_point))
+            yield current_node
+        self.visited = len(closed)
+
+    def _jump_directions(self, node, arrival):
+        if arrival is None:
+            return COMPASS
+        dx, dy = arrival
+        if dx == 0:
+            return arrival, (1, 0), (-1, 0)
+        directions = [arrival]
+        previous = self._step(node, (-dx, 0))
+        for turn in ((0, -1), (0, 1)):
+            if self._is_forced(previous, node, turn):
+                directions.append(turn)
+        return directions
+
+    def _is_forced(self, previous, node, turn):
+        # The vertical move from node is needed when the cell next to it is
+        # not reached as well by first moving vertically from previous
+        beside = self._step(node, turn)
+        if beside is None:
+            return False
+        previous_beside = self._step(previous, turn)
+        return previous_beside is None or self._step(previous_beside, previous.direction(node)) is None
+
+    def _jump(self, node, direction, target):
+        dx, dy = direction
+        while True:
+            previous, node = node, self._step(node, direction)
+            if node is None or node == target:
+                return node
+            if dy == 0:
+                if self._is_forced(previous, node, (0, -1)) or self._is_forced(previous, node, (0, 1)):
+                    return node
+            elif self._jump(node, (1, 0), target) is not None or self._jump(node, (-1, 0), target) is not None:
+                return node
 
+    def _step(self, node, direction):
+        # The neighbour of node in direction, when there is no wall between them
+        if node.walls & WALL_BITS[direction]:
+            return None
+        return self.graph.grid[node.position[0] + direction[0]][node.position[1] + direction[1]]
 
+    def _fill_jumps(self, node, came_from):
+        # Walk back over the jump points, then link every cell of every jump
+        jump_points = []
+        while node is not None:
+            jump_points.append(node)
+            node = came_from[node]
+        jump_points.reverse()
+        for begin, end in zip(jump_points, jump_points[1:]):
+            dx, dy = begin.direction(end)
+            direction = ((dx > 0) - (dx < 0), (dy > 0) - (dy < 0))
+            node = begin
+            while node != end:
+                next_node = self._step(node, direction)
+                next_node.set_parent(node)
+                node = next_node
+
+    def _join_paths(self, node, next_node, toward_target):
+        # Turn the backward links from next_node to the target into parents
+        while next_node is not None:
+            next_node.set_parent(node)
+            node, next_node = next_node, toward_target[next_node]
+
+    def distance_field_solution(self):
+        """
+        Breadth first search from the source to all cells at once with the
+        NumPy distance field, copied back into the cells of the maze
+        """
+        if self.stats is None:
+            distances, parents = distance_field(wall_array(self.graph), self.graph.start.position)
+        else:
+            self.stats.clear()
+            with self.stats.phase('search'):
+                distances, parents = distance_field(wall_array(self.graph), self.graph.start.position)
+        apply_distance_field(self.graph, distances, parents)
+        self.visited = int((distances != UNREACHED).sum())
+        if self.stats is not None:
+            self.stats.expanded = self.visited
+        self.report()
+
+    def batch_shortest_paths(self, pairs, paths=False, processes=None):
+        """
+        Answer many (source, target) queries, given as GridElements or (x, y)
+        positions, without touching the state of the maze. One breadth first
+        tree is grown per distinct source, and stops once all of its targets
+        are reached. With processes > 1 the sources are spread over a process
+        pool. Returns the path length per pair (None when unreachable) or,
+        with paths=True, a (length, path) tuple where path lists the
+        positions from source to target. Pairs in different components are
+        answered from the component index without a search, and a source
+        none of whose targets can be reached grows no tree at all.
+        """
+        width = self.graph.grid_size[0]
+        components = self.graph.component_index()
+        queries = [(cell_index(source, width), cell_index(target, width)) for source, target in pairs]
+        targets = {}
+        for source, target in queries:
+            if components.component(source) == components.component(target):
+                targets.setdefault(source, set()).add(target)
+
+        jobs = [(source, sorted(source_targets), paths) for source, source_targets in targets.items()]
+        masks = self.graph.wall_masks()
+        if processes is not None and processes > 1 and len(jobs) > 1:
+            with Pool(processes, initializer=init_batch_worker, initargs=(masks, self.graph.grid_size)) as pool:
+                trees = pool.map(batch_worker, jobs, chunksize=max(1, len(jobs) // (4 * processes)))
+        else:
+            trees = [shortest_path_tree(masks, self.graph.grid_size, *job) for job in jobs]
+
+        results = dict(zip(targets, trees))
+        answers = []
+        for source, target in queries:
+            length, path = results[source][target] if target in targets.get(source, ()) else (None, None)
+            answers.append((length, path) if paths else length)
+        return answers
 
     def highlight_path(self):
         # Compute the path, back to front.
@@ -70,4 +653,71 @@ class Search:
             current_node.set_color((248, 220, 50))
             current_node = current_node.parent
 
-        print("Path length is: {}".format(self.graph.target.distance))
+        if self.verbose:
+            print("Path length is: {}".format(self.graph.target.distance))
+
+
+def cell_index(cell, width):
+    x, y = cell.position if hasattr(cell, 'position') else cell
+    return y * width + x
+
+
+def shortest_path_tree(masks, grid_size, source, targets, paths=False):
+    """
+    Breadth first search over the flat wall masks of a maze (see
+    Maze.wall_masks) from the index source, until every index in targets
+    is reached. Returns {target: (length, path)}, path being None unless
+    asked for or when the target cannot be reached.
+    """
+    width = grid_size[0]
+    steps = wall_steps(width)
+    parents = array('i', [-1]) * len(masks)
+    parents[source] = source
+    distances = {source: 0} if source in targets else {}
+    remaining = set(targets)
+    remaining.discard(source)
+
+    frontier = [source]
+    distance = 0
+    while len(frontier) > 0 and len(remaining) > 0:
+        distance += 1
+        next_frontier = []
+        for cell in frontier:
+            walls = masks[cell]
+            for bit, step in steps:
+                if not walls & bit:
+                    neighbour = cell + step
+                    if parents[neighbour] == -1:
+                        parents[neighbour] = cell
+                        next_frontier.append(neighbour)
+                        if neighbour in remaining:
+                            remaining.remove(neighbour)
+                            distances[neighbour] = distance
+        frontier = next_frontier
+
+    tree = {}
+    for target in targets:
+        length = distances.get(target)
+        path = None
+        if paths and length is not None:
+            path = [target]
+            while path[-1] != source:
+                path.append(parents[path[-1]])
+            path = [(cell % width, cell // width) for cell in reversed(path)]
+        tree[target] = (length, path)
+    return tree
+
+
+# The wall masks are sent once to every process of the pool
+batch_masks = None
+batch_grid_size = None
+
+
+def init_batch_worker(masks, grid_size):
+    global batch_masks, batch_grid_size
+    batch_masks = masks
+    batch_grid_size = grid_size
+
+
+def batch_worker(job):
+    return shortest_path_tree(batch_masks, batch_grid_size, *job)
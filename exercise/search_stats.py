@@ -0,0 +1,81 @@
+"""
+Counters and phase timers of a search. A Search only keeps them when it
+is given a SearchStats; without one the searches skip all bookkeeping.
+"""
+import time
+from contextlib import contextmanager
+
+
+class SearchStats:
+    """
+    The counters of the last search:
+
+        expanded          nodes taken from the frontier and expanded
+        frontier_peak     the largest size of the frontier (queue, stack or heap)
+        neighbour_copies  neighbour lists copied to shuffle or modify them
+        reset_cells       cells reset before the search started
+
+    and the seconds spent per phase in 'timers': 'reset' for the reset of
+    the maze, 'search' for the whole search including the reset, and
+    'path' for highlight_path. The optional callback is called with the
+    stats after every search, to collect them over many searches.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.clear()
+
+    def clear(self):
+        self.expanded = 0
+        self.frontier_peak = 0
+        self.neighbour_copies = 0
+        self.reset_cells = 0
+        self.timers = {}
+
+    """
+    Count one expansion, with the size of the frontier at that moment
+    and the number of neighbour lists it copied
+    """
+
+    def expand(self, frontier, copies=0):
+        self.expanded += 1
+        self.neighbour_copies += copies
+        if frontier > self.frontier_peak:
+            self.frontier_peak = frontier
+
+    """
+    Add the time spent in the with block to the timer of a phase
+    """
+
+    @contextmanager
+    def phase(self, name):
+        begin = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.add_time(name, time.perf_counter() - begin)
+
+    def add_time(self, name, seconds):
+        self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    def finish(self):
+        if self.callback is not None:
+            self.callback(self)
+
+    def as_dict(self):
+        return {'expanded': self.expanded, 'frontier_peak': self.frontier_peak,
+                'neighbour_copies': self.neighbour_copies, 'reset_cells': self.reset_cells,
+                'timers': dict(self.timers)}
+
+    """
+    The stats as short lines of text, for an overlay
+    """
+
+    def lines(self):
+        lines = ["expanded {}".format(self.expanded),
+                 "frontier peak {}".format(self.frontier_peak),
+                 "neighbour copies {}".format(self.neighbour_copies),
+                 "reset cells {}".format(self.reset_cells)]
+        for name, seconds in sorted(self.timers.items()):
+            lines.append("{} {:.2f} ms".format(name, seconds * 1000))
+        return lines
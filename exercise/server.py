@@ -0,0 +1,342 @@
+"""
+A long running server that answers shortest path queries over one maze,
+loaded or generated once at the start, e.g.
+
+    python -m exercise.server --size 500 --layout generate_fast_maze --seed 1
+    python -m benchmarks.load --requests 20000
+
+Every query is one line of JSON and is answered by one line of JSON with
+the same id, not necessarily in the order of the queries:
+
+    {"id": 7, "source": [0, 0], "target": [9, 9], "algorithm": "bfs", "path": false}
+    {"id": 7, "length": 18}
+
+The length is null when the target cannot be reached; with "path" true
+the answer also lists the positions from source to target. The query
+{"id": 8, "op": "info"} returns the grid size and the algorithms, and a
+query that cannot be answered, or a line longer than MAX_LINE, gets an
+"error" instead of a length and the connection stays open.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from exercise.compact_maze import CompactMaze
+from exercise.maze import LAYOUTS, Maze
+from exercise.search import Search, shortest_path_tree
+
+# name -> method of Search; bfs queries are answered from one shortest path tree per source
+ALGORITHMS = {
+    'bfs': None,
+    'dfs': Search.depth_first_solution,
+    'greedy': Search.greedy_search,
+    'a_star': Search.a_star_search,
+    'bi_bfs': Search.bidirectional_breadth_first_solution,
+    'bi_a_star': Search.bidirectional_a_star_search,
+    'jps': Search.jump_point_search,
+}
+
+MAZE_TYPES = {'objects': Maze, 'compact': CompactMaze}
+
+MAX_LINE = 2 ** 16  # Bytes in a query line; a longer one is skipped and gets an error
+
+
+class MazeServer:
+    """
+    Serves the queries of many connections from one asyncio event loop,
+    which only reads, checks and answers lines. The searches run in a pool
+    of worker processes that each build their own copy of the maze once,
+    or in a single thread when processes is 0.
+
+    Queries wait in a queue of at most max_pending. A connection whose
+    query does not fit is not read until there is room again, so its
+    socket buffers fill up and the client has to slow down (backpressure).
+    Every worker takes the waiting queries as one batch, up to batch_size,
+    after waiting up to batch_delay seconds for more; under load the queue
+    fills while the workers are busy and the batches grow by themselves.
+    The bfs queries of a batch share one tree per source, like
+    Search.batch_shortest_paths, and every worker labels the components of
+    its maze once, so a query whose target is walled off needs no search.
+    """
+
+    def __init__(self, maze, processes=None, batch_size=64, batch_delay=0.0, max_pending=1024):
+        self.maze = maze
+        self.processes = processes
+        self.workers = (os.cpu_count() or 1) if processes is None else max(1, processes)
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.max_pending = max_pending
+        self.server = None
+        self.answered = 0
+        self.batches = 0
+
+    """
+    Start the workers and listen on a TCP port of host, or on the Unix
+    socket at path when one is given. Port 0 picks a free port, see port.
+    """
+
+    async def start(self, host='127.0.0.1', port=8765, path=None):
+        initargs = (type(self.maze), self.maze.wall_masks(), self.maze.grid_size)
+        if self.processes == 0:
+            self.pool = ThreadPoolExecutor(1, initializer=init_worker, initargs=initargs)
+        else:
+            self.pool = ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=initargs)
+        self.queue = asyncio.Queue(self.max_pending)
+        self.batchers = [asyncio.create_task(self.run_batches()) for _ in range(self.workers)]
+        if path is None:
+            self.server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_LINE)
+        else:
+            self.server = await asyncio.start_unix_server(self.handle_connection, path, limit=MAX_LINE)
+        return None
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        for batcher in self.batchers:
+            batcher.cancel()
+        await asyncio.gather(*self.batchers, return_exceptions=True)
+        self.pool.shutdown()
+        return None
+
+    async def handle_connection(self, reader, writer):
+        pending = []
+        try:
+            while True:
+                query_id = None
+                try:
+                    line = await self.read_line(reader)
+                    if not line:
+                        break
+                    query = json.loads(line)
+                    if not isinstance(query, dict):
+                        raise ValueError("a query is a JSON object")
+                    query_id = query.get('id')
+                    job = self.parse(query)
+                except ValueError as error:
+                    self.reply(writer, query_id, {'error': str(error)})
+                else:
+                    if job is None:
+                        self.reply(writer, query_id, self.info())
+                    else:
+                        future = asyncio.get_running_loop().create_future()
+                        future.add_done_callback(functools.partial(self.reply_future, writer, query_id))
+                        pending.append(future)
+                        await self.queue.put((job, future))
+                        if len(pending) > self.max_pending:
+                            pending = [future for future in pending if not future.done()]
+                await writer.drain()
+            # The client may stop sending before it has all its answers
+            await asyncio.gather(*pending)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    """
+    The next line of a connection, b'' at its end. Raises ValueError for a
+    line longer than MAX_LINE after skipping it, so the next one is read
+    from its start.
+    """
+
+    async def read_line(self, reader):
+        try:
+            return await reader.readuntil(b'\n')
+        except asyncio.IncompleteReadError as error:
+            return error.partial  # The last line without a newline
+        except asyncio.LimitOverrunError as error:
+            consumed = error.consumed
+        while True:
+            await reader.readexactly(consumed)  # Buffered already
+            try:
+                await reader.readuntil(b'\n')
+                break
+            except asyncio.IncompleteReadError:
+                break
+            except asyncio.LimitOverrunError as error:
+                consumed = error.consumed
+        raise ValueError("a query is at most {} bytes long".format(MAX_LINE))
+
+    """
+    The job of a query: (source, target, algorithm, paths) with source and
+    target as cell indices, or None for an info query. Raises ValueError
+    when the query cannot be answered.
+    """
+
+    def parse(self, query):
+        op = query.get('op', 'path')
+        if op == 'info':
+            return None
+        if op != 'path':
+            raise ValueError("unknown op {!r}, expected 'path' or 'info'".format(op))
+        algorithm = query.get('algorithm', 'bfs')
+        if not isinstance(algorithm, str) or algorithm not in ALGORITHMS:
+            raise ValueError("unknown algorithm {!r}, expected one of {}".format(algorithm, ", ".join(ALGORITHMS)))
+        return self.index(query.get('source')), self.index(query.get('target')), algorithm, bool(query.get('path'))
+
+    def index(self, position):
+        width, height = self.maze.grid_size
+        if not isinstance(position, list) or len(position) != 2 or \
+                not all(isinstance(value, int) and not isinstance(value, bool) for value in position):
+            raise ValueError("a position is [x, y], got {!r}".format(position))
+        x, y = position
+        if not (0 <= x < width and 0 <= y < height):
+            raise ValueError("position {} is outside the {} x {} maze".format(position, width, height))
+        return y * width + x
+
+    def info(self):
+        return {'grid_size': list(self.maze.grid_size), 'algorithms': list(ALGORITHMS)}
+
+    def reply(self, writer, query_id, answer):
+        if not writer.is_closing():
+            answer = dict(answer, id=query_id)
+            writer.write(json.dumps(answer, separators=(',', ':')).encode() + b'\n')
+
+    def reply_future(self, writer, query_id, future):
+        if not future.cancelled():
+            self.reply(writer, query_id, future.result())
+
+    async def run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            self.take_waiting(batch)
+            if len(batch) < self.batch_size and self.batch_delay > 0:
+                await asyncio.sleep(self.batch_delay)
+                self.take_waiting(batch)
+            try:
+                answers = await loop.run_in_executor(self.pool, answer_batch, [job for job, _ in batch])
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:  # A worker died, answer the batch instead of hanging its clients
+                answers = [{'error': "search failed: {}".format(error)}] * len(batch)
+            for (_, future), answer in zip(batch, answers):
+                if not future.done():
+                    future.set_result(answer)
+            self.batches += 1
+            self.answered += len(batch)
+
+    def take_waiting(self, batch):
+        while len(batch) < self.batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+
+
+# The copy of the maze in a worker, built once from the wall masks
+worker_maze = None
+worker_masks = None
+
+
+def init_worker(maze_class, masks, grid_size):
+    global worker_maze, worker_masks
+    worker_masks = masks
+    worker_maze = maze_class(grid_size[0], grid_size[1], grid_size)
+    worker_maze.load_wall_masks(masks)
+    worker_maze.component_index().sync()
+
+
+def answer_batch(jobs):
+    """The answers to a batch of (source, target, algorithm, paths) jobs"""
+    grid_size = worker_maze.grid_size
+    components = worker_maze.component_index()
+    targets = {}
+    for source, target, algorithm, paths in jobs:
+        if algorithm == 'bfs' and components.component(source) == components.component(target):
+            source_targets, source_paths = targets.get(source, (set(), False))
+            source_targets.add(target)
+            targets[source] = (source_targets, source_paths or paths)
+    trees = {source: shortest_path_tree(worker_masks, grid_size, source, sorted(source_targets), paths)
+             for source, (source_targets, paths) in targets.items()}
+
+    answers = []
+    for source, target, algorithm, paths in jobs:
+        if algorithm == 'bfs':
+            tree = trees.get(source, {})
+            length, path = tree[target] if target in tree else (None, None)
+        else:
+            length, path = search_path(source, target, ALGORITHMS[algorithm])
+        answer = {'length': length}
+        if paths:
+            answer['path'] = path
+        answers.append(answer)
+    return answers
+
+
+def search_path(source, target, solve):
+    """Run one search of the worker maze, returns the length and the positions of the path it found"""
+    maze = worker_maze
+    width = maze.grid_size[0]
+    if source == target:
+        return 0, [(source % width, source // width)]
+    start = maze.grid[source % width][source // width]
+    end = maze.grid[target % width][target // width]
+    maze.start, maze.target = start, end
+    solve(Search(maze, verbose=False, skip_unreachable=True))
+    path = [end]
+    while path[-1] != start:
+        parent = path[-1].parent
+        if parent is None:
+            return None, None
+        path.append(parent)
+    return len(path) - 1, [cell.position for cell in reversed(path)]
+
+
+async def serve(maze, args):
+    server = MazeServer(maze, args.processes, args.batch_size, args.batch_delay, args.max_pending)
+    await server.start(args.host, args.port, args.unix)
+    where = args.unix if args.unix else "{}:{}".format(args.host, server.port)
+    print("Serving a {} x {} maze on {} with {} workers".format(*maze.grid_size, where, server.workers))
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            asyncio.get_running_loop().add_signal_handler(signum, stop.set)
+        except NotImplementedError:  # Windows, where Ctrl+C raises KeyboardInterrupt
+            pass
+    try:
+        await stop.wait()
+    finally:
+        await server.close()
+        print("Answered {} queries in {} batches".format(server.answered, server.batches))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer shortest path queries over one maze, as JSON lines")
+    parser.add_argument("--load", help="maze file to serve, see Maze.save")
+    parser.add_argument("--size", nargs=2, type=int, default=[100, 100], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--layout", choices=LAYOUTS, default='generate_fast_maze')
+    parser.add_argument("--seed", type=int, default=2019)
+    parser.add_argument("--maze", choices=sorted(MAZE_TYPES), default='objects', help="storage of the maze")
+    parser.add_argument("--host", default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket instead of a TCP port")
+    parser.add_argument("--processes", type=int, help="worker processes, 0 for one thread (default: one per CPU)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--batch-delay", type=float, default=0.0, help="seconds to wait for a fuller batch")
+    parser.add_argument("--max-pending", type=int, default=1024, help="queued queries before reading stops")
+    args = parser.parse_args()
+
+    maze_class = MAZE_TYPES[args.maze]
+    if args.load:
+        maze = maze_class.load(args.load, (800, 600))
+    else:
+        maze = maze_class(args.size[0], args.size[1], (800, 600))
+        maze.generate(args.layout, args.seed)
+    try:
+        asyncio.run(serve(maze, args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+A camera over a maze that can be larger than the window, and a renderer
+that only draws what the camera sees. The view is cut into square chunks
+that are drawn once and kept while the camera pans. Close up the cells
+of a chunk are drawn one by one; further away a chunk is an image made
+from the wall masks, shrunk to the zoom (level of detail), with the
+colors of the cells painted over it.
+"""
+import itertools
+import math
+import pygame
+from exercise.grid_element import NORTH, EAST, SOUTH, WEST
+from exercise.renderer import BLACK, WHITE, cell_rect, draw_arrow, draw_walls
+
+MAX_CELL_SIZE = 64  # Pixels per cell when fully zoomed in
+DETAIL_SIZE = 4  # From this many pixels per cell on, the cells are drawn one by one
+ARROW_SIZE = 8  # From this many pixels per cell on, the parents are shown as arrows
+CHUNK_PIXELS = 256  # The side of a chunk of drawn cells, about
+OVERVIEW_CELLS = 32  # The side in cells of the smallest chunk of the overview
+OVERVIEW_PIXELS = 64  # The smallest side in pixels of a chunk of the overview
+IMAGE_PIXELS = 128  # The largest side of a kept overview image
+MAX_IMAGES = 1024  # Overview images kept before those out of view are dropped
+MAX_CHANGED_CELLS = 1 << 16  # Changed cells followed one by one, more (e.g. a reset) make all chunks again
+
+# The overview shows a cell as 2 x 2 pixels: a corner and the north wall
+# on top, the west wall and the cell itself below. These tables turn a
+# wall mask into the grey value of each of those pixels.
+TOP_LEFT = bytes(0 if mask & (NORTH | WEST) else 255 for mask in range(256))
+TOP_RIGHT = bytes(0 if mask & NORTH else 255 for mask in range(256))
+BOTTOM_LEFT = bytes(0 if mask & WEST else 255 for mask in range(256))
+
+
+class Camera:
+    """
+    The part of a maze shown in a window: 'left' and 'top' are the cell
+    coordinates at the top left corner of the window, 'cell_size' the
+    pixels per cell. The camera keeps some of the maze in sight and never
+    zooms out further than the whole maze.
+    """
+
+    def __init__(self, grid_size, screen_size):
+        self.grid_size = grid_size
+        self.screen_size = screen_size
+        self.fit()
+
+    """
+    Show the whole maze
+    """
+
+    def fit(self):
+        self.min_cell_size = min(self.screen_size[0] / self.grid_size[0], self.screen_size[1] / self.grid_size[1])
+        self.cell_size = self.min_cell_size
+        self.left = 0.0
+        self.top = 0.0
+        return None
+
+    """
+    Move the view by a number of pixels
+    """
+
+    def pan(self, dx, dy):
+        self.left += dx / self.cell_size
+        self.top += dy / self.cell_size
+        self.clamp()
+        return None
+
+    """
+    Zoom in (factor > 1) or out, keeping the cell under pixel in place
+    """
+
+    def zoom_at(self, factor, pixel):
+        x, y = self.to_cells(pixel)
+        self.cell_size = min(max(self.cell_size * factor, self.min_cell_size), max(MAX_CELL_SIZE, self.min_cell_size))
+        self.left = x - pixel[0] / self.cell_size
+        self.top = y - pixel[1] / self.cell_size
+        self.clamp()
+        return None
+
+    def clamp(self):
+        # Keep the center of the window over the maze
+        half_width = self.screen_size[0] / self.cell_size / 2
+        half_height = self.screen_size[1] / self.cell_size / 2
+        self.left = min(max(self.left, -half_width), self.grid_size[0] - half_width)
+        self.top = min(max(self.top, -half_height), self.grid_size[1] - half_height)
+
+    def to_cells(self, pixel):
+        return self.left + pixel[0] / self.cell_size, self.top + pixel[1] / self.cell_size
+
+    """
+    The (x, y) of the cell under a pixel, None outside the maze
+    """
+
+    def cell_at(self, pixel):
+        x, y = self.to_cells(pixel)
+        if 0 <= x < self.grid_size[0] and 0 <= y < self.grid_size[1]:
+            return int(x), int(y)
+        return None
+
+    """
+    The cells in view as (left, top, right, bottom), right and bottom excluded
+    """
+
+    def visible_cells(self):
+        right, bottom = self.to_cells(self.screen_size)
+        return (max(0, int(self.left)), max(0, int(self.top)),
+                min(self.grid_size[0], math.ceil(right)), min(self.grid_size[1], math.ceil(bottom)))
+
+
+class ViewportRenderer:
+    """
+    Draws the part of a maze a Camera sees, from chunks of cells that are
+    kept until the zoom or one of their cells or links changes. The links
+    changed through add_link and del_link are read like ComponentIndex
+    does; links changed in bulk drop all chunks. draw returns the changed
+    rectangles for pygame.display.update: those of the chunks with
+    changes, or the whole window after a pan, a zoom or a change of the
+    whole maze.
+    """
+
+    def __init__(self, maze, camera):
+        self.maze = maze
+        self.camera = camera
+        self.version = None
+        self.links = maze.watch_links()
+        self.view = None
+        self.level = None  # None for the cells drawn one by one, else the overview level
+        self.cell_size = None
+        self.chunks = {}  # (x, y) of a chunk -> its surface at the current zoom
+        self.images = {}  # (x, y) of a chunk -> its overview image at the current level
+
+    """
+    Stop watching the links of the maze, for a renderer that is replaced
+    """
+
+    def close(self):
+        self.maze.unwatch_links(self.links)
+        return None
+
+    def draw(self, surface):
+        changed = self.update_chunks()
+        view = (self.camera.left, self.camera.top, self.camera.cell_size)
+        if changed is True or view != self.view:
+            self.view = view
+            self.draw_view(surface)
+            return [surface.get_rect()]
+        rects = []
+        chunk_cells = self.chunk_cells()
+        for chunk_x, chunk_y in changed:
+            rect = self.draw_area(surface, self.screen_rect(chunk_x, chunk_y, chunk_cells))
+            if rect.width > 0 and rect.height > 0:
+                rects.append(rect)
+        return rects
+
+    """
+    Draw the chunks under a rectangle again, e.g. to remove an overlay
+    """
+
+    def draw_area(self, surface, rect):
+        rect = pygame.Rect(rect).clip(surface.get_rect())
+        surface.set_clip(rect)
+        self.draw_view(surface)
+        surface.set_clip(None)
+        return rect
+
+    """
+    Draw the chunks in view, only those under the clip of surface
+    """
+
+    def draw_view(self, surface):
+        camera = self.camera
+        chunk_cells = self.chunk_cells()
+        clip = surface.get_clip()
+        surface.fill(WHITE)
+        left, top, right, bottom = camera.visible_cells()
+        origin_x, origin_y = self.origin()
+        chunk_x_range = range(left // chunk_cells, (right + chunk_cells - 1) // chunk_cells)
+        chunk_y_range = range(top // chunk_cells, (bottom + chunk_cells - 1) // chunk_cells)
+        for chunk_x in chunk_x_range:
+            for chunk_y in chunk_y_range:
+                rect = self.chunk_rect(chunk_x, chunk_y, chunk_cells)
+                if clip.colliderect(rect.move(-origin_x, -origin_y)):
+                    surface.blit(self.chunk(chunk_x, chunk_y, chunk_cells, rect),
+                                 (rect.left - origin_x, rect.top - origin_y))
+        if self.level is not None:
+            # The overview images only show the north and west walls
+            pygame.draw.rect(surface, BLACK, (-origin_x, -origin_y, round(self.maze.grid_size[0] * camera.cell_size) + 1,
+                                              round(self.maze.grid_size[1] * camera.cell_size) + 1), 1)
+        if len(self.images) > MAX_IMAGES:
+            for key in list(self.images):
+                if key[0] not in chunk_x_range or key[1] not in chunk_y_range:
+                    del self.images[key]
+
+    """
+    Bring the chunks up to date with the maze, returns True when all of
+    them changed, else the set of the (x, y) of those that did. A chunk
+    whose walls changed is dropped with its overview image. In the
+    overview a cell whose color changed is painted on its chunk, close
+    up the chunk is dropped and its cells are drawn again.
+    """
+
+    def update_chunks(self):
+        changed = set()
+        links = self.maze.take_link_changes(self.links)
+        if self.version is None or self.maze.version != self.version + len(links) or len(links) > MAX_IMAGES:
+            self.version = self.maze.version
+            self.maze.watch_changes()
+            self.chunks.clear()
+            self.images.clear()
+            changed = True
+        else:
+            self.version = self.maze.version
+            cells = self.maze.take_changes(limit=MAX_CHANGED_CELLS)
+            if cells is None:
+                self.chunks.clear()  # The walls are the same, the overview images are kept
+                changed = True
+            elif self.cell_size is not None:
+                chunk_cells = self.chunk_cells()
+                for cell in itertools.chain(*links):
+                    key = (cell.position[0] // chunk_cells, cell.position[1] // chunk_cells)
+                    self.chunks.pop(key, None)
+                    self.images.pop(key, None)
+                    changed.add(key)
+                for cell in cells:
+                    key = (cell.position[0] // chunk_cells, cell.position[1] // chunk_cells)
+                    chunk = self.chunks.get(key)
+                    color = cell.color
+                    if chunk is not None and self.level is not None and color != WHITE:
+                        self.paint(chunk, self.chunk_rect(key[0], key[1], chunk_cells), cell.position, color)
+                    else:
+                        self.chunks.pop(key, None)  # A white cell shows the walls under it again
+                    changed.add(key)
+                if len(changed) > MAX_IMAGES:
+                    changed = True
+
+        if self.cell_size != self.camera.cell_size:
+            self.cell_size = self.camera.cell_size
+            self.chunks.clear()
+            changed = True
+            level = self.overview_level()
+            if level != self.level:
+                self.level = level
+                self.images.clear()
+        return changed
+
+    def overview_level(self):
+        if self.camera.cell_size >= DETAIL_SIZE:
+            return None
+        level = 0
+        while (OVERVIEW_CELLS << level) * self.camera.cell_size < OVERVIEW_PIXELS:
+            level += 1
+        return level
+
+    def chunk_cells(self):
+        if self.level is None:
+            return max(1, int(CHUNK_PIXELS // self.cell_size))
+        return OVERVIEW_CELLS << self.level
+
+    def chunk_rect(self, chunk_x, chunk_y, chunk_cells):
+        # Chunks are placed on whole pixels of the maze at this zoom, so
+        # they tile without gaps wherever the camera is
+        size = self.camera.cell_size
+        left = round(chunk_x * chunk_cells * size)
+        top = round(chunk_y * chunk_cells * size)
+        right = round(min((chunk_x + 1) * chunk_cells, self.maze.grid_size[0]) * size)
+        bottom = round(min((chunk_y + 1) * chunk_cells, self.maze.grid_size[1]) * size)
+        return pygame.Rect(left, top, max(1, right - left), max(1, bottom - top))
+
+    def origin(self):
+        return round(self.camera.left * self.camera.cell_size), round(self.camera.top * self.camera.cell_size)
+
+    """
+    The rectangle of a chunk in the window
+    """
+
+    def screen_rect(self, chunk_x, chunk_y, chunk_cells):
+        origin_x, origin_y = self.origin()
+        return self.chunk_rect(chunk_x, chunk_y, chunk_cells).move(-origin_x, -origin_y)
+
+    def chunk(self, chunk_x, chunk_y, chunk_cells, rect):
+        surface = self.chunks.get((chunk_x, chunk_y))
+        if surface is None:
+            if self.level is None:
+                surface = self.draw_cells(chunk_x, chunk_y, chunk_cells, rect)
+            else:
+                image = self.images.get((chunk_x, chunk_y))
+                if image is None:
+                    image = self.overview_image(chunk_x, chunk_y, chunk_cells)
+                    self.images[(chunk_x, chunk_y)] = image
+                surface = pygame.transform.smoothscale(image, rect.size)
+                left, top = chunk_x * chunk_cells, chunk_y * chunk_cells
+                width = min(chunk_cells, self.maze.grid_size[0] - left)
+                height = min(chunk_cells, self.maze.grid_size[1] - top)
+                for position, color in self.maze.colors_in(left, top, width, height):
+                    self.paint(surface, rect, position, color)
+            self.chunks[(chunk_x, chunk_y)] = surface
+        return surface
+
+    """
+    Paint the color of a cell on the overview chunk at rect, at least a
+    pixel
+    """
+
+    def paint(self, surface, rect, position, color):
+        size = self.cell_size
+        left, top = int(position[0] * size), int(position[1] * size)
+        surface.fill(color, (left - rect.left, top - rect.top, max(1, int((position[0] + 1) * size) - left),
+                             max(1, int((position[1] + 1) * size) - top)))
+
+    def draw_cells(self, chunk_x, chunk_y, chunk_cells, rect):
+        surface = pygame.Surface(rect.size)
+        surface.fill(WHITE)
+        size = self.cell_size
+        grid_width, grid_height = self.maze.grid_size
+        left, top = chunk_x * chunk_cells, chunk_y * chunk_cells
+        right, bottom = min(left + chunk_cells, grid_width), min(top + chunk_cells, grid_height)
+        line_width = max(1, int(size / 10))
+        for x in range(left, right):
+            sides = NORTH | WEST | (EAST if x == right - 1 else 0)
+            col = self.maze.grid[x]
+            for y in range(top, bottom):
+                cell = col[y]
+                corner = (x * size - rect.left, y * size - rect.top)
+                if cell.color != WHITE:
+                    surface.fill(cell.color, cell_rect(corner, size))
+                draw_walls(surface, cell.walls & (sides | (SOUTH if y == bottom - 1 else 0)),
+                           (corner[0], corner[1], corner[0] + size, corner[1] + size), line_width)
+                if cell.parent is not None and size >= ARROW_SIZE:
+                    draw_arrow(surface, (corner[0] + 0.5 * size, corner[1] + 0.5 * size), cell.direction(cell.parent),
+                               (size, size))
+        return surface
+
+    """
+    The walls of a chunk of the overview, the colors are painted on the
+    chunk itself
+    """
+
+    def overview_image(self, chunk_x, chunk_y, chunk_cells):
+        grid_width, grid_height = self.maze.grid_size
+        left, top = chunk_x * chunk_cells, chunk_y * chunk_cells
+        width, height = min(chunk_cells, grid_width - left), min(chunk_cells, grid_height - top)
+        masks = self.maze.wall_rows(left, top, width, height)
+
+        grey = bytearray(4 * width * height)
+        stride = 2 * width
+        for y in range(height):
+            row = bytes(masks[y * width:(y + 1) * width])
+            begin = 2 * y * stride
+            grey[begin:begin + stride:2] = row.translate(TOP_LEFT)
+            grey[begin + 1:begin + stride:2] = row.translate(TOP_RIGHT)
+            grey[begin + stride:begin + 2 * stride:2] = row.translate(BOTTOM_LEFT)
+            grey[begin + stride + 1:begin + 2 * stride:2] = b'\xff' * width
+        pixels = bytearray(3 * len(grey))
+        pixels[0::3] = grey
+        pixels[1::3] = grey
+        pixels[2::3] = grey
+
+        image = pygame.image.frombuffer(bytes(pixels), (stride, 2 * height), 'RGB')
+        if max(image.get_size()) > IMAGE_PIXELS:
+            scale = IMAGE_PIXELS / max(image.get_size())
+            image = pygame.transform.smoothscale(image, (max(1, round(stride * scale)), max(1, round(2 * height * scale))))
+        return image
+
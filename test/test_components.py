@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from exercise.compact_maze import CompactMaze
+from exercise.components import ComponentIndex
+from exercise.maze import Maze
+from exercise.search import Search
+
+
+def wall_in(a_maze, cell):
+    """Remove all links of cell, so nothing else can reach it"""
+    for other in a_maze.possible_neighbours(cell):
+        a_maze.del_link(cell, other)
+
+
+class TestComponents:
+
+    @pytest.mark.parametrize("maze_class", [Maze, CompactMaze])
+    @pytest.mark.parametrize("layout", ["generate_fast_maze", "generate_obstacles"])
+    def test_matches_relabel_after_edits(self, maze_class, layout):
+        rng = random.Random(7)
+        a_maze = maze_class(23, 17, (230, 170))
+        a_maze.generate(layout, 7)
+        index = a_maze.component_index()
+        for _ in range(300):
+            cell = a_maze.grid[rng.randrange(23)][rng.randrange(17)]
+            other = rng.choice(a_maze.possible_neighbours(cell))
+            (a_maze.add_link if rng.random() < 0.4 else a_maze.del_link)(cell, other)
+            if rng.random() < 0.3:
+                index.sync()
+            if rng.random() < 0.1:
+                fresh = ComponentIndex(a_maze)
+                labels = {}
+                for cell_index in range(23 * 17):
+                    label = index.component(cell_index)
+                    assert labels.setdefault(label, fresh.component(cell_index)) == fresh.component(cell_index)
+                    assert index.size(cell_index) == fresh.size(cell_index)
+                assert index.count() == fresh.count() == len(labels)
+
+    def test_connected(self):
+        a_maze = Maze(10, 10, (100, 100))
+        a_maze.generate_room()
+        index = a_maze.component_index()
+        assert index.count() == 1 and index.connected((0, 0), a_maze.grid[9][9])
+        wall_in(a_maze, a_maze.grid[3][3])
+        assert not index.connected((0, 0), (3, 3)) and index.size(3 * 10 + 3) == 1
+        assert index.count() == 2
+        a_maze.add_link(a_maze.grid[3][3], a_maze.grid[3][4])
+        assert index.connected((0, 0), (3, 3)) and index.count() == 1
+
+    @pytest.mark.parametrize("solve, options", [
+        ("breadth_first_solution", {}), ("depth_first_solution", {}), ("bidirectional_breadth_first_solution", {}),
+        ("a_star_search", {"skip_unreachable": True}), ("bidirectional_a_star_search", {"skip_unreachable": True}),
+        ("jump_point_search", {"skip_unreachable": True}), ("incremental_search", {"skip_unreachable": True}),
+        ("hierarchical_search", {"skip_unreachable": True})])
+    def test_searches_stop_when_unreachable(self, solve, options):
+        a_maze = CompactMaze(12, 12, (120, 120))
+        a_maze.generate_maze(seed=3)
+        wall_in(a_maze, a_maze.target)
+        search = Search(a_maze, verbose=False, **options)
+        getattr(search, solve)()
+        assert a_maze.target.distance is None
+        assert search.visited == 0, "No cell should be expanded for a walled off target"
+
+    @pytest.mark.parametrize("solve", ["greedy_search", "a_star_search", "bidirectional_a_star_search"])
+    def test_heuristic_searches_explore_by_default(self, solve):
+        a_maze = CompactMaze(12, 12, (120, 120))
+        a_maze.generate_maze(seed=3)
+        wall_in(a_maze, a_maze.target)
+        search = Search(a_maze, verbose=False)
+        getattr(search, solve)()
+        assert a_maze.target.distance is None
+        assert search.visited > 0
+
+    def test_first_search_labels_in_steps(self):
+        a_maze = CompactMaze(200, 200, (200, 200))
+        a_maze.generate_fast_maze(seed=1)
+        steps = Search(a_maze, verbose=False).breadth_first_steps()
+        assert [next(steps) for _ in range(5)] == [None] * 5, "The labelling is spread over several steps"
+        steps.close()  # Dropped before the labels are all set
+        search = Search(a_maze, verbose=False)
+        search.breadth_first_solution()
+        assert a_maze.target.distance is not None
+        index = a_maze.component_index()
+        assert -1 not in index.labels and index.count() == ComponentIndex(a_maze).count()
+
+    def test_batch_skips_unreachable(self):
+        a_maze = Maze(10, 10, (100, 100))
+        a_maze.generate_room()
+        wall_in(a_maze, a_maze.grid[3][3])
+        pairs = [((0, 0), (3, 3)), ((3, 3), (0, 0)), ((3, 3), (3, 3)), ((0, 0), (2, 2))]
+        assert Search(a_maze).batch_shortest_paths(pairs) == [None, None, 0, 4]
+        assert Search(a_maze).batch_shortest_paths(pairs, paths=True)[:2] == [(None, None), (None, None)]
@@ -0,0 +1,98 @@
+import random
+
+import pytest
+
+from exercise.compact_maze import CompactMaze
+from exercise.distance_index import DistanceIndex, TREE, LANDMARKS
+from exercise.maze import Maze
+from exercise.search import Search
+
+
+class TestDistanceIndex:
+
+    def test_room_distances(self, tmp_path):
+        a_maze = Maze(10, 10, (100, 100))
+        a_maze.generate_room()
+        index = DistanceIndex(a_maze)
+        assert index.kind == LANDMARKS
+        assert index.distance((0, 0), (3, 3)) == 6
+        index.save(tmp_path / "room.idx")
+        assert DistanceIndex.load(tmp_path / "room.idx", a_maze).distance(a_maze.grid[3][3], (0, 0)) == 6
+
+    def test_tree_and_invalidation(self):
+        a_maze = Maze(4, 1, (40, 10))
+        for x in range(3):
+            a_maze.add_link(a_maze.grid[x][0], a_maze.grid[x + 1][0])
+        index = DistanceIndex(a_maze)
+        assert index.kind == TREE
+        assert index.distance((3, 0), (1, 0)) == 2
+        a_maze.del_link(a_maze.grid[1][0], a_maze.grid[2][0])
+        assert index.distance((3, 0), (1, 0)) is None, "The index should follow the removed link"
+
+    @pytest.mark.parametrize("maze_class", [Maze, CompactMaze])
+    @pytest.mark.parametrize("layout", ["generate_maze", "generate_room", "generate_obstacles", "generate_eller_maze"])
+    def test_matches_bfs(self, maze_class, layout):
+        rng = random.Random(8)
+        a_maze = maze_class(40, 30, (400, 300))
+        a_maze.generate(layout, 8)
+        index = DistanceIndex(a_maze)
+        assert index.kind == (TREE if layout == "generate_eller_maze" else LANDMARKS)
+        pairs = [((rng.randrange(40), rng.randrange(30)), (rng.randrange(40), rng.randrange(30))) for _ in range(40)]
+        exact = Search(a_maze, verbose=False).batch_shortest_paths(pairs)
+        assert [index.distance(source, target) for source, target in pairs] == exact
+        for (source, target), distance in zip(pairs, exact):
+            if distance is not None:
+                assert index.lower_bound(source, target) <= distance
+
+    def test_follows_edits(self):
+        rng = random.Random(9)
+        a_maze = CompactMaze(30, 20, (300, 200))
+        a_maze.generate_obstacles(seed=9)
+        index = DistanceIndex(a_maze)
+        tables = index.landmark_distances
+        for _ in range(30):
+            cell = a_maze.grid[rng.randrange(30)][rng.randrange(20)]
+            other = rng.choice(a_maze.possible_neighbours(cell))
+            (a_maze.add_link if rng.random() < 0.5 else a_maze.del_link)(cell, other)
+            pairs = [((rng.randrange(30), rng.randrange(20)), (rng.randrange(30), rng.randrange(20))) for _ in range(5)]
+            exact = Search(a_maze, verbose=False).batch_shortest_paths(pairs)
+            for (source, target), distance in zip(pairs, exact):
+                assert index.distance(source, target) == distance
+                if distance is not None:
+                    assert index.lower_bound(source, target) <= distance
+        assert index.landmark_distances is tables, "Single links should update the landmarks, not rebuild them"
+
+    @pytest.mark.parametrize("layout", ["generate_maze", "generate_room", "generate_obstacles"])
+    def test_guides_a_star(self, layout):
+        rng = random.Random(10)
+        a_maze = Maze(40, 40, (400, 400))
+        a_maze.generate(layout, 10)
+        search = Search(a_maze, verbose=False)
+        pairs = [((rng.randrange(40), rng.randrange(40)), (rng.randrange(40), rng.randrange(40))) for _ in range(20)]
+        plain = []
+        for source, target in pairs:
+            a_maze.set_source(a_maze.grid[source[0]][source[1]])
+            a_maze.set_target(a_maze.grid[target[0]][target[1]])
+            search.a_star_search()
+            plain.append((a_maze.target.distance, search.visited))
+        a_maze.build_distance_index()
+        expanded = 0
+        for (source, target), (distance, visited) in zip(pairs, plain):
+            a_maze.set_source(a_maze.grid[source[0]][source[1]])
+            a_maze.set_target(a_maze.grid[target[0]][target[1]])
+            search.a_star_search()
+            assert a_maze.target.distance == distance
+            expanded += search.visited
+        assert expanded < sum(visited for _, visited in plain)
+
+    def test_saved_with_maze(self, tmp_path):
+        a_maze = Maze(20, 20, (200, 200))
+        a_maze.generate_room()
+        a_maze.build_distance_index()
+        a_maze.del_link(a_maze.grid[5][5], a_maze.grid[5][6])
+        a_maze.save(tmp_path / "room.maze")
+        loaded = Maze.load(tmp_path / "room.maze", (200, 200))
+        assert loaded.distance_index is not None
+        assert loaded.distance_index.landmarks == a_maze.distance_index.landmarks
+        assert loaded.distance_index.distance((0, 0), (19, 19)) == a_maze.distance_index.distance((0, 0), (19, 19))
+        assert Maze.load(tmp_path / "room.maze", (200, 200)).distance_index.stale is False
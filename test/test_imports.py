@@ -0,0 +1,9 @@
+from benchmarks.imports import BUDGET, import_time
+
+
+class TestHeadlessCore:
+
+    def test_core_imports_without_drawing(self):
+        elapsed, loaded = import_time(runs=3)
+        assert loaded == [], "Maze and Search must not import pygame or numpy"
+        assert elapsed < BUDGET
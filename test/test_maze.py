@@ -0,0 +1,294 @@
+import random
+
+import pytest
+
+from exercise.compact_maze import CompactMaze
+from exercise.generators import eller_rows, tiled_masks
+from exercise.grid_element import ALL_WALLS, NORTH, EAST, SOUTH, WEST
+from exercise.maze import SEEDED_LAYOUTS, Maze
+from exercise.maze_cache import MazeCache
+from exercise.maze_file import MazeFile, MazeWriter, write_eller_maze, write_fast_maze
+from exercise.search import Search
+
+
+class TestCompactMaze:
+
+    def test_wall_masks_round_trip(self):
+        a_maze = Maze(12, 9, (120, 90))
+        a_maze.generate_room()
+        compact = CompactMaze(12, 9, (120, 90))
+        compact.load_wall_masks(a_maze.wall_masks())
+        assert compact.wall_masks() == a_maze.wall_masks()
+        for x in range(12):
+            for y in range(9):
+                expected = sorted(cell.position for cell in a_maze.grid[x][y].get_neighbours())
+                assert sorted(cell.position for cell in compact.grid[x][y].get_neighbours()) == expected
+
+    def test_links(self):
+        compact = CompactMaze(5, 5, (50, 50))
+        compact.add_link(compact.grid[1][1], compact.grid[2][1])
+        assert compact.grid[1][1].get_neighbours() == [compact.grid[2][1]]
+        assert compact.grid[2][1].get_neighbours() == [compact.grid[1][1]]
+        compact.del_link(compact.grid[2][1], compact.grid[1][1])
+        assert compact.grid[1][1].get_neighbours() == []
+
+    def test_cell_equality(self):
+        compact = CompactMaze(5, 5, (50, 50))
+        assert compact.grid[1][2] == compact.grid[1][2] and compact.grid[1][2] != compact.grid[2][1]
+        assert compact.grid[1][2] != None and compact.grid[1][2] != (1, 2)
+        assert compact.grid[1][2] in {compact.grid[1][2]} and None not in [compact.grid[0][0]]
+
+    def test_search_state(self):
+        compact = CompactMaze(10, 10, (100, 100))
+        compact.generate_room()
+        compact.set_target(compact.grid[3][3])
+        Search(compact).breadth_first_solution()
+        assert compact.target.distance == 6
+        assert compact.target.parent is not None
+        compact.reset_state()
+        assert compact.target.distance is None
+        assert compact.grid[0][0].distance == 0
+
+
+class TestNeighbours:
+
+    def test_links_and_walls(self):
+        a_maze = Maze(5, 5, (50, 50))
+        cell = a_maze.grid[2][2]
+        a_maze.add_link(cell, a_maze.grid[3][2])
+        a_maze.add_link(cell, a_maze.grid[2][1])
+        a_maze.add_link(cell, a_maze.grid[3][2])
+        assert cell.neighbours == (a_maze.grid[3][2], a_maze.grid[2][1]), "Linked once, in order"
+        assert cell.walls == SOUTH | WEST
+        assert a_maze.grid[3][2].walls == ALL_WALLS & ~WEST
+        neighbours = cell.get_neighbours()
+        neighbours.clear()
+        assert len(cell.neighbours) == 2, "get_neighbours should return a copy"
+        a_maze.del_link(a_maze.grid[3][2], cell)
+        assert cell.neighbours == (a_maze.grid[2][1],)
+        assert cell.walls == EAST | SOUTH | WEST
+        assert a_maze.grid[3][2].neighbours == () and a_maze.grid[3][2].walls == ALL_WALLS
+
+    def test_open_maze(self):
+        a_maze = Maze(4, 3, (40, 30))
+        a_maze.generate_open_maze()
+        assert a_maze.grid[0][0].walls == NORTH | WEST
+        assert a_maze.grid[1][1].walls == 0
+        assert a_maze.grid[1][1].neighbours == tuple(a_maze.possible_neighbours(a_maze.grid[1][1]))
+        assert a_maze.grid[3][2].walls == EAST | SOUTH
+
+
+    @pytest.mark.parametrize("maze_class", [Maze, CompactMaze])
+    def test_unchanged_links_keep_version(self, maze_class):
+        a_maze = maze_class(5, 5, (50, 50))
+        changes = a_maze.watch_links()
+        version = a_maze.version
+        a_maze.del_link(a_maze.grid[1][1], a_maze.grid[2][1])
+        a_maze.del_link(a_maze.grid[1][1], a_maze.grid[3][3])
+        assert a_maze.version == version and changes == [], "Removing a missing link changes nothing"
+        a_maze.add_link(a_maze.grid[1][1], a_maze.grid[2][1])
+        a_maze.add_link(a_maze.grid[2][1], a_maze.grid[1][1])
+        a_maze.del_link(a_maze.grid[2][1], a_maze.grid[1][1])
+        a_maze.del_link(a_maze.grid[2][1], a_maze.grid[1][1])
+        assert a_maze.version == version + 2 and len(changes) == 2
+
+    @pytest.mark.parametrize("maze_class", [Maze, CompactMaze])
+    def test_dropped_watchers_and_bulk_changes(self, maze_class):
+        a_maze = maze_class(20, 20, (200, 200))
+        a_maze.generate_maze(seed=1)
+        for _ in range(3):
+            Search(a_maze, verbose=False).incremental_search()
+        kept = a_maze.watch_links()
+        unwatched = a_maze.watch_links()
+        a_maze.unwatch_links(unwatched)
+        a_maze.del_link(a_maze.grid[1][1], a_maze.grid[1][1].get_neighbours()[0])
+        assert len(kept) == 1 and unwatched == []
+        assert list(a_maze.link_watchers.values()) == [kept], "Dropped planners stop watching"
+        a_maze.generate_maze(seed=2)
+        assert kept == [], "A bulk change drops the recorded links"
+
+    def test_reset_state_clears_touched_cells(self):
+        a_maze = Maze(10, 10, (100, 100))
+        a_maze.generate_obstacles(seed=0)  # With the target reachable, so the search visits cells
+        Search(a_maze).breadth_first_solution()
+        assert len(a_maze.touched) > 2
+        a_maze.set_target(a_maze.grid[4][4])
+        assert len(a_maze.touched) == 2, "Only the source and target should be marked"
+        for col in a_maze.grid:
+            for cell in col:
+                if cell != a_maze.start:
+                    assert cell.parent is None and cell.distance is None and cell.score is None
+
+    def test_reset_all_clears_links(self):
+        a_maze = Maze(6, 6, (60, 60))
+        a_maze.generate_open_maze()
+        a_maze.reset_all()
+        assert all(len(cell.neighbours) == 0 for col in a_maze.grid for cell in col)
+        assert a_maze.linked == []
+
+    def test_linked_once_per_cell(self):
+        a_maze = Maze(6, 6, (60, 60))
+        cell, other = a_maze.grid[2][2], a_maze.grid[2][3]
+        for _ in range(100):
+            a_maze.add_link(cell, other)
+            a_maze.del_link(cell, other)
+        assert a_maze.linked == [cell, other]
+        a_maze.generate_open_maze()
+        a_maze.add_link(cell, other)
+        assert len(a_maze.linked) == 36
+
+    def test_compact_epoch(self):
+        compact = CompactMaze(10, 10, (100, 100))
+        compact.generate_open_maze()
+        compact.grid[5][5].set_parent(compact.grid[5][4])
+        compact.reset_state()
+        assert compact.grid[5][5].parent is None
+        assert compact.grid[5][5].distance is None
+
+
+class TestFastMaze:
+
+    def test_connected_and_seeded(self):
+        a_maze = Maze(15, 10, (150, 100))
+        a_maze.generate_fast_maze(seed=7)
+        masks = a_maze.wall_masks()
+        links = sum(len(cell.neighbours) for col in a_maze.grid for cell in col) // 2
+        assert 15 * 10 - 1 <= links <= 15 * 10 - 1 + 15, "A spanning tree plus a few extra links"
+        assert None not in Search(a_maze).batch_shortest_paths([((0, 0), (x, y)) for x in range(15) for y in range(10)])
+
+        compact = CompactMaze(15, 10, (150, 100))
+        compact.generate_fast_maze(seed=7)
+        assert compact.wall_masks() == masks, "The same seed should give the same maze"
+
+
+class TestTiledMaze:
+
+    def test_perfect_and_seeded(self):
+        a_maze = CompactMaze(23, 17, (230, 170))
+        a_maze.load_wall_masks(tiled_masks(23, 17, 5, random.Random(3)))
+        links = sum(len(cell.neighbours) for col in a_maze.grid for cell in col) // 2
+        assert links == 23 * 17 - 1, "The stitched tiles should form one spanning tree"
+        assert None not in Search(a_maze).batch_shortest_paths([((0, 0), (x, y)) for x in range(23) for y in range(17)])
+        assert tiled_masks(23, 17, 5, random.Random(3), processes=2) == bytes(a_maze.wall_masks()), \
+            "The maze should not depend on the number of processes"
+
+    def test_generate(self):
+        a_maze = Maze(30, 20, (300, 200))
+        a_maze.generate_tiled_maze(tile_size=8, seed=1)
+        assert a_maze.version > 0
+        assert None not in Search(a_maze).batch_shortest_paths([((0, 0), (29, 19)), ((0, 0), (12, 7))])
+
+
+class TestEllerMaze:
+
+    def test_perfect_and_seeded(self):
+        a_maze = CompactMaze(23, 17, (230, 170))
+        a_maze.load_wall_masks(bytearray().join(eller_rows(23, 17, random.Random(2))))
+        links = sum(len(cell.neighbours) for col in a_maze.grid for cell in col) // 2
+        assert links == 23 * 17 - 1, "Eller's algorithm should make a spanning tree"
+        assert None not in Search(a_maze).batch_shortest_paths([((0, 0), (x, y)) for x in range(23) for y in range(17)])
+        other = Maze(23, 17, (230, 170))
+        other.generate_eller_maze(seed=2)
+        assert other.wall_masks() == a_maze.wall_masks()
+
+    def test_sliding_window(self):
+        rows = eller_rows(8, None, random.Random(5))
+        first = [next(rows) for _ in range(12)]
+        a_maze = Maze(8, 5, (80, 50))
+        a_maze.push_rows(first[:5])
+        a_maze.push_rows(first[5:12])
+        assert a_maze.first_row == 12
+        window = a_maze.wall_masks()
+        for y in range(5):
+            expected = first[7 + y]
+            assert list(window[y * 8:(y + 1) * 8]) == [mask | (NORTH if y == 0 else 0) | (SOUTH if y == 4 else 0)
+                                                       for mask in expected]
+
+    @pytest.mark.parametrize("maze_class", [Maze, CompactMaze])
+    def test_rows_one_at_a_time(self, maze_class):
+        rows = eller_rows(8, None, random.Random(5))
+        first = [next(rows) for _ in range(12)]
+        a_maze = maze_class(8, 5, (80, 50))
+        for row in first:
+            a_maze.push_rows([row])
+        at_once = maze_class(8, 5, (80, 50))
+        at_once.push_rows(first[7:])
+        assert a_maze.first_row == 12
+        assert a_maze.wall_masks() == at_once.wall_masks()
+        assert a_maze.component_index().count() == at_once.component_index().count()
+
+    def test_streamed_file(self, tmp_path):
+        write_eller_maze(tmp_path / "maze.bin", 9, 40, seed=6)
+        a_maze = Maze(9, 40, (90, 400))
+        a_maze.generate_eller_maze(seed=6)
+        with MazeFile(tmp_path / "maze.bin") as maze_file:
+            assert maze_file.wall_masks() == a_maze.wall_masks()
+
+
+class TestSeeds:
+
+    @pytest.mark.parametrize("layout", SEEDED_LAYOUTS)
+    def test_same_seed_same_maze(self, layout):
+        first = Maze(17, 13, (170, 130))
+        first.generate(layout, seed=7)
+        random.seed(1)  # The global random module is not used
+        second = CompactMaze(17, 13, (170, 130))
+        second.generate(layout, seed=7)
+        assert second.wall_masks() == first.wall_masks()
+        second.generate(layout, seed=8)
+        assert second.wall_masks() != first.wall_masks()
+
+    def test_maze_rng(self):
+        first = Maze(15, 15, (150, 150), rng=random.Random(4))
+        second = Maze(15, 15, (150, 150), rng=random.Random(4))
+        for a_maze in (first, second):
+            a_maze.generate_maze()
+            a_maze.generate_obstacles()
+        assert first.wall_masks() == second.wall_masks()
+
+    def test_cache(self):
+        cache = MazeCache(capacity=2)
+        a_maze = Maze(20, 10, (200, 100))
+        a_maze.generate_obstacles(seed=3)
+        assert cache.wall_masks('generate_obstacles', (20, 10), 3) == a_maze.wall_masks().tobytes()
+        cache.load(a_maze, 'generate_maze', 3)
+        cache.load(a_maze, 'generate_room', 9)
+        assert cache.key('generate_room', (20, 10), 9) == ('generate_room', (20, 10), None)
+        assert (cache.hits, cache.misses) == (0, 3)
+        assert len(cache.masks) == 2, "The least recently used maze is dropped"
+        expected = Maze(20, 10, (200, 100))
+        expected.generate_maze(seed=3)
+        cache.load(a_maze, 'generate_maze', 3)
+        assert cache.hits == 1
+        assert a_maze.wall_masks() == expected.wall_masks()
+        with pytest.raises(ValueError):
+            cache.wall_masks('generate_maze', (20, 10))
+
+
+class TestMazeFile:
+
+    @pytest.mark.parametrize("maze_class", [Maze, CompactMaze])
+    def test_save_load(self, tmp_path, maze_class):
+        a_maze = maze_class(13, 8, (130, 80))
+        a_maze.generate_fast_maze(seed=12)
+        a_maze.set_target(a_maze.grid[5][6])
+        a_maze.save(tmp_path / "maze.bin")
+        loaded = maze_class.load(tmp_path / "maze.bin", (130, 80))
+        assert loaded.grid_size == (13, 8)
+        assert loaded.wall_masks() == a_maze.wall_masks()
+        assert loaded.target.position == (5, 6)
+
+    def test_streamed_file(self, tmp_path):
+        path = tmp_path / "maze.bin"
+        write_fast_maze(path, 31, 20, seed=4)
+        a_maze = Maze(31, 20, (310, 200))
+        a_maze.generate_fast_maze(seed=4)
+        with MazeFile(path) as maze_file:
+            assert maze_file.wall_masks() == a_maze.wall_masks()
+            assert list(maze_file.row(3)) == list(a_maze.wall_masks()[3 * 31:4 * 31])
+            assert maze_file[45] == a_maze.wall_masks()[45]
+
+    def test_incomplete_file(self, tmp_path):
+        with pytest.raises(ValueError):
+            with MazeWriter(tmp_path / "maze.bin", 4, 4) as writer:
+                writer.write_row([15, 15, 15, 15])
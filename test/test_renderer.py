@@ -0,0 +1,77 @@
+import pygame
+
+from exercise.compact_maze import CompactMaze
+from exercise.maze import Maze
+from exercise.search import Search
+from exercise.viewport import Camera, ViewportRenderer
+
+
+class TestViewport:
+
+    def test_camera(self):
+        camera = Camera((100, 50), (800, 600))
+        assert camera.cell_size == 8
+        assert camera.cell_at((0, 0)) == (0, 0)
+        assert camera.cell_at((799, 399)) == (99, 49)
+        assert camera.cell_at((10, 500)) is None
+
+        camera.zoom_at(2, (400, 200))
+        assert camera.cell_size == 16
+        assert camera.cell_at((400, 200)) == (50, 25), "The cell under the mouse stays in place"
+        camera.pan(-100000, -100000)
+        assert camera.cell_at((400, 300)) == (0, 0), "The center of the window stays over the maze"
+        camera.fit()
+        assert camera.visible_cells() == (0, 0, 100, 50)
+
+    def test_draws_on_change_only(self):
+        a_maze = Maze(40, 40, (600, 600))
+        a_maze.generate_room()
+        camera = Camera(a_maze.grid_size, (600, 600))
+        renderer = ViewportRenderer(a_maze, camera)
+        surface = pygame.Surface((600, 600))
+        assert renderer.draw(surface) == [surface.get_rect()]
+        assert renderer.draw(surface) == []
+
+        camera.zoom_at(2, (0, 0))
+        assert renderer.draw(surface) == [surface.get_rect()]
+        camera.pan(30, 0)
+        assert renderer.draw(surface) == [surface.get_rect()]
+
+        a_maze.set_target(a_maze.grid[3][3])
+        Search(a_maze, verbose=False).breadth_first_solution()
+        changed = renderer.draw(surface)
+        assert 0 < len(changed) and all(surface.get_rect().contains(rect) and rect != surface.get_rect()
+                                        for rect in changed), "Only the chunks of the searched cells are drawn"
+        assert renderer.draw(surface) == []
+        a_maze.del_link(a_maze.grid[10][10], a_maze.grid[11][10])
+        assert len(renderer.draw(surface)) == 1, "A new wall only draws its chunk again"
+        whole = pygame.Surface((600, 600))
+        ViewportRenderer(a_maze, camera).draw(whole)
+        assert pygame.image.tobytes(surface, 'RGB') == pygame.image.tobytes(whole, 'RGB')
+
+    def test_overview_of_a_large_maze(self):
+        a_maze = CompactMaze(1000, 1000, (500, 500))
+        a_maze.generate_eller_maze(seed=1)
+        camera = Camera(a_maze.grid_size, (500, 500))
+        renderer = ViewportRenderer(a_maze, camera)
+        surface = pygame.Surface((500, 500))
+        renderer.draw(surface)
+        assert renderer.level is not None, "Far away the maze is drawn from wall masks"
+        assert 0 < len(renderer.images) <= len(renderer.chunks)
+        # Walls are black: the overview is neither empty nor solid
+        pixels = pygame.image.tobytes(surface, 'RGB')
+        assert 0 < pixels.count(0) < len(pixels)
+
+        images = dict(renderer.images)
+        for x in range(100, 900, 100):
+            a_maze.grid[x][x].set_color((248, 220, 50))
+        changed = renderer.draw(surface)
+        assert 0 < len(changed) <= 8 and all(rect.width < 500 for rect in changed)
+        assert renderer.images == images, "New colors keep the wall images"
+        whole = pygame.Surface((500, 500))
+        ViewportRenderer(a_maze, camera).draw(whole)
+        assert pygame.image.tobytes(surface, 'RGB') == pygame.image.tobytes(whole, 'RGB')
+
+        camera.zoom_at(64, (250, 250))
+        renderer.draw(surface)
+        assert renderer.level is None, "Close up the cells are drawn one by one"
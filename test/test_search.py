@@ -1,7 +1,12 @@
+import random
+
 import pytest
 
+from exercise.compact_maze import CompactMaze
+from exercise.hierarchical import HierarchicalPlanner
 from exercise.maze import Maze
 from exercise.search import Search
+from exercise.search_stats import SearchStats
 
 
 class TestExercise2_4_4_3:
@@ -48,3 +53,287 @@ class TestExercise2_4_4_4:
         assert a_maze.grid[1][1].parent is not None, "The search should pass cell (1,1)."
         assert a_maze.grid[1][1].score == 6, "The score of (1,1) should be 6"
         assert a_maze.target.distance is None, "Greedy should not find any path"
+
+
+class TestBestFirst:
+
+    def test_astar_matches_bfs(self):
+        a_maze = Maze(20, 15, (200, 150))
+        a_maze.generate_obstacles()
+        a_maze.set_target(a_maze.grid[17][12])
+        search = Search(a_maze)
+        search.breadth_first_solution()
+        shortest = a_maze.target.distance
+        search.a_star_search()
+        assert a_maze.target.distance == shortest, "A* should find a shortest path"
+
+    def test_astar_open_room_expansions(self, capsys):
+        a_maze = Maze(30, 30, (300, 300))
+        a_maze.generate_open_maze()
+        Search(a_maze).a_star_search()
+        output = capsys.readouterr().out
+        assert "The number of visited nodes is: 58" in output, "A* should walk straight to the target"
+
+    def test_astar_room_expansions(self):
+        a_maze = Maze(100, 100, (500, 500))
+        a_maze.generate_room()
+        search = Search(a_maze, verbose=False)
+        search.breadth_first_solution()
+        breadth_first = search.visited
+        search.a_star_search()
+        assert a_maze.target.distance == 198
+        assert search.visited * 10 < breadth_first, "Ties on the larger distance keep A* off most of the room"
+
+
+class TestBidirectional:
+
+    @pytest.mark.parametrize("layout", ["generate_maze", "generate_room", "generate_obstacles"])
+    def test_matches_bfs(self, layout):
+        a_maze = Maze(20, 15, (200, 150))
+        getattr(a_maze, layout)()
+        a_maze.set_target(a_maze.grid[13][11])
+        search = Search(a_maze)
+        search.breadth_first_solution()
+        shortest = a_maze.target.distance
+        for solve in (search.bidirectional_breadth_first_solution, search.bidirectional_a_star_search):
+            solve()
+            assert a_maze.target.distance == shortest
+            node = a_maze.target
+            while shortest is not None and node != a_maze.start:
+                assert node.parent in node.get_neighbours()
+                node = node.parent
+
+    def test_none(self):
+        a_maze = Maze(10, 10, (100, 100))
+        a_maze.generate_room()
+        a_maze.set_target(a_maze.grid[3][3])
+        for cell in a_maze.possible_neighbours(a_maze.target):
+            a_maze.del_link(a_maze.target, cell)
+        search = Search(a_maze)
+        search.bidirectional_breadth_first_solution()
+        assert a_maze.target.distance is None
+        search.bidirectional_a_star_search()
+        assert a_maze.target.distance is None
+
+
+class TestJumpPoint:
+
+    @pytest.mark.parametrize("layout", ["generate_open_maze", "generate_room", "generate_obstacles"])
+    def test_matches_bfs(self, layout):
+        a_maze = Maze(25, 20, (250, 200))
+        getattr(a_maze, layout)()
+        a_maze.set_target(a_maze.grid[21][17])
+        search = Search(a_maze)
+        search.breadth_first_solution()
+        shortest = a_maze.target.distance
+        search.jump_point_search()
+        assert a_maze.target.distance == shortest
+        node = a_maze.target
+        while shortest is not None and node != a_maze.start:
+            assert node.parent in node.get_neighbours()
+            node = node.parent
+
+    def test_open_room_expansions(self):
+        a_maze = Maze(30, 30, (300, 300))
+        a_maze.generate_open_maze()
+        search = Search(a_maze)
+        search.jump_point_search()
+        assert a_maze.target.distance == 58
+        assert search.visited == 2, "Only the start and the turn should be expanded"
+
+
+class TestBatch:
+
+    def test_batch_matches_bfs(self):
+        a_maze = Maze(10, 10, (100, 100))
+        a_maze.generate_room()
+        pairs = [((0, 0), (3, 3)), ((0, 0), (9, 9)), ((3, 3), (0, 0)), ((5, 5), (5, 5))]
+        lengths = Search(a_maze).batch_shortest_paths(pairs)
+        assert lengths[0] == 6 and lengths[2] == 6 and lengths[3] == 0
+        assert a_maze.grid[3][3].parent is None, "A batch query should not change the maze"
+        length, path = Search(a_maze).batch_shortest_paths([((0, 0), (3, 3))], paths=True)[0]
+        assert path[0] == (0, 0) and path[-1] == (3, 3) and len(path) == length + 1
+
+    def test_batch_unreachable(self):
+        a_maze = Maze(10, 10, (100, 100))
+        a_maze.generate_room()
+        for cell in a_maze.possible_neighbours(a_maze.grid[3][3]):
+            a_maze.del_link(a_maze.grid[3][3], cell)
+        assert Search(a_maze).batch_shortest_paths([(a_maze.grid[0][0], a_maze.grid[3][3])]) == [None]
+
+
+class TestSteps:
+
+    def test_advance_in_slices(self):
+        a_maze = Maze(30, 30, (300, 300))
+        a_maze.generate_obstacles(seed=1)
+        search = Search(a_maze)
+        search.breadth_first_solution()
+        visited, distance = search.visited, a_maze.target.distance
+
+        steps = search.breadth_first_steps()
+        slices = 1
+        while not search.advance(steps, 0.0):
+            slices += 1
+        assert slices > 1, "A zero budget should stop after every step"
+        assert search.visited == visited and a_maze.target.distance == distance
+
+
+class TestSeededDepthFirst:
+
+    def test_same_seed_same_path(self):
+        a_maze = Maze(15, 15, (150, 150))
+        a_maze.generate_open_maze()
+        paths = []
+        for seed in (5, 5, 6):
+            Search(a_maze, verbose=False).depth_first_solution(seed=seed)
+            paths.append([cell.parent for cell in a_maze.state_cells()])
+        assert paths[0] == paths[1]
+        assert paths[0] != paths[2]
+
+        Search(a_maze, verbose=False, rng=random.Random(5)).depth_first_solution()
+        assert [cell.parent for cell in a_maze.state_cells()] == paths[0]
+
+
+class TestDistanceField:
+
+    def test_matches_bfs(self):
+        pytest.importorskip("numpy")
+        a_maze = Maze(40, 40, (400, 400))
+        a_maze.generate_obstacles(seed=1)  # With the target reachable, so breadth first search stops early
+        search = Search(a_maze)
+        search.breadth_first_solution()
+        distance, visited = a_maze.target.distance, search.visited
+        search.distance_field_solution()
+        assert a_maze.target.distance == distance
+        assert search.visited > visited, "The distance field reaches every cell it can"
+
+
+class TestStats:
+
+    @pytest.mark.parametrize("solve", ["breadth_first_solution", "a_star_search", "bidirectional_a_star_search"])
+    def test_counters(self, capsys, solve):
+        a_maze = Maze(20, 15, (200, 150))
+        a_maze.generate_obstacles(seed=1)  # With the target reachable
+        reports = []
+        stats = SearchStats(callback=lambda done: reports.append(done.as_dict()))
+        search = Search(a_maze, stats, verbose=False)
+        getattr(search, solve)()
+        assert capsys.readouterr().out == "", "A quiet search should not print"
+        assert len(reports) == 1
+        assert stats.expanded == search.visited
+        assert stats.neighbour_copies == 0, "The searches iterate over the neighbours without copying"
+        assert 0 < stats.frontier_peak <= 20 * 15
+        assert set(stats.timers) == {'reset', 'search', 'path'}
+
+        getattr(search, solve)()
+        assert stats.reset_cells > 2, "The second search resets the cells of the first"
+        assert stats.expanded == search.visited, "Every search starts counting from zero"
+
+
+class TestIncremental:
+
+    @pytest.mark.parametrize("maze_class", [Maze, CompactMaze])
+    def test_matches_bfs_after_edits(self, maze_class):
+        rng = random.Random(3)
+        a_maze = maze_class(15, 12, (150, 120))
+        a_maze.generate_room()
+        search = Search(a_maze, verbose=False)
+        for _ in range(60):
+            choice = rng.random()
+            cell = a_maze.grid[rng.randrange(15)][rng.randrange(12)]
+            if choice < 0.6:
+                other = rng.choice(a_maze.possible_neighbours(cell))
+                (a_maze.add_link if rng.random() < 0.5 else a_maze.del_link)(cell, other)
+            elif choice < 0.9:
+                a_maze.set_target(cell)
+            else:
+                a_maze.set_source(cell)
+            search.breadth_first_solution()
+            shortest = a_maze.target.distance
+            search.incremental_search()
+            assert a_maze.target.distance == shortest
+            node = a_maze.target
+            while shortest is not None and node != a_maze.start:
+                assert node.parent in node.get_neighbours()
+                node = node.parent
+
+    def test_repair_is_local(self):
+        a_maze = Maze(40, 40, (400, 400))
+        a_maze.generate_room()
+        search = Search(a_maze, verbose=False)
+        search.incremental_search()
+        fresh = search.visited
+        a_maze.del_link(a_maze.grid[30][5], a_maze.grid[31][5])
+        search.incremental_search()
+        assert search.visited < fresh / 10, "An edit away from the path should cost little"
+        assert a_maze.target.distance == 78
+
+
+class TestHierarchical:
+
+    @pytest.mark.parametrize("maze_class", [Maze, CompactMaze])
+    def test_exact_in_perfect_maze(self, maze_class):
+        rng = random.Random(4)
+        a_maze = maze_class(30, 25, (300, 250))
+        a_maze.generate_maze(seed=4)
+        search = Search(a_maze, verbose=False)
+        search.hierarchy = HierarchicalPlanner(a_maze, cluster_size=6)
+        for _ in range(20):
+            a_maze.set_source(a_maze.grid[rng.randrange(30)][rng.randrange(25)])
+            a_maze.set_target(a_maze.grid[rng.randrange(30)][rng.randrange(25)])
+            search.breadth_first_solution()
+            shortest = a_maze.target.distance
+            search.hierarchical_search()
+            assert a_maze.target.distance == shortest
+
+    @pytest.mark.parametrize("size", [(20, 80), (80, 20)])
+    def test_single_column_or_row_of_clusters(self, size):
+        a_maze = Maze(*size, (200, 200))
+        a_maze.generate_open_maze()
+        search = Search(a_maze, verbose=False)
+        search.breadth_first_solution()
+        shortest = a_maze.target.distance
+        search.hierarchical_search()
+        assert shortest <= a_maze.target.distance <= shortest + 10
+
+    @pytest.mark.parametrize("layout", ["generate_room", "generate_obstacles"])
+    def test_close_to_bfs_after_edits(self, layout):
+        rng = random.Random(5)
+        a_maze = Maze(30, 25, (300, 250))
+        a_maze.generate(layout, 5)
+        search = Search(a_maze, verbose=False)
+        search.hierarchy = HierarchicalPlanner(a_maze, cluster_size=6)
+        for _ in range(40):
+            cell = a_maze.grid[rng.randrange(30)][rng.randrange(25)]
+            other = rng.choice(a_maze.possible_neighbours(cell))
+            (a_maze.add_link if rng.random() < 0.5 else a_maze.del_link)(cell, other)
+            a_maze.set_target(a_maze.grid[rng.randrange(30)][rng.randrange(25)])
+            search.breadth_first_solution()
+            shortest = a_maze.target.distance
+            search.hierarchical_search()
+            if shortest is None:
+                assert a_maze.target.distance is None
+                continue
+            assert shortest <= a_maze.target.distance <= shortest + 10
+            node = a_maze.target
+            while node != a_maze.start:
+                assert node.parent in node.get_neighbours()
+                node = node.parent
+
+    def test_updates_match_rebuild(self):
+        rng = random.Random(6)
+        a_maze = CompactMaze(27, 22, (270, 220))
+        a_maze.generate_obstacles(seed=6)
+        planner = HierarchicalPlanner(a_maze, cluster_size=5)
+        for _ in range(150):
+            cell = a_maze.grid[rng.randrange(27)][rng.randrange(22)]
+            other = rng.choice(a_maze.possible_neighbours(cell))
+            (a_maze.add_link if rng.random() < 0.5 else a_maze.del_link)(cell, other)
+            if rng.random() < 0.2:
+                planner.sync()
+        planner.sync()
+        fresh = HierarchicalPlanner(a_maze, cluster_size=5)
+        fresh.sync()
+        assert planner.entrances == fresh.entrances and planner.nodes == fresh.nodes
+        assert planner.edges == fresh.edges and planner.open == fresh.open
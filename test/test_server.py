@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+from benchmarks.load import run_load
+from exercise.compact_maze import CompactMaze
+from exercise.maze import Maze
+from exercise.search import Search
+from exercise.server import MAX_LINE, MazeServer
+
+
+def ask_all(maze, lines, **options):
+    """Start a server, send the lines on one connection and return the answers by id"""
+    async def session():
+        server = MazeServer(maze, **options)
+        await server.start(port=0)
+        reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+        for line in lines:
+            writer.write((line if isinstance(line, str) else json.dumps(line)).encode() + b'\n')
+        await writer.drain()
+        answers = [json.loads(await reader.readline()) for _ in lines]
+        writer.close()
+        await server.close()
+        return {answer['id']: answer for answer in answers}
+    return asyncio.run(session())
+
+
+class TestServer:
+
+    def test_matches_batch(self):
+        a_maze = Maze(10, 10, (100, 100))
+        a_maze.generate_room()
+        pairs = [((0, 0), (3, 3)), ((0, 0), (9, 9)), ((3, 3), (0, 0)), ((5, 5), (5, 5))]
+        expected = Search(a_maze, verbose=False).batch_shortest_paths(pairs)
+        queries = [{'id': number, 'source': list(source), 'target': list(target), 'algorithm': algorithm}
+                   for number, (algorithm, (source, target)) in
+                   enumerate((algorithm, pair) for algorithm in ('bfs', 'a_star', 'jps', 'bi_bfs') for pair in pairs)]
+        answers = ask_all(a_maze, queries, processes=0)
+        for query in queries:
+            assert answers[query['id']]['length'] == expected[query['id'] % len(pairs)], query
+
+        answers = ask_all(a_maze, [{'id': 1, 'source': [0, 0], 'target': [3, 3], 'algorithm': 'dfs', 'path': True}],
+                          processes=0)
+        path = answers[1]['path']
+        assert path[0] == [0, 0] and path[-1] == [3, 3] and len(path) == answers[1]['length'] + 1
+
+    def test_errors_and_unreachable(self):
+        a_maze = CompactMaze(10, 10, (100, 100))
+        a_maze.generate_room()
+        for cell in a_maze.possible_neighbours(a_maze.grid[3][3]):
+            a_maze.del_link(a_maze.grid[3][3], cell)
+        answers = ask_all(a_maze, [
+            {'id': 1, 'source': [0, 0], 'target': [3, 3]},
+            {'id': 2, 'source': [0, 0], 'target': [3, 3], 'algorithm': 'a_star'},
+            {'id': 3, 'source': [0, 0], 'target': [10, 3]},
+            {'id': 4, 'source': [0, 0], 'target': [3, 3], 'algorithm': 'teleport'},
+            {'id': 5, 'op': 'info'},
+            'not json',
+        ], processes=0)
+        assert answers[1]['length'] is None and answers[2]['length'] is None
+        assert 'outside' in answers[3]['error']
+        assert 'teleport' in answers[4]['error']
+        assert answers[5]['grid_size'] == [10, 10]
+        assert 'error' in answers[None]
+
+    def test_malformed_queries_keep_connection(self):
+        a_maze = Maze(10, 10, (100, 100))
+        a_maze.generate_room()
+        answers = ask_all(a_maze, [
+            {'id': 1, 'source': [0, 0], 'target': [3, 3], 'algorithm': ['bfs']},
+            '{"id": 2, "pad": "' + 'x' * (2 * MAX_LINE) + '"}',
+            {'id': 3, 'source': [0, 0], 'target': [3, 3]},
+        ], processes=0)
+        assert 'algorithm' in answers[1]['error']
+        assert str(MAX_LINE) in answers[None]['error']
+        assert answers[3]['length'] == 6, "The connection should be open after malformed queries"
+
+    def test_load_with_backpressure(self):
+        a_maze = Maze(30, 30, (300, 300))
+        a_maze.generate_fast_maze(seed=1)
+
+        async def session(options):
+            server = MazeServer(a_maze, max_pending=4, **options)
+            await server.start(port=0)
+            result = await run_load(port=server.port, requests=200, connections=4, window=16)
+            await server.close()
+            return server, result
+
+        server, result = asyncio.run(session({'processes': 0}))
+        assert result['requests'] == 200 and result['errors'] == 0
+        assert server.answered == 200
+        assert server.batches < 200, "Queries that wait for the worker are answered in batches"
+        assert 0 < result['p50'] <= result['p99'] <= result['max']
+
+        server, result = asyncio.run(session({'processes': 2}))
+        assert result['requests'] == 200 and result['errors'] == 0